@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Screener Benchmarks
+Times mock data generation, screening, sorting, statistics, table printing, CSV/Parquet/Arrow export over
+synthetic universes, the memory-mapped history archive, single vs multi-process screens of the
+archive, and the fetch engine against the local stub server with injected latency.
+Results are written as JSON lines so throughput and p50/p99 latency can be tracked over time.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import urllib.request
+
+from mock_stock_screener import generate_mock_stock_data, filter_stocks, print_table, save_to_csv
+from exporters import export, read_export
+from web_stock_screener import calculate_statistics
+from screening_core import IncrementalScreen, ScreenUniverse, build_close_matrix
+from record_store import RecordStore
+from fetch_engine import FetchEngine
+from provider_client import ProviderClient, RetryPolicy
+from history_loader import load_histories
+from history_archive import HistoryArchive, write_archive
+from parallel_screen import screen_archive, shutdown_screen_pool
+from providers import SyntheticProvider
+from factors import FACTORS
+from stub_server import start_stub_server
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+HEADERS = ['Ticker', 'Company Name', 'Current Price', 'Market Cap (B)', '250-Day Return', 'Sector']
+
+
+def synthetic_tickers(count):
+    """
+    Ticker symbols for a synthetic universe of the given size
+    """
+    return [f"SYN{i:06d}" for i in range(count)]
+
+
+def time_runs(func, runs):
+    """
+    Call func `runs` times and return the wall time of each call in seconds
+    """
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(name, size, samples, items=None, **extra):
+    """
+    Build one result record; throughput counts `items` (default: size) per mean call
+    """
+    mean = statistics.fmean(samples)
+    record = {
+        'benchmark': name,
+        'size': size,
+        'runs': len(samples),
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'mean_ms': mean * 1000,
+        'throughput_per_s': (items if items is not None else size) / mean if mean else None,
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+    }
+    record.update(extra)
+    return record
+
+
+def row_dict_bytes(rows):
+    """
+    Approximate memory held by row dicts, counting each referenced value object once
+    """
+    seen = set()
+    total = 0
+    for row in rows:
+        total += sys.getsizeof(row)
+        for value in row.values():
+            if id(value) not in seen:
+                seen.add(id(value))
+                total += sys.getsizeof(value)
+    return total
+
+
+def bench_screen_paths(size, runs):
+    """
+    Benchmark every in-memory stage of a screen for one universe size
+    """
+    tickers = synthetic_tickers(size)
+    results = []
+
+    def generate():
+        return generate_mock_stock_data(tickers, delay=0, show_progress=False, seed=42)
+
+    results.append(summarize('generate_mock_stock_data', size, time_runs(generate, runs)))
+    stocks = generate()
+
+    results.append(summarize('filter_stocks', size, time_runs(lambda: filter_stocks(stocks), runs)))
+    filtered = filter_stocks(stocks)
+
+    # Threshold sweep over a prebuilt incremental screen, as when a slider moves
+    screen = IncrementalScreen(ScreenUniverse.from_rows(stocks))
+    thresholds = iter(range(10 ** 9))
+    results.append(summarize(
+        'incremental_screen',
+        size,
+        time_runs(lambda: screen.screen(float(next(thresholds) % 100)), runs),
+    ))
+
+    # Same screen over the columnar record store, with its footprint next to the row dicts'
+    results.append(summarize(
+        'record_store_build',
+        size,
+        time_runs(lambda: RecordStore.from_rows(stocks), runs),
+        row_bytes=row_dict_bytes(stocks),
+        store_bytes=RecordStore.from_rows(stocks).nbytes,
+    ))
+    # Screening the store yields indices; rows are only materialized for what gets displayed
+    universe = RecordStore.from_rows(stocks).universe()
+    results.append(summarize('record_store_screen', size, time_runs(universe.screen, runs)))
+
+    def sort_rows():
+        return sorted(stocks, key=lambda x: x['Market Cap (B)'], reverse=True)
+
+    results.append(summarize('sort', size, time_runs(sort_rows, runs)))
+    results.append(summarize(
+        'calculate_statistics',
+        size,
+        time_runs(lambda: calculate_statistics(filtered), runs),
+        items=len(filtered),
+    ))
+
+    def render():
+        with contextlib.redirect_stdout(io.StringIO()):
+            print_table(filtered, HEADERS)
+
+    results.append(summarize('print_table', size, time_runs(render, runs), items=len(filtered)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'results.csv')
+        results.append(summarize(
+            'save_to_csv',
+            size,
+            time_runs(lambda: save_to_csv(filtered, path), runs),
+            items=len(filtered),
+        ))
+        # Columnar exports, and how fast each format loads back
+        for name in ('results.parquet', 'results.arrow'):
+            target = os.path.join(tmp, name)
+            results.append(summarize(
+                f'export {name}',
+                size,
+                time_runs(lambda: export(filtered, target), runs),
+                items=len(filtered),
+            ))
+        for name in ('results.csv', 'results.parquet', 'results.arrow'):
+            target = os.path.join(tmp, name)
+            results.append(summarize(
+                f'read_export {name}',
+                size,
+                time_runs(lambda: read_export(target), runs),
+                items=len(filtered),
+            ))
+
+    return results
+
+
+def bench_fetch(count, latency, worker_counts, throttle_rate=0.0, error_rate=0.0):
+    """
+    Benchmark the fetch engine and the bulk history loader against the stub server
+
+    With throttle_rate or error_rate the stub injects 429s and 500s, which only the provider
+    client run retries; the plain engine runs count them as lost tickers.
+    """
+    tickers = synthetic_tickers(count)
+    server = start_stub_server(latency=latency, throttle_rate=throttle_rate, error_rate=error_rate,
+                               retry_after=0.05, seed=42)
+    results = []
+
+    try:
+        for workers in worker_counts:
+            per_ticker = []
+
+            def fetch_one(ticker):
+                start = time.perf_counter()
+                url = f"{server.base_url}/v7/finance/spark?symbols={ticker}&range=1y&interval=1d"
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    response.read()
+                per_ticker.append(time.perf_counter() - start)
+                return {'Ticker': ticker}
+
+            engine = FetchEngine(max_workers=workers, rate_limit=0)
+            rows = []
+            wall = time_runs(lambda: rows.extend(engine.fetch(tickers, fetch_one)), 1)[0]
+            results.append(summarize(
+                'fetch_engine_ticker',
+                count,
+                per_ticker or [wall],
+                items=1,
+                workers=workers,
+                latency_s=latency,
+                wall_ms=wall * 1000,
+                tickers_per_s=count / wall,
+                fetched=len(rows),
+            ))
+
+        # Same fetch through the provider client: pooled session, retries and adaptive throttling
+        client = ProviderClient(rate_limit=0, retry=RetryPolicy(max_attempts=6, base_delay=0.05, max_delay=1.0))
+        per_ticker = []
+
+        def fetch_via_client(ticker):
+            start = time.perf_counter()
+            client.get(f"{server.base_url}/v7/finance/spark",
+                       params={'symbols': ticker, 'range': '1y', 'interval': '1d'}, timeout=30)
+            per_ticker.append(time.perf_counter() - start)
+            return {'Ticker': ticker}
+
+        workers = max(worker_counts)
+        engine = FetchEngine(max_workers=workers, client=client)
+        rows = []
+        wall = time_runs(lambda: rows.extend(engine.fetch(tickers, fetch_via_client)), 1)[0]
+        results.append(summarize(
+            'provider_client_ticker',
+            count,
+            per_ticker or [wall],
+            items=1,
+            workers=workers,
+            latency_s=latency,
+            wall_ms=wall * 1000,
+            tickers_per_s=count / wall,
+            fetched=len(rows),
+            **client.stats,
+        ))
+
+        wall = time_runs(lambda: load_histories(tickers, base_url=server.base_url), 1)[0]
+        results.append(summarize('load_histories_bulk', count, [wall], latency_s=latency))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return results
+
+
+def bench_history_archive(count, runs):
+    """
+    Benchmark the memory-mapped history archive against per-ticker frames for one year of bars
+    """
+    tickers = synthetic_tickers(count)
+    histories = SyntheticProvider(seed=42).histories(tickers, "1y")
+    frame_bytes = int(sum(hist.memory_usage(deep=True).sum() for hist in histories.values()))
+    results = []
+
+    with tempfile.TemporaryDirectory() as path:
+        write = time_runs(lambda: write_archive(histories, path), 1)
+        archive = HistoryArchive(path)
+        results.append(summarize('history_archive_write', count, write, frame_bytes=frame_bytes,
+                                 archive_bytes=archive.nbytes))
+        results.append(summarize('history_archive_open', count, time_runs(lambda: HistoryArchive(path), runs)))
+
+        # The close matrix factors are computed from, from frames in memory and from the archive
+        results.append(summarize('close_matrix_frames', count, time_runs(lambda: build_close_matrix(histories), runs)))
+        results.append(summarize('close_matrix_archive', count, time_runs(archive.close_matrix, runs)))
+        last_month = archive.dates[-21]
+        results.append(summarize(
+            'close_matrix_archive_month',
+            count,
+            time_runs(lambda: archive.close_matrix(start=last_month), runs),
+        ))
+
+        picks = iter(range(10 ** 9))
+        results.append(summarize(
+            'history_archive_ticker',
+            1,
+            time_runs(lambda: archive.history(tickers[next(picks) % count]), runs),
+        ))
+        del archive
+
+    return results
+
+
+def bench_parallel_screen(count, runs, process_counts, k=50):
+    """
+    Benchmark a full-factor screen of a history archive in one process and across process pools
+
+    Each multi-process record carries its speedup over the single-process p50.
+    """
+    tickers = synthetic_tickers(count)
+    provider = SyntheticProvider(seed=42)
+    market_caps = {ticker: provider.info(ticker)['marketCap'] / 1e9 for ticker in tickers}
+    factors = list(FACTORS)
+    results = []
+
+    with tempfile.TemporaryDirectory() as path:
+        write_archive(provider.histories(tickers, "1y"), path)
+
+        def screen(processes):
+            return screen_archive(path, market_caps, factors=factors, k=k, processes=processes)
+
+        single = time_runs(lambda: screen(1), runs)
+        results.append(summarize('parallel_screen', count, single, processes=1, k=k, speedup=1.0, cpus=os.cpu_count()))
+        baseline = percentile(single, 50)
+
+        try:
+            for processes in process_counts:
+                if processes <= 1:
+                    continue
+                # Start the workers before timing; the pool is kept for every later screen
+                start = time.perf_counter()
+                screen(processes)
+                warmup = time.perf_counter() - start
+                samples = time_runs(lambda: screen(processes), runs)
+                results.append(summarize(
+                    'parallel_screen',
+                    count,
+                    samples,
+                    processes=processes,
+                    k=k,
+                    speedup=baseline / percentile(samples, 50),
+                    warmup_ms=warmup * 1000,
+                    cpus=os.cpu_count(),
+                ))
+        finally:
+            shutdown_screen_pool()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stock screener")
+    parser.add_argument("--sizes", type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="synthetic universe sizes (default %(default)s)")
+    parser.add_argument("--runs", type=int, default=20, help="timed runs per benchmark for small universes")
+    parser.add_argument("--fetch-size", type=int, default=100, help="tickers fetched from the stub server")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub server latency in seconds")
+    parser.add_argument("--archive-size", type=int, default=2000, help="tickers in the history archive benchmark")
+    parser.add_argument("--parallel-size", type=int, default=10000, help="tickers in the parallel screen benchmark")
+    parser.add_argument("--processes", type=int, nargs='+', default=sorted({2, os.cpu_count() or 1}),
+                        help="worker process counts to compare with a single-process screen")
+    parser.add_argument("--workers", type=int, nargs='+', default=[1, 8, 32],
+                        help="fetch engine worker counts to compare")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="fraction of stub requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub requests answered with 500")
+    parser.add_argument("--skip-fetch", action="store_true", help="only run the in-memory benchmarks")
+    parser.add_argument("--output", help="append JSON lines to this file instead of stdout")
+    args = parser.parse_args()
+
+    out = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        for size in args.sizes:
+            # Fewer repetitions on large universes keep the whole suite to a few minutes
+            runs = args.runs if size <= 10000 else max(3, args.runs // 5)
+            for record in bench_screen_paths(size, runs):
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+
+        for record in bench_history_archive(args.archive_size, args.runs):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+        for record in bench_parallel_screen(args.parallel_size, max(3, args.runs // 4), args.processes):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+        if not args.skip_fetch:
+            for record in bench_fetch(args.fetch_size, args.latency, args.workers, args.throttle_rate, args.error_rate):
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,106 +4,223 @@ Stock Screener CLI
 This script screens stocks based on market cap, price, and performance.
 """
 
-import yfinance as yf
+import argparse
 import pandas as pd
 import time
 import sys
-from stock_tickers import TICKERS
+from fundamentals_cache import save_fundamentals
+from providers import ReplayProvider, add_provider_arguments, get_provider, provider_from_args
+from universe import add_universe_arguments, universe_from_args
+from negative_cache import summarize_skips
+from screening_core import DOLLAR_COLUMNS, row_passes
+from stream_pipeline import in_ticker_order, stream_rows
+from instrumentation import RunMetrics, add_profile_arguments, profiled, timed
+from exporters import Exporter, add_export_arguments, export
+from screen_dsl import add_screen_arguments
+from parallel_screen import add_process_arguments, screen_archive
 
-def get_stock_data(tickers, period="1y"):
+def fetch_ticker(ticker, period="1y", hist=None, provider=None):
     """
-    Fetch stock data for the given tickers
+    Fetch the screen row for a single ticker, or None if it has no price history
+    
+    hist can be passed in when the price history was already loaded in bulk. provider defaults
+    to the process-wide data provider.
+    """
+    # Get stock data
+    provider = provider or get_provider()
+    if hist is None:
+        hist = provider.history(ticker, period)
+    
+    if hist.empty:
+        return None
+    
+    # Get basic info (the live provider serves it from the fundamentals cache while it is fresh)
+    info = provider.info(ticker)
+    market_cap = info.get('marketCap', 0)
+    current_price = hist['Close'].iloc[-1]
+    
+    # Calculate 250-day return
+    if len(hist) >= 250:
+        start_price = hist['Close'].iloc[-250]
+        end_price = hist['Close'].iloc[-1]
+        return_250d = (end_price - start_price) / start_price * 100
+    else:
+        # Too short a history has no 250-day return; missing values never pass a return screen
+        return_250d = float('nan')
+    
+    return {
+        'Ticker': ticker,
+        'Company Name': info.get('shortName', ticker),
+        'Current Price ($)': current_price,
+        'Market Cap ($B)': market_cap / 1e9 if market_cap else 0,
+        '250-Day Return (%)': return_250d,
+        'Sector': info.get('sector', 'N/A'),
+        'Industry': info.get('industry', 'N/A'),
+    }
+
+def stream_stock_data(tickers, period="1y", max_workers=None, bulk_history=True, factors=(), provider=None,
+                      metrics=None):
+    """
+    Yield stock rows as each ticker completes, printing progress and errors along the way
+    
+    metrics (an instrumentation.RunMetrics) collects the pipeline's timings.
     """
-    data = {}
     total = len(tickers)
     
     print(f"Fetching data for {total} stocks...")
     
-    for i, ticker in enumerate(tickers):
-        try:
-            # Show progress
-            progress = (i / total) * 100
-            sys.stdout.write(f"\rProgress: {progress:.1f}% - Processing {ticker} ({i+1}/{total})")
-            sys.stdout.flush()
-            
-            # Get stock data
-            stock = yf.Ticker(ticker)
-            hist = stock.history(period=period)
-            
-            if not hist.empty:
-                # Get basic info
-                info = stock.info
-                market_cap = info.get('marketCap', 0)
-                current_price = hist['Close'].iloc[-1] if not hist.empty else 0
-                
-                # Calculate 250-day return
-                if len(hist) >= 250:
-                    start_price = hist['Close'].iloc[-250] if len(hist) >= 250 else hist['Close'].iloc[0]
-                    end_price = hist['Close'].iloc[-1]
-                    return_250d = (end_price - start_price) / start_price * 100
-                else:
-                    return_250d = 0
-                
-                data[ticker] = {
-                    'Ticker': ticker,
-                    'Company Name': info.get('shortName', ticker),
-                    'Current Price ($)': current_price,
-                    'Market Cap ($B)': market_cap / 1e9 if market_cap else 0,
-                    '250-Day Return (%)': return_250d,
-                    'Sector': info.get('sector', 'N/A'),
-                    'Industry': info.get('industry', 'N/A'),
-                }
-        except Exception as e:
-            print(f"\nError fetching data for {ticker}: {str(e)}")
-            print("Skipping and continuing...")
+    def on_progress(done, total, ticker):
+        # Show progress
+        progress = (done / total) * 100
+        sys.stdout.write(f"\rProgress: {progress:.1f}% - Processed {ticker} ({done}/{total})")
+        sys.stdout.flush()
     
-    print("\nProcessing complete!")
-    return pd.DataFrame(list(data.values()))
-
-def main():
-    print("===== Stock Screener =====")
-    print("This tool screens stocks based on market cap, price, and performance")
+    def on_error(ticker, e):
+        print(f"\nError fetching data for {ticker}: {str(e)}")
+        print("Skipping and continuing...")
     
-    # Default filter values
-    min_market_cap = 2.0  # $2 billion
-    min_price = 10.0      # $10
-    positive_return = True
+    def on_history_error(e):
+        print(f"\nBulk history download failed, fetching one by one: {str(e)}")
     
-    # Ask for number of stocks to analyze
+    # Delisted tickers and tickers that recently failed or came back empty are not fetched
+    skipped = {}
+    
+    def on_skip(ticker, reason):
+        skipped[ticker] = reason
+    
+    # Price histories come from the on-disk cache, missing bars are downloaded in bulk a chunk
+    # at a time, and factor columns are added as each row comes in
     try:
-        num_stocks = int(input(f"Number of stocks to analyze (max {len(TICKERS)}, default 50): ") or "50")
-        num_stocks = min(num_stocks, len(TICKERS))
-    except ValueError:
-        num_stocks = 50
+        yield from stream_rows(
+            tickers,
+            lambda ticker, hist: fetch_ticker(ticker, period, hist, provider),
+            period,
+            max_workers,
+            bulk_history,
+            factors,
+            on_progress=on_progress,
+            on_error=on_error,
+            on_history_error=on_history_error,
+            provider=provider,
+            on_skip=on_skip,
+            metrics=metrics,
+        )
+    finally:
+        save_fundamentals()
     
-    # Use only the selected number of stocks
-    selected_tickers = TICKERS[:num_stocks]
+    print("\nProcessing complete!")
+    if skipped:
+        print(f"Skipped {len(skipped)} tickers without fetching:")
+        for line in summarize_skips(skipped):
+            print(f"- {line}")
+
+def get_stock_data(tickers, period="1y", max_workers=None, bulk_history=True, factors=(), provider=None):
+    """
+    Fetch stock data for the given tickers
+    """
+    rows = list(stream_stock_data(tickers, period, max_workers, bulk_history, factors, provider))
+    return pd.DataFrame(in_ticker_order(rows, tickers))
+
+def print_live_row(row):
+    """
+    Print a matching row as soon as it arrives, over the progress line
+    """
+    line = (f"{row['Ticker']:<8}{str(row['Company Name'])[:30]:<32}"
+            f"${row['Current Price ($)']:>10.2f}  ${row['Market Cap ($B)']:>9.2f}B  "
+            f"{row['250-Day Return (%)']:>8.2f}%  {row['Sector']}")
+    sys.stdout.write(f"\r{line:<100}\n")
+    sys.stdout.flush()
+
+def screen_and_report(tickers, min_market_cap, min_price, positive_return, metrics=None, universe_path=None,
+                      screen=None):
+    """
+    Fetch and screen the tickers, print the matches and statistics and return them as a frame
     
-    print(f"\nAnalyzing {len(selected_tickers)} stocks. This may take a few minutes...")
-    df = get_stock_data(selected_tickers)
+    Returns None when no data was retrieved. Each step is timed as a stage of metrics. With
+    universe_path every fetched row is also exported there as it arrives, not just the matches.
+    A screen (a screen_dsl.Screen) replaces the three thresholds.
+    """
+    # Filter rows as they stream in; only the matches are kept
+    fetched = 0
+    matches = []
+    universe = Exporter(universe_path) if universe_path else None
+    with timed(metrics, 'fetch'):
+        factors = screen.factors() if screen is not None else ()
+        for row in stream_stock_data(tickers, factors=factors, metrics=metrics):
+            fetched += 1
+            if universe is not None:
+                universe.write(row)
+            with timed(metrics, 'filter'):
+                if screen is not None:
+                    passes = screen.row_passes(row, DOLLAR_COLUMNS)
+                else:
+                    passes = row_passes(row, min_market_cap, min_price, positive_return, DOLLAR_COLUMNS)
+            if passes:
+                matches.append(row)
+                with timed(metrics, 'render'):
+                    print_live_row(row)
     
-    if df.empty:
+    if not fetched:
+        if universe is not None:
+            universe.abort()
         print("No data was retrieved. Please try again.")
-        return
+        return None
     
-    # Apply filters
-    print("\nApplying filters:")
-    print(f"- Market Cap >= ${min_market_cap} billion")
-    print(f"- Current Price >= ${min_price}")
-    if positive_return:
-        print("- 250-Day Return > 0%")
-    
-    filtered_df = df[
-        (df['Market Cap ($B)'] >= min_market_cap) &
-        (df['Current Price ($)'] >= min_price)
-    ]
+    if universe is not None:
+        with timed(metrics, 'render'):
+            universe.close()
+        print(f"All {universe.rows} fetched stocks saved to {universe_path}")
     
-    if positive_return:
-        filtered_df = filtered_df[filtered_df['250-Day Return (%)'] > 0]
+    with timed(metrics, 'parse'):
+        filtered_df = pd.DataFrame(matches, columns=['Ticker', 'Company Name', 'Current Price ($)', 'Market Cap ($B)',
+                                                     '250-Day Return (%)', 'Sector', 'Industry'])
     
     # Sort by market cap
-    filtered_df = filtered_df.sort_values(by='Market Cap ($B)', ascending=False)
+    with timed(metrics, 'sort'):
+        filtered_df = filtered_df.sort_values(by='Market Cap ($B)', ascending=False)
+    
+    with timed(metrics, 'render'):
+        print_results(filtered_df)
+    return filtered_df
+
+def screen_archive_and_report(provider, tickers, min_market_cap, min_price, positive_return, processes, metrics=None,
+                              screen=None):
+    """
+    Screen a replayed history archive across worker processes, print the matches and statistics
+    and return them as a frame
+    
+    Each worker computes the factors and screen for its shard of the tickers straight from the
+    memory-mapped archive, so no per-ticker rows are built for stocks that don't match.
+    """
+    with timed(metrics, 'fetch'):
+        infos = {ticker: provider.info(ticker) for ticker in tickers}
+        market_caps = {ticker: (info.get('marketCap') or 0) / 1e9 for ticker, info in infos.items()}
+        details = {
+            ticker: {
+                'Company Name': info.get('shortName', ticker),
+                'Sector': info.get('sector', 'N/A'),
+                'Industry': info.get('industry', 'N/A'),
+            }
+            for ticker, info in infos.items()
+        }
+    
+    with timed(metrics, 'filter'):
+        matches = screen_archive(provider.archive_path, market_caps, min_market_cap, min_price, positive_return,
+                                 processes=processes, tickers=tickers, screen=screen, details=details,
+                                 columns=DOLLAR_COLUMNS)
+    
+    with timed(metrics, 'parse'):
+        filtered_df = pd.DataFrame(matches, columns=['Ticker', 'Company Name', 'Current Price ($)', 'Market Cap ($B)',
+                                                     '250-Day Return (%)', 'Sector', 'Industry'])
     
+    with timed(metrics, 'render'):
+        print_results(filtered_df)
+    return filtered_df
+
+def print_results(filtered_df):
+    """
+    Print the matching stocks and their statistics
+    """
     # Display results
     print(f"\nFound {len(filtered_df)} stocks matching your criteria:")
     pd.set_option('display.max_rows', None)
@@ -122,13 +239,82 @@ def main():
     print(f"Average 250-Day Return: {filtered_df['250-Day Return (%)'].mean():.2f}%")
     print(f"Highest Market Cap: ${filtered_df['Market Cap ($B)'].max():.2f}B")
     print(f"Highest 250-Day Return: {filtered_df['250-Day Return (%)'].max():.2f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Screen stocks based on market cap, price, and performance")
+    add_provider_arguments(parser)
+    add_universe_arguments(parser)
+    add_profile_arguments(parser)
+    add_export_arguments(parser)
+    add_screen_arguments(parser)
+    add_process_arguments(parser)
+    args = parser.parse_args()
+    provider = provider_from_args(args)
+    universe = universe_from_args(args)
+    if args.processes and not isinstance(provider, ReplayProvider):
+        parser.error("--processes needs --provider replay")
+    if args.processes and args.export_universe:
+        parser.error("--export-universe can't be combined with --processes")
+    
+    print("===== Stock Screener =====")
+    print("This tool screens stocks based on market cap, price, and performance")
+    if not provider.live:
+        print(f"Using offline data from the {provider.name} provider")
+    
+    # Default filter values
+    min_market_cap = 2.0  # $2 billion
+    min_price = 10.0      # $10
+    positive_return = True
+    
+    # Ask for number of stocks to analyze
+    available = len(universe.tickers())
+    try:
+        num_stocks = int(input(f"Number of stocks to analyze (max {available}, default 50): ") or "50")
+        num_stocks = min(num_stocks, available)
+    except ValueError:
+        num_stocks = 50
+    
+    # The largest live stocks of the universe (delisted symbols are never fetched)
+    selected_tickers = universe.select(num_stocks)
+    
+    print(f"\nAnalyzing {len(selected_tickers)} stocks. This may take a few minutes...")
+    
+    # Apply filters
+    print("\nApplying filters:")
+    if args.screen is not None:
+        print(f"- {args.screen}")
+    else:
+        print(f"- Market Cap >= ${min_market_cap} billion")
+        print(f"- Current Price >= ${min_price}")
+        if positive_return:
+            print("- 250-Day Return > 0%")
+    print("\nMatching stocks are listed as soon as they are fetched:")
+    
+    metrics = RunMetrics('cli')
+    
+    def on_profile(path, text):
+        print(f"\nProfile written to {path}")
+        print(text)
+    
+    with profiled(args.profile, 'cli', args.profile_out, on_report=on_profile):
+        if args.processes:
+            filtered_df = screen_archive_and_report(provider, selected_tickers, min_market_cap, min_price,
+                                                    positive_return, args.processes, metrics, args.screen)
+        else:
+            filtered_df = screen_and_report(selected_tickers, min_market_cap, min_price, positive_return, metrics,
+                                            args.export_universe, args.screen)
+    
+    metrics.finish()
+    print()
+    print("\n".join(metrics.report()))
+    if filtered_df is None:
+        return
     
-    # Save to CSV
-    save_option = input("\nDo you want to save the results to a CSV file? (y/n): ")
+    # Save to CSV (or the format --output names)
+    save_option = input(f"\nDo you want to save the results to {args.output}? (y/n): ")
     if save_option.lower() == 'y':
-        filename = "stock_screener_results.csv"
-        filtered_df.to_csv(filename, index=False)
-        print(f"Results saved to {filename}")
+        export(filtered_df, args.output)
+        print(f"Results saved to {args.output}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""
+Dataset Cache Module
+Process-wide TTL cache for fetched screen datasets, shared by every session and front end in the process.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds a fetched dataset is served before it is fetched again
+DEFAULT_TTL = float(os.environ.get("SCREENER_DATA_TTL", "900"))
+DEFAULT_MAX_ENTRIES = 32
+
+
+class DatasetCache:
+    """
+    TTL cache keyed by dataset parameters; concurrent misses on one key run a single fetch
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (value, fetched_at)
+        self.key_locks = {}
+        self.lock = threading.Lock()
+
+    def _fresh(self, key, now):
+        entry = self.entries.get(key)
+        if entry is not None and now - entry[1] <= self.ttl:
+            self.entries.move_to_end(key)
+            return entry
+        return None
+
+    def get(self, key, fetch):
+        """
+        Return (value, fetched_at) for key, calling fetch() if there is no fresh entry
+        """
+        with self.lock:
+            entry = self._fresh(key, time.time())
+            if entry is not None:
+                return entry
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+
+        # Only one caller fetches a key; the others wait and then read its result
+        with key_lock:
+            try:
+                with self.lock:
+                    entry = self._fresh(key, time.time())
+                    if entry is not None:
+                        return entry
+
+                value = fetch()
+                entry = (value, time.time())
+
+                with self.lock:
+                    self.entries[key] = entry
+                    self.entries.move_to_end(key)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+                return entry
+            finally:
+                # Dropped whether the fetch succeeded or raised, so failed keys don't pile up
+                with self.lock:
+                    if self.key_locks.get(key) is key_lock:
+                        del self.key_locks[key]
+
+    def peek(self, key):
+        """
+        Return (value, fetched_at) if key has a fresh entry, else None; never fetches
+        """
+        with self.lock:
+            return self._fresh(key, time.time())
+
+    def invalidate(self, key=None):
+        """
+        Drop one key, or every key when none is given
+        """
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+
+_default_cache = DatasetCache()
+
+
+def get_dataset_cache():
+    """
+    Return the dataset cache shared by everything running in this process
+    """
+    return _default_cache
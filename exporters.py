@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Exporters Module
+Writes screen results or a whole universe to CSV, Parquet or Arrow IPC a chunk of rows at a time, with optional
+compression, so memory stays flat however many rows are exported.
+"""
+
+import argparse
+import bz2
+import gzip
+import io
+import lzma
+import os
+
+import pandas as pd
+
+from record_store import CategoryColumn, RecordStore
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Rows converted and written per chunk
+DEFAULT_CHUNK_ROWS = int(os.environ.get("SCREENER_EXPORT_CHUNK_ROWS", "50000"))
+
+FORMATS = ('csv', 'parquet', 'arrow')
+
+# File extensions recognized by infer_format
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+
+# CSV is compressed as a whole stream; Parquet and Arrow compress each column chunk
+CSV_COMPRESSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+COMPRESSIONS = {
+    'csv': ('gzip', 'bz2', 'xz'),
+    'parquet': ('snappy', 'zstd', 'gzip', 'brotli', 'lz4'),
+    'arrow': ('lz4', 'zstd'),
+}
+DEFAULT_COMPRESSION = {'csv': None, 'parquet': 'snappy', 'arrow': None}
+
+# MIME types for downloads
+MIME_TYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+
+
+def infer_format(path):
+    """
+    (format, compression) implied by a file name such as results.csv.gz or universe.parquet
+    """
+    root, ext = os.path.splitext(path.lower())
+    compression = None
+    if ext in CSV_COMPRESSIONS:
+        compression = CSV_COMPRESSIONS[ext]
+        root, ext = os.path.splitext(root)
+    if ext not in EXTENSIONS:
+        raise ValueError(f"Can't tell the export format of {path}; use one of {', '.join(sorted(EXTENSIONS))}")
+    return EXTENSIONS[ext], compression
+
+
+def file_name(stem, format='csv', compression=None):
+    """
+    File name for an export, e.g. ("results", "csv", "gzip") -> results.csv.gz
+    """
+    name = f"{stem}.{format}"
+    if format == 'csv' and compression:
+        name += {codec: suffix for suffix, codec in CSV_COMPRESSIONS.items()}[compression]
+    return name
+
+
+def _require_pyarrow(format):
+    if pa is None:
+        raise RuntimeError(f"{format} export needs pyarrow; pip install pyarrow or export to CSV")
+
+
+def _compress(sink, compression):
+    """
+    Binary stream compressing everything written to sink as one file; closing it leaves sink open
+    """
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=sink, mode='wb', compresslevel=6)
+    if compression == 'bz2':
+        return bz2.BZ2File(sink, mode='wb')
+    if compression == 'xz':
+        # The default preset is an order of magnitude slower for a few percent smaller files
+        return lzma.LZMAFile(sink, mode='wb', preset=1)
+    return sink
+
+
+def _store_frame(store, start, stop):
+    """
+    Data frame over rows [start, stop) of a record store, sharing its arrays
+
+    Category columns keep the store's full category list, so every chunk has the same dictionary.
+    """
+    data = {}
+    for key in store.keys:
+        column = store.columns[key]
+        if isinstance(column, CategoryColumn):
+            data[key] = pd.Categorical.from_codes(column.codes[start:stop], column.categories)
+        else:
+            data[key] = column[start:stop]
+    return pd.DataFrame(data, columns=store.keys, copy=False)
+
+
+class Exporter:
+    """
+    Chunked writer for one export file
+
+    Rows are buffered and written chunk_rows at a time; frames and record stores are sliced into
+    chunks of the same size. The file is written next to its destination and moved into place on
+    close, so readers never see a partial export. target may also be a writable binary file
+    object, which is written directly. CSV goes through pyarrow's writer when it is installed,
+    which is many times faster than formatting rows in Python, and through pandas otherwise.
+    """
+
+    def __init__(self, target, format=None, compression=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        if format is None:
+            if not isinstance(target, str):
+                raise ValueError("format is required when exporting to a file object")
+            format, inferred = infer_format(target)
+            compression = compression or inferred
+        if format not in FORMATS:
+            raise ValueError(f"Unknown export format {format!r}, expected one of {', '.join(FORMATS)}")
+        if compression is None:
+            compression = DEFAULT_COMPRESSION[format]
+        elif compression == 'none':
+            compression = None
+        if compression is not None and compression not in COMPRESSIONS[format]:
+            raise ValueError(f"{format} exports can't use {compression!r} compression; "
+                             f"expected one of {', '.join(COMPRESSIONS[format])}")
+        if format != 'csv':
+            _require_pyarrow(format)
+
+        self.target = target
+        self.format = format
+        self.compression = compression
+        self.chunk_rows = max(1, chunk_rows)
+        self.rows = 0
+        self.buffer = []
+        self.columns = None
+        self.schema = None
+        self.writer = None
+        self.closed = False
+
+        if isinstance(target, str):
+            directory = os.path.dirname(os.path.abspath(target))
+            os.makedirs(directory, exist_ok=True)
+            self.tmp_path = f"{target}.{os.getpid()}.tmp"
+            self.sink = open(self.tmp_path, 'wb')
+        else:
+            self.tmp_path = None
+            self.sink = target
+        self.out = _compress(self.sink, compression) if format == 'csv' else self.sink
+        # Text stream for the pandas CSV fallback
+        self.stream = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def write(self, row):
+        """
+        Add one row dict, writing a chunk when the buffer is full
+        """
+        self.buffer.append(row)
+        if len(self.buffer) >= self.chunk_rows:
+            self.flush()
+
+    def write_rows(self, rows):
+        """
+        Add rows from any iterable, such as rows streaming out of the fetch pipeline
+        """
+        for row in rows:
+            self.write(row)
+
+    def write_frame(self, df):
+        """
+        Write a data frame in chunks
+        """
+        self.flush()
+        for start in range(0, len(df), self.chunk_rows):
+            self._write_chunk(df.iloc[start:start + self.chunk_rows])
+
+    def write_store(self, store):
+        """
+        Write a columnar record store in chunks, without building row dicts
+        """
+        self.flush()
+        for start in range(0, len(store), self.chunk_rows):
+            self._write_chunk(_store_frame(store, start, min(start + self.chunk_rows, len(store))))
+
+    def flush(self):
+        """
+        Write the buffered rows as one chunk
+        """
+        if self.buffer:
+            rows, self.buffer = self.buffer, []
+            self._write_chunk(pd.DataFrame(rows, columns=self.columns))
+
+    def _write_chunk(self, frame):
+        if self.columns is None:
+            self.columns = list(frame.columns)
+        else:
+            # Later chunks follow the first chunk's columns
+            frame = frame.reindex(columns=self.columns)
+
+        if self.format == 'csv' and pa is None:
+            if self.stream is None:
+                self.stream = io.TextIOWrapper(self.out, encoding='utf-8', newline='')
+            frame.to_csv(self.stream, header=self.rows == 0, index=False)
+        else:
+            if self.writer is None:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                self.schema = table.schema
+                self.writer = self._open_writer(self.schema)
+            else:
+                table = pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+            self.writer.write_table(table)
+        self.rows += len(frame)
+
+    def _open_writer(self, schema):
+        if self.format == 'csv':
+            return pa_csv.CSVWriter(self.out, schema)
+        if self.format == 'parquet':
+            return pq.ParquetWriter(self.sink, schema, compression=self.compression or 'none')
+        options = ipc.IpcWriteOptions(compression=self.compression)
+        return ipc.new_file(self.sink, schema, options=options)
+
+    def close(self):
+        """
+        Write any buffered rows, finish the file and move it into place; returns the rows written
+        """
+        if self.closed:
+            return self.rows
+        self.flush()
+        if self.writer is None and self.format != 'csv':
+            # An empty Parquet or Arrow file still needs its footer
+            self.writer = self._open_writer(pa.schema([]))
+        if self.writer is not None:
+            self.writer.close()
+        if self.stream is not None:
+            self.stream.flush()
+            self.stream.detach()
+        if self.out is not self.sink:
+            # Finishes the compressed stream
+            self.out.close()
+        if self.tmp_path is not None:
+            self.sink.close()
+            os.replace(self.tmp_path, self.target)
+        self.closed = True
+        return self.rows
+
+    def abort(self):
+        """
+        Stop writing and remove the partial file
+        """
+        self.closed = True
+        if self.tmp_path is None:
+            return
+        try:
+            self.sink.close()
+        finally:
+            try:
+                os.remove(self.tmp_path)
+            except FileNotFoundError:
+                pass
+
+
+def export(data, target, format=None, compression=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Write rows to target in chunks and return the number of rows written
+
+    data can be a record store, a data frame or any iterable of row dicts (a generator of rows is
+    consumed as it goes, so it is never held in memory as a whole). The format and compression
+    default to those implied by target's file name.
+    """
+    with Exporter(target, format, compression, chunk_rows) as exporter:
+        if isinstance(data, RecordStore):
+            exporter.write_store(data)
+        elif isinstance(data, pd.DataFrame):
+            exporter.write_frame(data)
+        else:
+            exporter.write_rows(data)
+    return exporter.rows
+
+
+def export_bytes(data, format='csv', compression=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Export to an in-memory file and return its bytes, e.g. for a download button
+    """
+    buffer = io.BytesIO()
+    export(data, buffer, format, compression, chunk_rows)
+    return buffer.getvalue()
+
+
+def read_export(path):
+    """
+    Load an export back as a data frame, whatever its format
+    """
+    format, compression = infer_format(path)
+    if format == 'csv':
+        return pd.read_csv(path, compression=compression)
+    _require_pyarrow(format)
+    if format == 'parquet':
+        return pq.read_table(path).to_pandas()
+    with pa.memory_map(path) as source:
+        return ipc.open_file(source).read_all().to_pandas()
+
+
+def add_export_arguments(parser):
+    """
+    Add --output and --export-universe to a front end's argument parser
+    """
+    parser.add_argument("--output", default="stock_screener_results.csv", metavar="PATH",
+                        help="where saved results go; .csv[.gz|.bz2|.xz], .parquet or .arrow (default %(default)s)")
+    parser.add_argument("--export-universe", metavar="PATH",
+                        help="also write every fetched stock, not just the matches, to this file")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a screener export to another format")
+    parser.add_argument("source", help="existing export, e.g. stock_screener_results.csv")
+    parser.add_argument("target", help="file to write, e.g. results.parquet or results.csv.gz")
+    parser.add_argument("--compression", help="codec for the target (default: from its name, or the format's default)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="rows per chunk (default %(default)s)")
+    args = parser.parse_args()
+
+    source_format, source_compression = infer_format(args.source)
+    if source_format == 'csv':
+        # Read and write a chunk at a time, so converting a large CSV keeps memory flat
+        chunks = pd.read_csv(args.source, compression=source_compression, chunksize=args.chunk_rows)
+        with Exporter(args.target, compression=args.compression, chunk_rows=args.chunk_rows) as exporter:
+            for chunk in chunks:
+                exporter.write_frame(chunk)
+        rows = exporter.rows
+    else:
+        rows = export(read_export(args.source), args.target, compression=args.compression, chunk_rows=args.chunk_rows)
+    print(f"Wrote {rows} rows to {args.target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Factors Module
+Registry of screen factors computed in bulk over a dates x tickers close matrix.
+Windows shared by several factors (tails, rolling means and maxima) are computed once per pass.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from screening_core import build_close_matrix
+
+Factor = namedtuple('Factor', ['name', 'label', 'func'])
+
+# Registered factors by name, in registration order
+FACTORS = {}
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def register_factor(name, label):
+    """
+    Decorator registering func(context) -> Series indexed by ticker as a screen factor
+    """
+    def decorator(func):
+        FACTORS[name] = Factor(name, label, func)
+        return func
+    return decorator
+
+
+class FactorContext:
+    """
+    Shared intermediate results for one factor pass over a close matrix
+    """
+
+    def __init__(self, closes):
+        self.closes = closes
+        self.filled = closes.ffill()
+        self.counts = closes.notna().sum()
+        self._cache = {}
+
+    def _memo(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def price(self):
+        return self._memo('price', lambda: self.filled.iloc[-1])
+
+    @property
+    def daily_returns(self):
+        return self._memo('daily_returns', lambda: self.filled.pct_change(fill_method=None))
+
+    def tail(self, window):
+        """
+        Last `window` rows of the forward-filled closes
+        """
+        return self._memo(('tail', window), lambda: self.filled.iloc[-window:])
+
+    def enough(self, series, window):
+        """
+        Blank out tickers with fewer than `window` closes
+        """
+        return series.where(self.counts >= window)
+
+    def close_ago(self, bars):
+        """
+        Close `bars` bars before the latest one
+        """
+        def compute():
+            if len(self.filled) <= bars:
+                return pd.Series(np.nan, index=self.closes.columns)
+            return self.filled.iloc[-1 - bars]
+        return self._memo(('close_ago', bars), compute)
+
+    def rolling_mean(self, window):
+        return self._memo(('mean', window), lambda: self.enough(self.tail(window).mean(), window))
+
+    def rolling_max(self, window):
+        return self._memo(('max', window), lambda: self.enough(self.tail(window).max(), window))
+
+    def rolling_volatility(self, window):
+        """
+        Annualized standard deviation of daily returns over the window, in percent
+        """
+        def compute():
+            std = self.daily_returns.iloc[-window:].std()
+            return self.enough(std * np.sqrt(TRADING_DAYS_PER_YEAR) * 100, window + 1)
+        return self._memo(('vol', window), compute)
+
+
+def _register_return(days):
+    @register_factor(f'ret_{days}d', f'{days}-Day Return (%)')
+    def factor(ctx):
+        # Matches the screeners' definition: close `days - 1` bars ago to the latest close
+        start = ctx.close_ago(days - 1)
+        return ctx.enough((ctx.price - start) / start * 100, days)
+    return factor
+
+
+for _days in (20, 60, 120, 250):
+    _register_return(_days)
+
+
+def _register_volatility(days):
+    @register_factor(f'vol_{days}d', f'{days}-Day Volatility (%)')
+    def factor(ctx):
+        return ctx.rolling_volatility(days)
+    return factor
+
+
+for _days in (20, 60):
+    _register_volatility(_days)
+
+
+@register_factor('max_dd_250d', '250-Day Max Drawdown (%)')
+def max_drawdown(ctx):
+    tail = ctx.tail(250)
+    drawdown = (tail / tail.cummax() - 1).min() * 100
+    return ctx.enough(drawdown, 250)
+
+
+@register_factor('sma_50', '50-Day SMA ($)')
+def sma_50(ctx):
+    return ctx.rolling_mean(50)
+
+
+@register_factor('sma_200', '200-Day SMA ($)')
+def sma_200(ctx):
+    return ctx.rolling_mean(200)
+
+
+@register_factor('sma_50_200_spread', 'SMA 50/200 Spread (%)')
+def sma_spread(ctx):
+    return (ctx.rolling_mean(50) / ctx.rolling_mean(200) - 1) * 100
+
+
+@register_factor('golden_cross', 'SMA 50 Above 200')
+def golden_cross(ctx):
+    spread = sma_spread(ctx)
+    return (spread > 0).astype('float64').where(spread.notna())
+
+
+@register_factor('dist_52w_high', 'Distance from 52-Week High (%)')
+def distance_from_high(ctx):
+    high = ctx.rolling_max(TRADING_DAYS_PER_YEAR)
+    return (ctx.price / high - 1) * 100
+
+
+def compute_factors(closes, names=None):
+    """
+    Compute the named factors (all registered ones by default) for every ticker in one pass
+
+    Returns a frame indexed by ticker with one column per factor name.
+    """
+    names = list(names) if names is not None else list(FACTORS)
+    unknown = [name for name in names if name not in FACTORS]
+    if unknown:
+        raise KeyError(f"Unknown factors: {', '.join(unknown)}")
+
+    if closes.empty:
+        return pd.DataFrame(columns=names, dtype='float64')
+
+    ctx = FactorContext(closes)
+    return pd.DataFrame({name: FACTORS[name].func(ctx) for name in names}, index=closes.columns)
+
+
+def attach_factors(rows, histories, names):
+    """
+    Add factor columns (keyed by factor label) to screen rows, computed from their histories
+    """
+    if not names or not rows:
+        return rows
+
+    values = compute_factors(build_close_matrix(histories), names)
+    for row in rows:
+        set_factor_columns(row, values, names)
+    return rows
+
+
+def set_factor_columns(row, values, names):
+    """
+    Copy one ticker's values from a compute_factors frame into its row, keyed by factor label
+    """
+    ticker = row['Ticker']
+    for name in names:
+        value = values.at[ticker, name] if ticker in values.index else np.nan
+        row[FACTORS[name].label] = float(value)
+    return row
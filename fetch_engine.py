@@ -0,0 +1,137 @@
+"""
+Fetch Engine Module
+Fetches per-ticker stock data concurrently with a bounded thread pool and per-host rate limiting.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Host that yfinance sends its quote and history requests to
+YAHOO_HOST = "query2.finance.yahoo.com"
+
+# Defaults, overridable through the environment
+DEFAULT_MAX_WORKERS = int(os.environ.get("SCREENER_MAX_WORKERS", "8"))
+DEFAULT_RATE_LIMIT = float(os.environ.get("SCREENER_RATE_LIMIT", "10"))  # requests per second per host
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` acquisitions per second with bursts of up to `burst`
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available, then take it
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class FetchEngine:
+    """
+    Runs a per-ticker fetch function over a universe using a bounded thread pool
+    """
+
+    def __init__(self, max_workers=None, rate_limit=None, host_rate_limits=None, client=None):
+        self.max_workers = max(1, int(max_workers or DEFAULT_MAX_WORKERS))
+        # A provider_client.ProviderClient the provider sends each of its requests through; it takes
+        # over rate limiting, retries and circuit breaking, so fetches are not limited here as well
+        self.client = client
+        self.rate_limit = DEFAULT_RATE_LIMIT if rate_limit is None else rate_limit
+        self.host_rate_limits = dict(host_rate_limits or {})
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
+
+    def limiter_for(self, host):
+        """
+        Return the shared rate limiter for a host, or None when the host is unlimited
+        """
+        with self._limiters_lock:
+            if host not in self._limiters:
+                rate = self.host_rate_limits.get(host, self.rate_limit)
+                self._limiters[host] = RateLimiter(rate) if rate and rate > 0 else None
+            return self._limiters[host]
+
+    def _run_one(self, fetch_one, ticker, host):
+        if self.client is not None:
+            return fetch_one(ticker)
+        limiter = self.limiter_for(host)
+        if limiter is not None:
+            limiter.acquire()
+        return fetch_one(ticker)
+
+    def iter_fetch(self, tickers, fetch_one, host=YAHOO_HOST, on_progress=None, on_error=None, window=None):
+        """
+        Yield (ticker, row) as each ticker completes, in completion order
+
+        At most `window` tickers (default: twice the worker count) are submitted or waiting to be
+        consumed at any time, so memory stays bounded however large the universe is. Tickers whose
+        fetch_one returns None are not yielded. Closing the generator early cancels the rest.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        total = len(tickers)
+        window = max(1, int(window or 2 * self.max_workers))
+        pending = iter(tickers)
+        done = 0
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        in_flight = {}
+        try:
+            while True:
+                # Top the window back up before waiting on it
+                for ticker in pending:
+                    in_flight[executor.submit(self._run_one, fetch_one, ticker, host)] = ticker
+                    if len(in_flight) >= window:
+                        break
+                if not in_flight:
+                    return
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    ticker = in_flight.pop(future)
+                    done += 1
+                    row = None
+                    try:
+                        row = future.result()
+                    except Exception as e:
+                        if on_error is not None:
+                            on_error(ticker, e)
+
+                    if on_progress is not None:
+                        on_progress(done, total, ticker)
+                    if row is not None:
+                        yield ticker, row
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def fetch(self, tickers, fetch_one, host=YAHOO_HOST, on_progress=None, on_error=None):
+        """
+        Call fetch_one(ticker) for every ticker in parallel and return the rows in ticker order
+
+        fetch_one returns a row dict, or None to drop the ticker. on_progress(done, total, ticker)
+        and on_error(ticker, exception) are called from the calling thread as tickers complete,
+        so front ends can update their UI from them.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        results = dict(self.iter_fetch(tickers, fetch_one, host, on_progress, on_error))
+        return [results[ticker] for ticker in tickers if ticker in results]
@@ -0,0 +1,182 @@
+"""
+Fundamentals Cache Module
+Caches the Ticker.info fields the screeners use, with a TTL per field, LRU eviction and a JSON file on disk.
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from history_cache import CACHE_DIR
+from json_store import load_json, save_json
+
+# How long each cached info field stays fresh, in seconds
+FIELD_TTLS = {
+    'shortName': 7 * 24 * 3600,
+    'sector': 7 * 24 * 3600,
+    'industry': 7 * 24 * 3600,
+    'marketCap': float(os.environ.get("SCREENER_MARKET_CAP_TTL", str(12 * 3600))),
+}
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("SCREENER_FUNDAMENTALS_MAX_ENTRIES", "10000"))
+
+
+class FundamentalsCache:
+    """
+    LRU cache of per-ticker info fields, each stored with the time it was fetched
+    """
+
+    def __init__(self, path=None, field_ttls=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or os.path.join(CACHE_DIR, "fundamentals.json")
+        self.field_ttls = dict(field_ttls or FIELD_TTLS)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.dirty = False
+        # Modification time of the cache file when it was last read or written
+        self.mtime = None
+        self.load()
+
+    def load(self):
+        """
+        Merge entries from the cache file, keeping whichever copy of a field is newer
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        stored = load_json(self.path)
+        if stored is None:
+            return
+        self.mtime = mtime
+
+        with self.lock:
+            for ticker, fields in stored.items():
+                entry = self.entries.setdefault(ticker, {})
+                for field, (value, fetched_at) in fields.items():
+                    if field not in entry or entry[field][1] < fetched_at:
+                        entry[field] = (value, fetched_at)
+            self._evict()
+
+    def save(self):
+        """
+        Write the cache file atomically so concurrent readers never see a partial file
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            snapshot = {ticker: dict(fields) for ticker, fields in self.entries.items()}
+            self.dirty = False
+
+        self.mtime = save_json(self.path, snapshot)
+
+    def refresh(self):
+        """
+        Merge the cache file again if another process, such as the prefetch daemon, saved it since
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        self.load()
+        return True
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, ticker, now=None):
+        """
+        Return (fields, stale) for a ticker: the fresh cached values, and the names of the tracked
+        fields that are missing or past their TTL
+        """
+        now = now or time.time()
+        with self.lock:
+            entry = self.entries.get(ticker)
+            if entry is None:
+                return {}, set(self.field_ttls)
+
+            fields, stale = {}, set()
+            for field, ttl in self.field_ttls.items():
+                if field not in entry or now - entry[field][1] > ttl:
+                    stale.add(field)
+                elif entry[field][0] is not None:
+                    fields[field] = entry[field][0]
+
+            self.entries.move_to_end(ticker)
+            return fields, stale
+
+    def peek(self, ticker, field):
+        """
+        Return the last cached value of one field however old it is, or None
+        """
+        with self.lock:
+            entry = self.entries.get(ticker)
+            return entry[field][0] if entry is not None and field in entry else None
+
+    def put(self, ticker, info, now=None, fields=None):
+        """
+        Store the tracked fields from an info dict, or only the given ones
+        """
+        now = now or time.time()
+        with self.lock:
+            entry = self.entries.setdefault(ticker, {})
+            for field in fields or self.field_ttls:
+                entry[field] = (info.get(field), now)
+            self.entries.move_to_end(ticker)
+            self._evict()
+            self.dirty = True
+
+    def get_info(self, ticker, fetch_info, ahead=0):
+        """
+        Return the tracked info fields for a ticker, calling fetch_info(stale) only when some are stale
+
+        fetch_info gets the names of the stale fields and returns an info dict holding at least
+        those; fresh fields keep their cached values. Fields that would go stale within `ahead`
+        seconds count as stale already.
+        """
+        now = time.time() + ahead
+        fields, stale = self.get(ticker, now)
+        if stale and self.refresh():
+            fields, stale = self.get(ticker, now)
+        if not stale:
+            return fields
+
+        info = fetch_info(stale)
+        self.put(ticker, info, fields=stale)
+        fields.update((field, info[field]) for field in stale if info.get(field) is not None)
+        return fields
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_fundamentals_cache():
+    """
+    Return the process-wide fundamentals cache, loading it from disk on first use
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = FundamentalsCache()
+            atexit.register(_default_cache.save)
+        return _default_cache
+
+
+def get_fundamentals(ticker, fetch_info):
+    """
+    Look up a ticker's info fields through the process-wide cache; fetch_info(stale) as for get_info
+    """
+    return get_fundamentals_cache().get_info(ticker, fetch_info)
+
+
+def save_fundamentals():
+    """
+    Persist any fields fetched since the last save
+    """
+    get_fundamentals_cache().save()
@@ -0,0 +1,221 @@
+"""
+History Archive Module
+Fixed-layout binary archive of daily OHLCV for a whole universe, opened with numpy.memmap so slices are read on demand.
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from history_loader import PRICE_COLUMNS
+
+FORMAT_VERSION = 1
+INDEX_FILE = "index.json"
+
+# Price fields stored as float32 planes; volume is kept separately as int64
+PRICE_FIELDS = ['Open', 'High', 'Low', 'Close']
+PRICE_DTYPE = np.float32
+VOLUME_DTYPE = np.int64
+
+
+def _day_index(index):
+    """
+    Normalize a history index to tz-naive midnight dates
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.normalize()
+
+
+def _open_array(path, dtype, shape, mode):
+    # np.memmap can't map an empty file
+    if 0 in shape:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+
+def write_archive(histories, path):
+    """
+    Write per-ticker history frames into an archive directory and return the opened archive
+
+    Prices go into one float32 array shaped (field, ticker, date), so a ticker's closes over a
+    date range are one contiguous run, and volumes into an int64 (ticker, date) array. Missing
+    bars are NaN prices and zero volume. Data files are written under a new generation and the
+    index is replaced last, so processes that still map the previous generation keep reading it.
+    """
+    os.makedirs(path, exist_ok=True)
+    histories = {ticker: hist for ticker, hist in histories.items() if hist is not None and not hist.empty}
+    tickers = list(histories)
+
+    # Most tickers trade on the same days, so each distinct index is only normalized once; the
+    # rest of the write is plain NumPy on int64 day stamps
+    normalized = {}
+    days = {}
+    for ticker, hist in histories.items():
+        key = (str(hist.index.dtype), hist.index.asi8.tobytes())
+        if key not in normalized:
+            normalized[key] = _day_index(hist.index).values.astype('datetime64[ns]').view('int64')
+        days[ticker] = normalized[key]
+    stamps = np.unique(np.concatenate(list(days.values()))) if days else np.array([], dtype='int64')
+    dates = pd.DatetimeIndex(stamps.view('datetime64[ns]'))
+    shape = (len(tickers), len(dates))
+
+    previous = _read_index(path)
+    generation = previous['generation'] + 1 if previous else 1
+    files = {'prices': f"prices-{generation}.f32", 'volume': f"volume-{generation}.i64"}
+
+    prices = _open_array(os.path.join(path, files['prices']), PRICE_DTYPE, (len(PRICE_FIELDS),) + shape, 'w+')
+    volume = _open_array(os.path.join(path, files['volume']), VOLUME_DTYPE, shape, 'w+')
+    prices[:] = np.nan
+    volume[:] = 0
+
+    # One ticker at a time, so only a single frame is converted at once
+    for i, ticker in enumerate(tickers):
+        hist = histories[ticker]
+        positions = np.searchsorted(stamps, days[ticker])
+        # Missing fields are stored as missing bars rather than copies of another column
+        values = hist.reindex(columns=PRICE_COLUMNS).to_numpy(dtype='float64')
+        prices[:, i, positions] = values[:, :len(PRICE_FIELDS)].T
+        volume[i, positions] = np.nan_to_num(values[:, -1]).astype(VOLUME_DTYPE)
+
+    for array in (prices, volume):
+        if isinstance(array, np.memmap):
+            array.flush()
+    del prices, volume
+
+    index = {
+        'version': FORMAT_VERSION,
+        'generation': generation,
+        'created': time.time(),
+        'tickers': tickers,
+        'dates': [day.date().isoformat() for day in dates],
+        'fields': PRICE_FIELDS,
+        'files': files,
+    }
+    tmp = os.path.join(path, INDEX_FILE + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp, os.path.join(path, INDEX_FILE))
+
+    # Earlier generations are unlinked; readers that mapped them keep their pages until they close
+    if previous:
+        for name in previous['files'].values():
+            try:
+                os.remove(os.path.join(path, name))
+            except FileNotFoundError:
+                pass
+
+    return HistoryArchive(path)
+
+
+def _read_index(path):
+    try:
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return None
+    if index.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported history archive version {index.get('version')} in {path}")
+    return index
+
+
+class HistoryArchive:
+    """
+    Read-only view of an archive written by write_archive
+
+    The arrays are memory-mapped read-only, so only the pages a slice touches are read, and every
+    process that opens the same archive shares them through the OS page cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        index = _read_index(self.path)
+        if index is None:
+            raise FileNotFoundError(f"No history archive in {self.path}")
+
+        self.generation = index['generation']
+        self.tickers = index['tickers']
+        self.dates = pd.DatetimeIndex(pd.to_datetime(index['dates']), name='Date')
+        self.positions = {ticker: i for i, ticker in enumerate(self.tickers)}
+        shape = (len(self.tickers), len(self.dates))
+        self.prices = _open_array(os.path.join(self.path, index['files']['prices']), PRICE_DTYPE,
+                                  (len(PRICE_FIELDS),) + shape, 'r')
+        self.volume = _open_array(os.path.join(self.path, index['files']['volume']), VOLUME_DTYPE, shape, 'r')
+
+    def __contains__(self, ticker):
+        return ticker in self.positions
+
+    def __len__(self):
+        return len(self.tickers)
+
+    @property
+    def nbytes(self):
+        """
+        Size of the mapped arrays (not what is resident in memory)
+        """
+        return int(self.prices.nbytes + self.volume.nbytes)
+
+    def date_slice(self, start=None, end=None):
+        """
+        Slice of date positions between start and end, both inclusive
+        """
+        lo = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start))
+        hi = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), side='right')
+        return slice(lo, hi)
+
+    def history(self, ticker, start=None, end=None):
+        """
+        History frame for one ticker, dropping dates it has no bar for (empty when not archived)
+        """
+        if ticker not in self.positions:
+            return pd.DataFrame(columns=PRICE_COLUMNS, dtype='float64')
+
+        i = self.positions[ticker]
+        days = self.date_slice(start, end)
+        frame = pd.DataFrame(
+            {field: self.prices[f, i, days].astype('float64') for f, field in enumerate(PRICE_FIELDS)},
+            index=self.dates[days],
+        )
+        frame['Volume'] = self.volume[i, days].astype('float64')
+        return frame[frame['Close'].notna()]
+
+    def histories(self, tickers, start=None, end=None):
+        """
+        History frames for many tickers, keyed by ticker
+        """
+        return {ticker: self.history(ticker, start, end) for ticker in tickers}
+
+    def close_matrix(self, tickers=None, start=None, end=None):
+        """
+        dates x tickers frame of closes, like screening_core.build_close_matrix over the archive
+
+        Only the close plane is read, one contiguous run per ticker.
+        """
+        tickers = [ticker for ticker in (self.tickers if tickers is None else tickers) if ticker in self.positions]
+        days = self.date_slice(start, end)
+        rows = [self.positions[ticker] for ticker in tickers]
+        closes = self.prices[PRICE_FIELDS.index('Close'), rows, days].astype('float64').T
+        return pd.DataFrame(closes, index=self.dates[days], columns=tickers)
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_history_archive(path):
+    """
+    Return the process-wide archive for a directory, reopening it when a new generation is written
+    """
+    path = os.path.abspath(path)
+    # The index is only replaced by a new generation, so its mtime tells whether to reopen
+    written = os.stat(os.path.join(path, INDEX_FILE)).st_mtime_ns
+    with _archives_lock:
+        entry = _archives.get(path)
+        if entry is None or entry[1] != written:
+            entry = _archives[path] = (HistoryArchive(path), written)
+        return entry[0]
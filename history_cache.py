@@ -0,0 +1,257 @@
+"""
+History Cache Module
+Keeps daily price history on disk in SQLite so repeat screens only download the bars added since the last run.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from history_loader import PRICE_COLUMNS, load_histories
+
+# Where the on-disk caches live
+CACHE_DIR = os.environ.get(
+    "SCREENER_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "stock_screener"),
+)
+
+# Cached history younger than this is served without asking the provider for new bars
+DEFAULT_MAX_AGE = float(os.environ.get("SCREENER_HISTORY_MAX_AGE", "3600"))  # seconds
+
+# Size bounds: least recently used tickers are evicted past max_tickers, old bars past retention
+DEFAULT_MAX_TICKERS = int(os.environ.get("SCREENER_HISTORY_MAX_TICKERS", "5000"))
+
+# Calendar days covered by each supported period
+PERIOD_DAYS = {
+    '1mo': 31,
+    '3mo': 92,
+    '6mo': 183,
+    '1y': 366,
+    '2y': 731,
+    '5y': 1827,
+}
+
+# Keep enough bars to cover the longest period, otherwise those loads would always miss the cache
+DEFAULT_RETENTION_DAYS = max(PERIOD_DAYS.values())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    ticker TEXT NOT NULL,
+    date TEXT NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    volume REAL,
+    PRIMARY KEY (ticker, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    ticker TEXT PRIMARY KEY,
+    covered_from TEXT NOT NULL,
+    last_date TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+"""
+
+
+class HistoryCache:
+    """
+    SQLite store of daily bars keyed by ticker, with per-ticker fetch metadata
+    """
+
+    def __init__(self, path=None, max_age=DEFAULT_MAX_AGE, max_tickers=DEFAULT_MAX_TICKERS,
+                 retention_days=DEFAULT_RETENTION_DAYS, loader=load_histories):
+        self.path = path or os.path.join(CACHE_DIR, "history.sqlite3")
+        self.max_age = max_age
+        self.max_tickers = max_tickers
+        self.retention_days = retention_days
+        self.loader = loader
+        self.lock = threading.Lock()
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _meta(self, tickers):
+        placeholders = ",".join("?" * len(tickers))
+        rows = self.conn.execute(
+            f"SELECT ticker, covered_from, last_date, fetched_at FROM meta WHERE ticker IN ({placeholders})",
+            tickers,
+        ).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def get(self, ticker, since=None):
+        """
+        Return the cached bars for a ticker as a frame indexed by date (empty if not cached)
+        """
+        query = "SELECT date, open, high, low, close, volume FROM bars WHERE ticker = ?"
+        params = [ticker]
+        if since is not None:
+            query += " AND date >= ?"
+            params.append(since.isoformat())
+
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY date", params).fetchall()
+
+        frame = pd.DataFrame(rows, columns=['Date'] + PRICE_COLUMNS)
+        frame.index = pd.DatetimeIndex(pd.to_datetime(frame.pop('Date')), name='Date')
+        return frame.astype('float64')
+
+    def put(self, ticker, hist, covered_from=None, now=None):
+        """
+        Upsert bars for a ticker and record the last cached date
+
+        A ticker that came back without bars is recorded too, with an empty last date, so it is
+        not downloaded again until its entry is stale.
+        """
+        now = now or time.time()
+        if hist is None:
+            hist = pd.DataFrame(columns=PRICE_COLUMNS, dtype='float64')
+        hist = hist.reindex(columns=PRICE_COLUMNS)
+        dates = [ts.date().isoformat() for ts in hist.index]
+        records = [
+            (ticker, day, *[None if pd.isna(v) else float(v) for v in values])
+            for day, values in zip(dates, hist.itertuples(index=False, name=None))
+        ]
+        cutoff = (date.today() - timedelta(days=self.retention_days)).isoformat()
+
+        with self.lock, self.conn:
+            existing = self.conn.execute(
+                "SELECT covered_from FROM meta WHERE ticker = ?", (ticker,)
+            ).fetchone()
+            covered_from = covered_from or (existing[0] if existing else min(dates, default=date.today().isoformat()))
+
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?)", records
+            )
+            self.conn.execute("DELETE FROM bars WHERE ticker = ? AND date < ?", (ticker, cutoff))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?, "
+                "COALESCE((SELECT MAX(date) FROM bars WHERE ticker = ?), ''), ?, ?)",
+                (ticker, max(covered_from, cutoff), ticker, now, now),
+            )
+
+    def touch(self, tickers, now=None):
+        now = now or time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE meta SET last_access = ? WHERE ticker = ?",
+                [(now, ticker) for ticker in tickers],
+            )
+
+    def evict(self):
+        """
+        Drop the least recently used tickers beyond max_tickers
+        """
+        with self.lock, self.conn:
+            stale = self.conn.execute(
+                "SELECT ticker FROM meta ORDER BY last_access DESC LIMIT -1 OFFSET ?",
+                (self.max_tickers,),
+            ).fetchall()
+            for (ticker,) in stale:
+                self.conn.execute("DELETE FROM bars WHERE ticker = ?", (ticker,))
+                self.conn.execute("DELETE FROM meta WHERE ticker = ?", (ticker,))
+        return [ticker for (ticker,) in stale]
+
+    def plan(self, tickers, period="1y", now=None):
+        """
+        Split tickers into fresh, top-up and full-fetch groups
+
+        Returns (fresh, tails, missing) where tails maps a start date to the tickers whose
+        cached bars end on that date.
+        """
+        now = now or time.time()
+        start = (date.today() - timedelta(days=PERIOD_DAYS.get(period, 366))).isoformat()
+        with self.lock:
+            meta = self._meta(tickers) if tickers else {}
+
+        fresh, tails, missing = [], {}, []
+        for ticker in tickers:
+            if ticker not in meta or meta[ticker][0] > start:
+                missing.append(ticker)
+            elif now - meta[ticker][2] <= self.max_age:
+                fresh.append(ticker)
+            elif not meta[ticker][1]:
+                # Had no bars last time; once stale it is asked for the whole period again
+                missing.append(ticker)
+            else:
+                # Re-fetch from the last cached bar so a partial intraday bar gets replaced
+                tails.setdefault(meta[ticker][1], []).append(ticker)
+
+        return fresh, tails, missing
+
+    def top_up(self, histories):
+        """
+        Store recent bars for the tickers already cached, e.g. the few daily bars of a quote batch
+
+        Tickers not cached yet are left out, since a few bars don't cover any history period.
+        """
+        tickers = [ticker for ticker, hist in histories.items() if hist is not None and not hist.empty]
+        with self.lock:
+            cached = self._meta(tickers) if tickers else {}
+        for ticker in tickers:
+            if ticker in cached:
+                self.put(ticker, histories[ticker])
+        return histories
+
+    def load(self, tickers, period="1y", ahead=0):
+        """
+        Return a history frame for every ticker, downloading only what the cache is missing
+
+        Bars that would go stale within `ahead` seconds are topped up now, so a prefetch can
+        refresh tickers before a screen finds them stale.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        fresh, tails, missing = self.plan(tickers, period, now=time.time() + ahead)
+        since = date.today() - timedelta(days=PERIOD_DAYS.get(period, 366))
+        histories = {}
+
+        if missing:
+            downloaded = self.loader(missing, period)
+            for ticker in missing:
+                self.put(ticker, downloaded.get(ticker), covered_from=since.isoformat())
+
+        for start, group in tails.items():
+            downloaded = self.loader(group, period, start=start)
+            for ticker in group:
+                self.put(ticker, downloaded.get(ticker))
+
+        for ticker in tickers:
+            histories[ticker] = self.get(ticker, since)
+
+        self.touch(tickers)
+        self.evict()
+        return histories
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_history_cache():
+    """
+    Return the process-wide history cache, opening it on first use
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = HistoryCache()
+        return _default_cache
+
+
+def load_cached_histories(tickers, period="1y"):
+    """
+    Load histories through the process-wide on-disk cache
+    """
+    return get_history_cache().load(tickers, period)
@@ -0,0 +1,158 @@
+"""
+History Loader Module
+Downloads price history for many tickers in a few bulk requests instead of one request per ticker.
+"""
+
+import os
+import urllib.parse
+from datetime import date
+
+import pandas as pd
+import yfinance as yf
+
+from provider_client import get_provider_client
+
+# When set, histories are read from this Yahoo-compatible spark endpoint (e.g. a local stub server)
+HISTORY_BASE_URL = os.environ.get("SCREENER_HISTORY_URL")
+
+# Symbols requested per bulk call
+DOWNLOAD_CHUNK_SIZE = 100
+SPARK_CHUNK_SIZE = 20
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Spark ranges in increasing order with the calendar days each one covers
+SPARK_RANGES = [('5d', 7), ('1mo', 30), ('3mo', 90), ('6mo', 180), ('1y', 365), ('2y', 730), ('5y', 1825)]
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def split_download_frame(frame, tickers):
+    """
+    Split a combined multi-ticker download frame into one history frame per ticker
+
+    Every requested ticker gets an entry; tickers without data map to an empty frame.
+    """
+    histories = {}
+
+    for ticker in tickers:
+        if frame is None or frame.empty:
+            hist = pd.DataFrame(columns=PRICE_COLUMNS, dtype='float64')
+        elif isinstance(frame.columns, pd.MultiIndex):
+            if ticker in frame.columns.get_level_values(0):
+                hist = frame[ticker]
+            else:
+                hist = pd.DataFrame(columns=PRICE_COLUMNS, dtype='float64')
+        else:
+            # Single-ticker downloads come back with flat columns
+            hist = frame if len(tickers) == 1 else pd.DataFrame(columns=PRICE_COLUMNS, dtype='float64')
+
+        histories[ticker] = hist.dropna(how='all')
+
+    return histories
+
+
+def _download_chunk(tickers, period, interval, start=None):
+    frame = yf.download(
+        tickers,
+        start=start,
+        period=None if start else period,
+        interval=interval,
+        group_by='ticker',
+        auto_adjust=True,
+        threads=True,
+        progress=False,
+    )
+    return split_download_frame(frame, tickers)
+
+
+def parse_spark_response(payload, tickers):
+    """
+    Turn a spark JSON payload into one close-only history frame per ticker
+    """
+    histories = {ticker: pd.DataFrame(columns=['Close'], dtype='float64') for ticker in tickers}
+
+    for result in (payload.get('spark') or {}).get('result') or []:
+        ticker = result.get('symbol')
+        responses = result.get('response') or []
+        if ticker not in histories or not responses:
+            continue
+
+        response = responses[0]
+        timestamps = response.get('timestamp') or []
+        quotes = (response.get('indicators') or {}).get('quote') or [{}]
+        closes = quotes[0].get('close') or []
+
+        n = min(len(timestamps), len(closes))
+        index = pd.to_datetime(timestamps[:n], unit='s', utc=True).tz_convert('America/New_York').normalize()
+        hist = pd.DataFrame({'Close': pd.Series(closes[:n], dtype='float64').to_numpy()}, index=index)
+        histories[ticker] = hist.dropna(how='all')
+
+    return histories
+
+
+def spark_range(start, today=None):
+    """
+    Return the smallest spark range that reaches back to the start date
+    """
+    today = today or date.today()
+    days = (today - pd.Timestamp(start).date()).days
+
+    for range_, range_days in SPARK_RANGES:
+        if days < range_days:
+            return range_
+    return SPARK_RANGES[-1][0]
+
+
+def _spark_chunk(tickers, period, interval, base_url, timeout=10):
+    # Pooled session with retries and throttling shared with everything else calling this host
+    client = get_provider_client(urllib.parse.urlparse(base_url).netloc)
+    response = client.get(
+        f"{base_url.rstrip('/')}/v7/finance/spark",
+        params={'symbols': ','.join(tickers), 'range': period, 'interval': interval},
+        timeout=timeout,
+    )
+    return parse_spark_response(response.json(), tickers)
+
+
+def load_histories(tickers, period="1y", interval="1d", base_url=None, start=None):
+    """
+    Load price history for all tickers using bulk requests
+
+    Returns a dict mapping every ticker to its history frame (empty if the provider had no data).
+    Uses yfinance's multi-symbol download by default, or the spark endpoint at base_url
+    (falling back to SCREENER_HISTORY_URL) when one is configured. When start is given only
+    bars from that date onwards are returned, which is how caches top up their tail.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    base_url = base_url or HISTORY_BASE_URL
+    histories = {}
+
+    if base_url:
+        range_ = spark_range(start) if start else period
+        for chunk in _chunks(tickers, SPARK_CHUNK_SIZE):
+            histories.update(_spark_chunk(chunk, range_, interval, base_url))
+    else:
+        client = get_provider_client()
+        for chunk in _chunks(tickers, DOWNLOAD_CHUNK_SIZE):
+            histories.update(client.call(_download_chunk, chunk, period, interval, start))
+
+    if start:
+        start = pd.Timestamp(start).date()
+        histories = {
+            ticker: hist if hist.empty else hist[hist.index.date >= start]
+            for ticker, hist in histories.items()
+        }
+
+    return histories
+
+
+def load_close_series(tickers, period="1y", interval="1d", base_url=None):
+    """
+    Load only the close price series for each ticker
+    """
+    histories = load_histories(tickers, period, interval, base_url)
+    return {ticker: hist['Close'] for ticker, hist in histories.items()}
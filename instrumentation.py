@@ -0,0 +1,327 @@
+"""
+Instrumentation Module
+Per-stage timers and latency histograms for each screen run, a process-wide registry of recent runs, and optional
+cProfile/pyinstrument dumps for deep dives.
+"""
+
+import bisect
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from history_cache import CACHE_DIR
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:
+    PyinstrumentProfiler = None
+
+# Stages of a screen run, in pipeline order
+STAGES = ['fetch', 'parse', 'compute', 'filter', 'sort', 'render']
+
+# Upper bounds of the latency histogram buckets, in milliseconds (the last bucket is unbounded)
+BUCKET_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+
+# Profiler used for every run when set: 'cprofile' or 'pyinstrument'
+DEFAULT_PROFILE = os.environ.get("SCREENER_PROFILE") or None
+DEFAULT_PROFILE_DIR = os.environ.get("SCREENER_PROFILE_DIR", os.path.join(CACHE_DIR, "profiles"))
+
+# Recent run summaries kept for /api/metrics
+RECENT_RUNS = 20
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram; quantiles are read from the bucket bounds
+    """
+
+    def __init__(self, bounds=BUCKET_BOUNDS_MS):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        with self.lock:
+            self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+            self.count += 1
+            self.total += ms
+            self.max = max(self.max, ms)
+
+    def merge(self, other):
+        with self.lock:
+            for i, n in enumerate(other.counts):
+                self.counts[i] += n
+            self.count += other.count
+            self.total += other.total
+            self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-th quantile, in milliseconds (capped at the max seen)
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count if self.count else 0.0,
+            'p50_ms': self.quantile(0.5),
+            'p90_ms': self.quantile(0.9),
+            'p99_ms': self.quantile(0.99),
+            'max_ms': self.max,
+            'buckets': dict(zip([str(bound) for bound in self.bounds] + ['inf'], self.counts)),
+        }
+
+
+class RunMetrics:
+    """
+    Timings for one screen run: self time per stage plus latency histograms
+
+    Stages nest: time spent in an inner stage is not counted again in the stage around it, so the
+    stage times add up to the instrumented part of the run. Stages timed on worker threads add
+    their busy time, which can exceed wall time when the threads overlap.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.wall = None
+        self.stages = {}
+        self.calls = {}
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time a block as part of a stage
+        """
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        # Each frame collects the time spent in its own nested stages
+        frame = [0.0]
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            with self.lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed - frame[0]
+                self.calls[name] = self.calls.get(name, 0) + 1
+
+    def observe(self, name, seconds):
+        """
+        Add one latency sample to a histogram
+        """
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self):
+        """
+        Stop the wall clock and add the run to the process-wide registry
+        """
+        if self.wall is None:
+            self.wall = time.time() - self.started
+            get_metrics_registry().record(self)
+        return self
+
+    def summary(self):
+        wall = self.wall if self.wall is not None else time.time() - self.started
+        with self.lock:
+            order = [name for name in STAGES if name in self.stages]
+            order += [name for name in self.stages if name not in STAGES]
+            return {
+                'name': self.name,
+                'started': self.started,
+                'wall_seconds': wall,
+                'stages': {name: {'seconds': self.stages[name], 'calls': self.calls[name]} for name in order},
+                'histograms': {name: histogram.summary() for name, histogram in self.histograms.items()},
+                'counters': dict(self.counters),
+            }
+
+    def report(self):
+        """
+        Text lines summarizing the run, for the CLI
+        """
+        summary = self.summary()
+        lines = [f"Timing ({summary['wall_seconds']:.2f}s wall):"]
+        for name, stage in summary['stages'].items():
+            lines.append(f"  {name:<10}{stage['seconds']:>9.3f}s  ({stage['calls']} calls)")
+        for name, histogram in summary['histograms'].items():
+            lines.append(f"  {name}: n={histogram['count']} mean={histogram['mean_ms']:.1f}ms "
+                         f"p50<={histogram['p50_ms']:.0f}ms p90<={histogram['p90_ms']:.0f}ms "
+                         f"p99<={histogram['p99_ms']:.0f}ms max={histogram['max_ms']:.0f}ms")
+        for name, value in summary['counters'].items():
+            lines.append(f"  {name}: {value}")
+        return lines
+
+
+@contextmanager
+def timed(metrics, stage):
+    """
+    metrics.stage(stage), or nothing when metrics is None
+    """
+    if metrics is None:
+        yield
+    else:
+        with metrics.stage(stage):
+            yield
+
+
+class MetricsRegistry:
+    """
+    Recent run summaries and histograms merged over every run since the process started
+    """
+
+    def __init__(self, recent=RECENT_RUNS):
+        self.runs = deque(maxlen=recent)
+        self.histograms = {}
+        self.stage_totals = {}
+        self.run_counts = {}
+        self.lock = threading.Lock()
+
+    def record(self, metrics):
+        summary = metrics.summary()
+        with self.lock:
+            self.runs.append(summary)
+            self.run_counts[metrics.name] = self.run_counts.get(metrics.name, 0) + 1
+            for name, stage in summary['stages'].items():
+                self.stage_totals[name] = self.stage_totals.get(name, 0.0) + stage['seconds']
+            for name, histogram in metrics.histograms.items():
+                self.histograms.setdefault(name, Histogram()).merge(histogram)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'runs': dict(self.run_counts),
+                'stage_seconds': dict(self.stage_totals),
+                'histograms': {name: histogram.summary() for name, histogram in self.histograms.items()},
+                'recent': list(self.runs),
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics_registry():
+    """
+    Return the process-wide metrics registry
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+        return _registry
+
+
+def _profile_path(name, mode, out=None):
+    if out:
+        return out
+    os.makedirs(DEFAULT_PROFILE_DIR, exist_ok=True)
+    suffix = '.prof' if mode == 'cprofile' else '.html'
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    return os.path.join(DEFAULT_PROFILE_DIR, f"{name}-{stamp}-{os.getpid()}-{threading.get_ident()}{suffix}")
+
+
+@contextmanager
+def profiled(mode=DEFAULT_PROFILE, name='screen', out=None, on_report=None):
+    """
+    Profile a block with cProfile or pyinstrument and write the result to out
+
+    cProfile writes a .prof file for pstats/snakeviz; pyinstrument (if installed) writes an HTML
+    report. on_report(path, text) gets the dump path and a short text summary. Does nothing
+    when mode is None.
+    """
+    if not mode:
+        yield None
+        return
+    if mode not in PROFILERS:
+        raise ValueError(f"Unknown profiler {mode!r}, expected one of {', '.join(PROFILERS)}")
+    if mode == 'pyinstrument' and PyinstrumentProfiler is None:
+        raise RuntimeError("pyinstrument is not installed; use --profile cprofile or pip install pyinstrument")
+
+    path = _profile_path(name, mode, out)
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield path
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(20)
+            if on_report is not None:
+                on_report(path, text.getvalue())
+    else:
+        profiler = PyinstrumentProfiler()
+        profiler.start()
+        try:
+            yield path
+        finally:
+            profiler.stop()
+            with open(path, 'w') as f:
+                f.write(profiler.output_html())
+            if on_report is not None:
+                on_report(path, profiler.output_text())
+
+
+def add_profile_arguments(parser):
+    """
+    Add --profile and --profile-out to a front end's argument parser
+    """
+    parser.add_argument("--profile", choices=PROFILERS, default=DEFAULT_PROFILE,
+                        help="profile the run and write a dump (default: SCREENER_PROFILE)")
+    parser.add_argument("--profile-out", metavar="PATH",
+                        help=f"where to write the profile (default: a new file in {DEFAULT_PROFILE_DIR})")
+
+
+def metrics_tables(summary):
+    """
+    Stage and histogram rows of a run summary, for display as two tables
+    """
+    stages = [
+        {'stage': name, 'seconds': stage['seconds'], 'calls': stage['calls']}
+        for name, stage in summary['stages'].items()
+    ]
+    histograms = [
+        {'histogram': name, 'count': histogram['count'], 'mean_ms': histogram['mean_ms'],
+         'p50_ms': histogram['p50_ms'], 'p90_ms': histogram['p90_ms'], 'p99_ms': histogram['p99_ms'],
+         'max_ms': histogram['max_ms']}
+        for name, histogram in summary['histograms'].items()
+    ]
+    return stages, histograms
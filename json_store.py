@@ -0,0 +1,43 @@
+"""
+JSON Store Module
+Reads and atomically replaces the small JSON files the caches keep in the cache directory.
+"""
+
+import contextlib
+import json
+import os
+import tempfile
+
+
+def load_json(path):
+    """
+    Return the parsed contents of a JSON file, or None when it is missing or unreadable
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_json(path, data):
+    """
+    Write data to a JSON file atomically and return the file's new modification time
+
+    Each call writes its own temporary file, so concurrent savers in one or many processes
+    never publish each other's partial output.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', dir=directory, prefix=os.path.basename(path) + '.',
+                                     suffix='.tmp', delete=False) as f:
+        tmp_path = f.name
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+    return os.stat(path).st_mtime
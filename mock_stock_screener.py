@@ -1,37 +1,45 @@
 #!/usr/bin/env python3
 """
 Mock Stock Screener
-This script demonstrates the concept of a stock screener without external dependencies.
+This script demonstrates the concept of a stock screener on made-up data, without network access or yfinance.
+It needs NumPy and pandas, which the shared screening_core and exporters modules use.
 """
 
-import csv
 import random
 import time
 from datetime import datetime, timedelta
 from stock_tickers import TICKERS
+from screening_core import filter_rows
+from exporters import export
 
 # Mock data generation
-def generate_mock_stock_data(tickers):
+def generate_mock_stock_data(tickers, delay=0.01, show_progress=True, seed=None):
     """
     Generate mock stock data for demonstration purposes
+    
+    delay simulates the per-ticker API latency; pass delay=0, show_progress=False and a seed
+    for fast, repeatable data (as the benchmarks do).
     """
+    rng = random.Random(seed) if seed is not None else random
     sectors = ["Technology", "Healthcare", "Finance", "Consumer Goods", "Energy", "Utilities", "Real Estate"]
     industries = ["Software", "Hardware", "Pharmaceuticals", "Banking", "Retail", "Oil & Gas", "Electric"]
     
     data = []
     total = len(tickers)
     
-    print(f"Generating mock data for {total} stocks...")
+    if show_progress:
+        print(f"Generating mock data for {total} stocks...")
     
     for i, ticker in enumerate(tickers):
         # Show progress
-        progress = (i / total) * 100
-        print(f"\rProgress: {progress:.1f}% - Processing {ticker} ({i+1}/{total})", end="")
+        if show_progress:
+            progress = (i / total) * 100
+            print(f"\rProgress: {progress:.1f}% - Processing {ticker} ({i+1}/{total})", end="")
         
         # Generate random but realistic data
-        market_cap = random.uniform(0.5, 500)  # $0.5B to $500B
-        current_price = random.uniform(5, 500)  # $5 to $500
-        return_250d = random.uniform(-30, 70)  # -30% to +70%
+        market_cap = rng.uniform(0.5, 500)  # $0.5B to $500B
+        current_price = rng.uniform(5, 500)  # $5 to $500
+        return_250d = rng.uniform(-30, 70)  # -30% to +70%
         
         # Create mock stock data
         stock_data = {
@@ -40,34 +48,25 @@ def generate_mock_stock_data(tickers):
             'Current Price': current_price,
             'Market Cap (B)': market_cap,
             '250-Day Return': return_250d,
-            'Sector': random.choice(sectors),
-            'Industry': random.choice(industries),
+            'Sector': rng.choice(sectors),
+            'Industry': rng.choice(industries),
         }
         
         data.append(stock_data)
         
         # Simulate API delay
-        time.sleep(0.01)
+        if delay:
+            time.sleep(delay)
     
-    print("\nData generation complete!")
+    if show_progress:
+        print("\nData generation complete!")
     return data
 
 def filter_stocks(stocks, min_market_cap=2.0, min_price=10.0, positive_return=True):
     """
     Filter stocks based on criteria
     """
-    filtered = []
-    
-    for stock in stocks:
-        if (stock['Market Cap (B)'] >= min_market_cap and 
-            stock['Current Price'] >= min_price and
-            (not positive_return or stock['250-Day Return'] > 0)):
-            filtered.append(stock)
-    
-    # Sort by market cap (descending)
-    filtered.sort(key=lambda x: x['Market Cap (B)'], reverse=True)
-    
-    return filtered
+    return filter_rows(stocks, min_market_cap, min_price, positive_return)
 
 def print_table(data, headers):
     """
@@ -131,12 +130,7 @@ def save_to_csv(data, filename):
     if not data:
         return
     
-    headers = data[0].keys()
-    
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=headers)
-        writer.writeheader()
-        writer.writerows(data)
+    export(data, filename, 'csv')
 
 def main():
     print("===== Mock Stock Screener =====")
@@ -0,0 +1,225 @@
+"""
+Negative Cache Module
+Remembers tickers that came back empty or failed, so they are skipped for a cooling-off period that doubles with each
+repeat failure instead of costing a full fetch and timeout on every run.
+"""
+
+import argparse
+import atexit
+import os
+import threading
+import time
+from collections import Counter
+
+from history_cache import CACHE_DIR
+from json_store import load_json, save_json
+from provider_client import FATAL, CircuitOpenError, classify_error
+
+# First cooling-off period and its cap, in seconds
+DEFAULT_BASE_TTL = float(os.environ.get("SCREENER_NEGATIVE_TTL", "3600"))
+DEFAULT_MAX_TTL = float(os.environ.get("SCREENER_NEGATIVE_MAX_TTL", str(7 * 24 * 3600)))
+
+# Reasons a ticker is cached
+EMPTY = 'empty'
+FAILED = 'failed'
+
+REASON_LABELS = {
+    EMPTY: "no price history",
+    FAILED: "fetch failed",
+}
+
+
+def format_duration(seconds):
+    """
+    Short human-readable duration such as 45m or 3h 10m
+    """
+    minutes = max(1, int(seconds // 60))
+    if minutes < 60:
+        return f"{minutes}m"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 48:
+        return f"{hours}h {minutes}m" if minutes else f"{hours}h"
+    return f"{hours // 24}d"
+
+
+class NegativeCache:
+    """
+    Per-ticker failure records with exponential expiry, stored in a JSON file on disk
+
+    Each consecutive failure doubles the ticker's cooling-off period, from base_ttl up to max_ttl.
+    One successful fetch clears the record.
+    """
+
+    def __init__(self, path=None, base_ttl=DEFAULT_BASE_TTL, max_ttl=DEFAULT_MAX_TTL):
+        self.path = path or os.path.join(CACHE_DIR, "negative.json")
+        self.base_ttl = base_ttl
+        self.max_ttl = max_ttl
+        self.entries = {}  # ticker -> {'reason', 'failures', 'until', 'error'}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        stored = load_json(self.path)
+        if stored is None:
+            return
+
+        with self.lock:
+            for ticker, entry in stored.items():
+                if ticker not in self.entries or self.entries[ticker]['until'] < entry['until']:
+                    self.entries[ticker] = entry
+
+    def save(self):
+        """
+        Write the cache file atomically, dropping records that have long expired
+        """
+        now = time.time()
+        with self.lock:
+            if not self.dirty:
+                return
+            # An expired record still sets the next period's length, so keep it for one max_ttl
+            snapshot = {ticker: dict(entry) for ticker, entry in self.entries.items()
+                        if entry['until'] + self.max_ttl > now}
+            self.dirty = False
+
+        save_json(self.path, snapshot)
+
+    def ttl(self, failures):
+        """
+        Cooling-off period after `failures` consecutive failures
+        """
+        return min(self.max_ttl, self.base_ttl * 2 ** (failures - 1))
+
+    def record_failure(self, ticker, reason, error=None, now=None):
+        """
+        Start or extend a ticker's cooling-off period
+        """
+        now = now or time.time()
+        with self.lock:
+            entry = self.entries.get(ticker)
+            failures = entry['failures'] + 1 if entry is not None else 1
+            self.entries[ticker] = {
+                'reason': reason,
+                'failures': failures,
+                'until': now + self.ttl(failures),
+                'error': str(error)[:200] if error is not None else None,
+            }
+            self.dirty = True
+
+    def record_error(self, ticker, error, now=None):
+        """
+        Record a fetch exception, unless it is throttling, a network error or an open circuit
+
+        Those say nothing about the ticker itself and are already retried by the provider client.
+        """
+        if isinstance(error, CircuitOpenError) or classify_error(error) != FATAL:
+            return False
+        self.record_failure(ticker, FAILED, error, now)
+        return True
+
+    def record_success(self, ticker):
+        with self.lock:
+            if self.entries.pop(ticker, None) is not None:
+                self.dirty = True
+
+    def blocked(self, ticker, now=None):
+        """
+        The ticker's record while it is cooling off, else None
+        """
+        now = now or time.time()
+        with self.lock:
+            entry = self.entries.get(ticker)
+            return dict(entry) if entry is not None and entry['until'] > now else None
+
+    def partition(self, tickers, now=None):
+        """
+        Split tickers into (allowed, cooling) keeping their order; cooling maps ticker -> record
+        """
+        now = now or time.time()
+        allowed, cooling = [], {}
+        for ticker in tickers:
+            entry = self.blocked(ticker, now)
+            if entry is None:
+                allowed.append(ticker)
+            else:
+                cooling[ticker] = entry
+        return allowed, cooling
+
+    def describe(self, entry, now=None):
+        """
+        One-line reason for skipping a ticker, e.g. "no price history, retry in 2h"
+        """
+        now = now or time.time()
+        label = REASON_LABELS.get(entry['reason'], entry['reason'])
+        return f"{label}, retry in {format_duration(entry['until'] - now)}"
+
+    def summary(self, now=None):
+        """
+        Every ticker currently cooling off, with counts by reason
+        """
+        now = now or time.time()
+        with self.lock:
+            active = {ticker: dict(entry) for ticker, entry in self.entries.items() if entry['until'] > now}
+        return {
+            'skipped': len(active),
+            'by_reason': dict(Counter(entry['reason'] for entry in active.values())),
+            'tickers': {ticker: dict(entry, retry_in=entry['until'] - now) for ticker, entry in active.items()},
+        }
+
+    def clear(self, tickers=None):
+        """
+        Forget some tickers' records, or all of them
+        """
+        with self.lock:
+            for ticker in list(self.entries) if tickers is None else tickers:
+                self.entries.pop(ticker, None)
+            self.dirty = True
+
+
+def summarize_skips(skipped):
+    """
+    Group a {ticker: reason} mapping of skipped tickers into lines such as
+    "delisted: ATVI" and "no price history, retry in 2h: FOO, BAR"
+    """
+    groups = {}
+    for ticker, reason in skipped.items():
+        groups.setdefault(reason, []).append(ticker)
+    return [f"{reason}: {', '.join(tickers)}" for reason, tickers in groups.items()]
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_negative_cache():
+    """
+    Return the process-wide negative cache, loading it from disk on first use
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = NegativeCache()
+            atexit.register(_default_cache.save)
+        return _default_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or clear the tickers being skipped after failed fetches")
+    parser.add_argument("--clear", nargs='*', metavar="TICKER",
+                        help="forget the given tickers, or every ticker when none are given")
+    args = parser.parse_args()
+
+    cache = get_negative_cache()
+    if args.clear is not None:
+        cache.clear(args.clear or None)
+        cache.save()
+
+    summary = cache.summary()
+    print(f"{summary['skipped']} tickers cooling off")
+    for ticker, entry in sorted(summary['tickers'].items(), key=lambda item: item[1]['until']):
+        error = f" ({entry['error']})" if entry['error'] else ""
+        print(f"  {ticker:<8} {cache.describe(entry)} after {entry['failures']} failure(s){error}")
+
+
+if __name__ == "__main__":
+    main()
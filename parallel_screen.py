@@ -0,0 +1,156 @@
+"""
+Parallel Screen Module
+Screens a history archive across a pool of worker processes: each shard computes its own factors from the memory-mapped
+archive and returns its top-k, and the shard results are merged by market cap.
+"""
+
+import heapq
+import itertools
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from factors import FACTORS, compute_factors
+from history_archive import get_history_archive
+from screening_core import DEFAULT_COLUMNS, ScreenUniverse
+
+# Worker processes used for a parallel screen (1 screens in the calling process)
+DEFAULT_PROCESSES = int(os.environ.get("SCREENER_SCREEN_PROCESSES", str(os.cpu_count() or 1)))
+
+
+def shard_bounds(count, shards):
+    """
+    Split range(count) into up to `shards` contiguous (start, stop) pairs of near-equal size
+    """
+    shards = max(1, min(shards, count))
+    size, extra = divmod(count, shards)
+    bounds = []
+    start = 0
+    for i in range(shards):
+        stop = start + size + (1 if i < extra else 0)
+        bounds.append((start, stop))
+        start = stop
+    return bounds
+
+
+def screen_shard(path, tickers, market_caps, min_market_cap=2.0, min_price=10.0, positive_return=True,
+                 factor_filters=None, factors=(), k=None, screen=None, details=None, columns=DEFAULT_COLUMNS):
+    """
+    Screen the given archive tickers and return the top k matching rows by market cap
+
+    Runs in a worker process: the archive is mapped there, so only the shard's closes are read and
+    the pages are shared with every other worker. Rows use the `columns` keys, one key per factor
+    (its label, as factors.attach_factors does) and whatever details (ticker -> extra row fields, e.g. Company Name and Sector) hold.
+    A screen (a screen_dsl.Screen) replaces the thresholds and factor filters.
+    """
+    archive = get_history_archive(path)
+    closes = archive.close_matrix(tickers)
+    tickers = list(closes.columns)
+    names = list(dict.fromkeys(list(factors) + list(factor_filters or {}) + (screen.factors() if screen else [])))
+    values = compute_factors(closes, names) if names else None
+    universe = ScreenUniverse.from_closes(closes, market_caps, values)
+
+    def row(i):
+        row = {
+            'Ticker': tickers[i],
+            columns['price']: float(universe.price[i]),
+            columns['market_cap']: float(universe.market_cap[i]),
+            columns['return_250d']: float(universe.return_250d[i]),
+        }
+        row.update((details or {}).get(tickers[i], {}))
+        for name in names:
+            row[FACTORS[name].label] = float(universe.factors[name][i])
+        return row
+
+    if screen is not None:
+        rows = screen.filter_rows([row(i) for i in range(len(tickers))], columns)
+    else:
+        rows = [row(i) for i in universe.screen(min_market_cap, min_price, positive_return, factor_filters)]
+    return rows if k is None else rows[:k]
+
+
+def merge_top_k(shard_rows, k=None, columns=DEFAULT_COLUMNS):
+    """
+    Merge per-shard results (each sorted by market cap, descending) into the overall top k
+
+    Ties keep shard order, which is archive order, so the result matches a single-process screen.
+    """
+    key = columns['market_cap']
+    # Rows without a market cap sort last, as in a single-process screen
+    merged = heapq.merge(*shard_rows, key=lambda row: -row[key] if row[key] == row[key] else math.inf)
+    return list(itertools.islice(merged, k))
+
+
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def get_screen_pool(processes=None):
+    """
+    Return the process-wide worker pool, started on first use and kept for later screens
+
+    Workers are spawned rather than forked, so they are safe to start from the threaded web
+    server and Streamlit apps.
+    """
+    global _pool, _pool_size
+    processes = max(1, processes or DEFAULT_PROCESSES)
+    with _pool_lock:
+        if _pool is None or _pool_size != processes:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+            _pool_size = processes
+        return _pool
+
+
+def shutdown_screen_pool():
+    """
+    Stop the worker pool, if one was started
+    """
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+        _pool_size = 0
+
+
+def screen_archive(path, market_caps, min_market_cap=2.0, min_price=10.0, positive_return=True,
+                   factor_filters=None, factors=(), k=None, processes=None, tickers=None, screen=None,
+                   details=None, columns=DEFAULT_COLUMNS):
+    """
+    Screen the tickers of a history archive (default: all of them) and return the top k rows by market cap
+
+    market_caps maps ticker -> market cap ($B). With processes > 1 the tickers are split into one
+    contiguous shard per process, each worker computes its shard's factors and top k, and the
+    shard results are merged; with processes=1 the whole archive is screened in this process.
+    screen, details and columns are as for screen_shard.
+    """
+    processes = max(1, processes or DEFAULT_PROCESSES)
+    tickers = list(get_history_archive(path).tickers if tickers is None else tickers)
+    options = (min_market_cap, min_price, positive_return, factor_filters, tuple(factors), k, screen)
+
+    if processes == 1:
+        return screen_shard(path, tickers, market_caps, *options, details, columns)
+
+    pool = get_screen_pool(processes)
+    futures = []
+    for start, stop in shard_bounds(len(tickers), processes):
+        # Each worker only receives the market caps and details of its own shard
+        shard = tickers[start:stop]
+        caps = {ticker: market_caps[ticker] for ticker in shard if ticker in market_caps}
+        shard_details = None if details is None else {ticker: details[ticker] for ticker in shard if ticker in details}
+        futures.append(pool.submit(screen_shard, path, shard, caps, *options, shard_details, columns))
+    return merge_top_k([future.result() for future in futures], k, columns)
+
+
+def add_process_arguments(parser):
+    """
+    Add --processes to a front end's argument parser
+    """
+    parser.add_argument("--processes", type=int, metavar="N",
+                        help="screen a replayed history archive across N worker processes instead of "
+                             "row by row (replay provider only)")
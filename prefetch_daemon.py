@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Prefetch Daemon Module
+Keeps the shared caches warm between screens: refreshes quotes, daily history and fundamentals on their own cadences,
+most-screened tickers first, with jittered timing so the refreshes never reach the provider as one burst.
+"""
+
+import argparse
+import atexit
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from history_cache import CACHE_DIR
+from json_store import load_json, save_json
+from fundamentals_cache import FIELD_TTLS
+from negative_cache import get_negative_cache
+from providers import add_provider_arguments, get_provider, provider_from_args
+from quotes import DEFAULT_QUOTE_TTL
+from universe import add_universe_arguments, get_universe, universe_from_args
+
+# Kinds of data refreshed, in the order jobs due at the same time run
+JOBS = ('quotes', 'history', 'fundamentals')
+
+# Seconds between refreshes of each kind of data; quotes by default every half quote TTL, so
+# each run lands before the previous run's quotes expire
+DEFAULT_CADENCES = {
+    'quotes': float(os.environ.get("SCREENER_PREFETCH_QUOTES", str(DEFAULT_QUOTE_TTL / 2))),
+    'history': float(os.environ.get("SCREENER_PREFETCH_HISTORY", "3600")),
+    'fundamentals': float(os.environ.get("SCREENER_PREFETCH_FUNDAMENTALS", "86400")),
+}
+
+# Every wait is stretched or shrunk at random by up to this fraction
+DEFAULT_JITTER = float(os.environ.get("SCREENER_PREFETCH_JITTER", "0.1"))
+
+# Tickers kept warm: the most screened first, then the universe's largest by market cap
+DEFAULT_TICKERS = int(os.environ.get("SCREENER_PREFETCH_TICKERS", "500"))
+
+# Exchange-local times (HH:MM) on weekdays at which every job runs, whatever its cadence
+DEFAULT_WARM_AT = [t.strip() for t in os.environ.get("SCREENER_PREFETCH_AT", "09:00").split(",") if t.strip()]
+
+# Start the daemon inside the Streamlit apps and the web server
+PREFETCH_ENABLED = os.environ.get("SCREENER_PREFETCH", "").lower() in ("1", "true", "yes")
+
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = (9, 30)
+MARKET_CLOSE = (16, 0)
+
+# Tickers per prefetch call, and the seconds paused between calls
+BATCH_SIZE = 100
+BATCH_PAUSE = 1.0
+
+# Seconds for a ticker's screen count to halve
+DEMAND_HALF_LIFE = 7 * 24 * 3600
+
+
+def market_open(now=None):
+    """
+    True during regular trading hours on a weekday (exchange holidays are not tracked)
+    """
+    local = datetime.fromtimestamp(now or time.time(), MARKET_TZ)
+    return local.weekday() < 5 and MARKET_OPEN <= (local.hour, local.minute) < MARKET_CLOSE
+
+
+def next_warm_up(times, now=None):
+    """
+    Timestamp of the next weekday occurrence of any HH:MM exchange-local time, or None
+    """
+    local = datetime.fromtimestamp(now or time.time(), MARKET_TZ)
+    upcoming = []
+    for text in times:
+        hour, minute = (int(part) for part in text.split(":"))
+        candidate = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        while candidate <= local or candidate.weekday() >= 5:
+            candidate = (candidate + timedelta(days=1)).replace(hour=hour, minute=minute)
+        upcoming.append(candidate.timestamp())
+    return min(upcoming) if upcoming else None
+
+
+class ScreenDemand:
+    """
+    Decaying count of how often each ticker is screened, stored in a JSON file on disk
+
+    Counts halve every half_life seconds, so the prefetch order follows what users screen lately
+    rather than what they screened once a month ago.
+    """
+
+    def __init__(self, path=None, half_life=DEMAND_HALF_LIFE):
+        self.path = path or os.path.join(CACHE_DIR, "demand.json")
+        self.half_life = half_life
+        self.entries = {}  # ticker -> (score, updated_at)
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """
+        Merge counts from the demand file, keeping whichever copy of a ticker is newer
+        """
+        stored = load_json(self.path)
+        if stored is None:
+            return
+
+        with self.lock:
+            for ticker, (score, updated_at) in stored.items():
+                if ticker not in self.entries or self.entries[ticker][1] < updated_at:
+                    self.entries[ticker] = (score, updated_at)
+
+    def save(self):
+        """
+        Write the demand file atomically, dropping tickers whose count has decayed away
+        """
+        if not self.dirty:
+            return
+        # Pick up counts other processes saved since this one last read the file
+        self.load()
+        now = time.time()
+        with self.lock:
+            snapshot = {ticker: entry for ticker, entry in self.entries.items() if self._score(entry, now) >= 0.01}
+            self.dirty = False
+
+        save_json(self.path, snapshot)
+
+    def _score(self, entry, now):
+        score, updated_at = entry
+        return score * 0.5 ** (max(0.0, now - updated_at) / self.half_life)
+
+    def record(self, tickers, now=None):
+        """
+        Count one screen of each ticker
+        """
+        now = now or time.time()
+        with self.lock:
+            for ticker in tickers:
+                entry = self.entries.get(ticker)
+                self.entries[ticker] = ((self._score(entry, now) if entry is not None else 0.0) + 1, now)
+            self.dirty = True
+
+    def scores(self, now=None):
+        now = now or time.time()
+        with self.lock:
+            return {ticker: self._score(entry, now) for ticker, entry in self.entries.items()}
+
+    def ranked(self, now=None):
+        """
+        Tickers ever screened, most screened first
+        """
+        scores = self.scores(now)
+        return sorted(scores, key=lambda ticker: -scores[ticker])
+
+
+_default_demand = None
+_default_demand_lock = threading.Lock()
+
+
+def get_screen_demand():
+    """
+    Return the process-wide screen demand counts, loading them from disk on first use
+    """
+    global _default_demand
+    with _default_demand_lock:
+        if _default_demand is None:
+            _default_demand = ScreenDemand()
+            atexit.register(_default_demand.save)
+        return _default_demand
+
+
+class PrefetchDaemon:
+    """
+    Scheduler refreshing each kind of cached data on its own cadence
+
+    A job goes through the tickers in priority order a batch at a time, with a jittered pause
+    between batches, and refreshes whatever would go stale before its next run. Its next run is
+    a jittered cadence later, or the next warm-up time if that comes first. Quotes are only
+    refreshed while the market is open. Runs on a background thread inside a front end's process
+    (start) or in a process of its own (run_forever).
+    """
+
+    def __init__(self, provider=None, jobs=JOBS, cadences=None, jitter=DEFAULT_JITTER, count=DEFAULT_TICKERS,
+                 warm_at=DEFAULT_WARM_AT, batch_size=BATCH_SIZE, batch_pause=BATCH_PAUSE, on_run=None, rng=None):
+        # None means whichever provider is current when a job runs
+        self.provider = provider
+        self.cadences = {kind: (cadences or {}).get(kind, DEFAULT_CADENCES[kind]) for kind in jobs}
+        self.jitter = jitter
+        self.count = count
+        self.warm_at = list(warm_at or ())
+        self.batch_size = max(1, batch_size)
+        self.batch_pause = batch_pause
+        self.on_run = on_run
+        self.rng = rng or random.Random()
+        self.due = {}
+        self.stats = {kind: {'runs': 0, 'tickers': 0, 'errors': 0, 'last_run': None, 'last_seconds': None}
+                      for kind in self.cadences}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def jittered(self, seconds):
+        return seconds * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def targets(self):
+        """
+        Tickers to keep warm, most screened first, then the universe's largest by market cap
+
+        Tickers listed as no longer trading or cooling off after failed fetches are left out.
+        """
+        universe = get_universe()
+        demand = get_screen_demand()
+        # Counts recorded by the front ends since the last run
+        demand.load()
+        tickers = list(dict.fromkeys(demand.ranked() + universe.select(self.count)))
+        tickers, _ = universe.partition(tickers)
+        tickers, _ = get_negative_cache().partition(tickers)
+        return tickers[:self.count] if self.count else tickers
+
+    def run_job(self, kind):
+        """
+        Refresh one kind of data for every target ticker; returns the job's stats
+        """
+        provider = self.provider or get_provider()
+        tickers = self.targets() if provider.live else []
+        if kind == 'quotes' and not market_open():
+            tickers = []
+        # Anything that would go stale before the latest possible next run is refreshed now
+        ahead = self.cadences[kind] * (1 + self.jitter)
+        if kind == 'fundamentals':
+            # A daily run reaches past the market cap TTL; capped at half the shortest field TTL,
+            # a field is only refreshed in the second half of its TTL, never straight after a fetch
+            ahead = min(ahead, min(FIELD_TTLS.values()) / 2)
+        failed = set()
+        start = time.time()
+
+        for i in range(0, len(tickers), self.batch_size):
+            if i and self.stopping.wait(self.jittered(self.batch_pause)):
+                break
+            batch = tickers[i:i + self.batch_size]
+            try:
+                provider.prefetch(kind, batch, ahead, on_error=lambda ticker, e: failed.add(ticker))
+            except Exception:
+                # The provider client already retried; the next run tries again
+                failed.update(batch)
+
+        with self.lock:
+            stats = self.stats[kind]
+            stats['runs'] += 1
+            stats['tickers'] = len(tickers)
+            stats['errors'] = len(failed)
+            stats['last_run'] = start
+            stats['last_seconds'] = time.time() - start
+            stats = dict(stats)
+        if self.on_run is not None:
+            self.on_run(kind, stats)
+        return stats
+
+    def run_once(self, kinds=None):
+        """
+        Run each job once, in order
+        """
+        return {kind: self.run_job(kind) for kind in kinds or self.cadences}
+
+    def next_due(self, kind, now=None):
+        now = now or time.time()
+        due = now + self.jittered(self.cadences[kind])
+        warm_up = next_warm_up(self.warm_at, now)
+        return min(due, warm_up) if warm_up is not None else due
+
+    def run_forever(self):
+        """
+        Run every job now, then each again whenever it is due, until stop() is called
+        """
+        now = time.time()
+        order = {kind: i for i, kind in enumerate(JOBS)}
+        with self.lock:
+            for kind in self.cadences:
+                self.due.setdefault(kind, now)
+        while not self.stopping.is_set():
+            with self.lock:
+                kind = min(self.due, key=lambda kind: (self.due[kind], order.get(kind, len(order))))
+                delay = self.due[kind] - time.time()
+            if delay > 0 and self.stopping.wait(delay):
+                break
+            self.run_job(kind)
+            with self.lock:
+                self.due[kind] = self.next_due(kind)
+
+    def start(self):
+        """
+        Run the scheduler on a background thread, once per daemon
+        """
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run_forever, name="prefetch", daemon=True)
+                self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def status(self):
+        """
+        Per-job cadences, last run stats and seconds until the next run, for /api/metrics
+        """
+        now = time.time()
+        with self.lock:
+            return {
+                'running': self.thread is not None and self.thread.is_alive(),
+                'jobs': {
+                    kind: dict(self.stats[kind], cadence=self.cadences[kind],
+                               next_run_in=self.due[kind] - now if kind in self.due else None)
+                    for kind in self.cadences
+                },
+            }
+
+
+_default_daemon = None
+_default_daemon_lock = threading.Lock()
+
+
+def get_prefetch_daemon():
+    """
+    Return the process-wide prefetch daemon (not started)
+    """
+    global _default_daemon
+    with _default_daemon_lock:
+        if _default_daemon is None:
+            _default_daemon = PrefetchDaemon()
+        return _default_daemon
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the screener caches warm in the background")
+    parser.add_argument("--jobs", nargs='+', choices=JOBS, default=list(JOBS), help="kinds of data to refresh")
+    for kind in JOBS:
+        parser.add_argument(f"--{kind}-every", type=float, default=DEFAULT_CADENCES[kind], metavar="SECONDS",
+                            help=f"seconds between {kind} refreshes (default %(default)s)")
+    parser.add_argument("--tickers", type=int, default=DEFAULT_TICKERS,
+                        help="tickers kept warm, most screened first (default %(default)s, 0 for the whole universe)")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER,
+                        help="random fraction added to or taken from every wait (default %(default)s)")
+    parser.add_argument("--at", nargs='*', default=DEFAULT_WARM_AT, metavar="HH:MM",
+                        help="New York times on weekdays to refresh everything (default %(default)s)")
+    parser.add_argument("--once", action="store_true", help="run each job once and exit, e.g. from cron")
+    add_provider_arguments(parser)
+    add_universe_arguments(parser)
+    args = parser.parse_args()
+    provider_from_args(args)
+    universe_from_args(args)
+
+    def on_run(kind, stats):
+        failed = f" ({stats['errors']} failed)" if stats['errors'] else ""
+        print(f"[{time.strftime('%H:%M:%S')}] {kind}: {stats['tickers']} tickers in {stats['last_seconds']:.1f}s{failed}",
+              flush=True)
+
+    daemon = PrefetchDaemon(
+        jobs=[kind for kind in JOBS if kind in args.jobs],
+        cadences={kind: getattr(args, f"{kind}_every") for kind in JOBS},
+        jitter=args.jitter,
+        count=args.tickers,
+        warm_at=args.at,
+        on_run=on_run,
+    )
+
+    if args.once:
+        daemon.run_once()
+        return
+    print(f"Prefetching {', '.join(daemon.cadences)}; Ctrl+C to stop", flush=True)
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Provider Client Module
+Calls the market data provider through one shared client per host: an adaptive token bucket that backs off on 429s,
+jittered exponential retries, a circuit breaker that pauses every worker while the provider is down, and a pooled
+HTTP session for the requests the screener sends itself (yfinance keeps its own session).
+"""
+
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from fetch_engine import DEFAULT_RATE_LIMIT, YAHOO_HOST, RateLimiter
+
+try:
+    from yfinance.exceptions import YFRateLimitError
+except ImportError:
+    YFRateLimitError = None
+
+# Defaults, overridable through the environment
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get("SCREENER_RETRY_ATTEMPTS", "4"))
+DEFAULT_BREAKER_THRESHOLD = int(os.environ.get("SCREENER_BREAKER_THRESHOLD", "5"))
+DEFAULT_BREAKER_RESET = float(os.environ.get("SCREENER_BREAKER_RESET", "30"))
+DEFAULT_POOL_SIZE = 32
+
+# Error classes returned by classify_error
+THROTTLED = 'throttled'
+TRANSIENT = 'transient'
+FATAL = 'fatal'
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a call gives up waiting for an open circuit to close
+    """
+
+
+def _status_code(e):
+    response = getattr(e, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None:
+        # urllib's HTTPError carries the status itself
+        status = getattr(e, 'code', None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(e):
+    """
+    Sort a provider exception into THROTTLED (429), TRANSIENT (5xx, network) or FATAL (anything else)
+    """
+    if YFRateLimitError is not None and isinstance(e, YFRateLimitError):
+        return THROTTLED
+
+    status = _status_code(e)
+    if status == 429:
+        return THROTTLED
+    if status is not None:
+        return TRANSIENT if status >= 500 or status == 408 else FATAL
+
+    # requests, curl_cffi and urllib connection errors and timeouts are all OSErrors
+    if isinstance(e, (OSError, TimeoutError)):
+        return TRANSIENT
+    return FATAL
+
+
+def retry_after(e):
+    """
+    Seconds the provider asked us to wait in a Retry-After header, if any
+    """
+    response = getattr(e, 'response', None)
+    headers = getattr(response, 'headers', None) or getattr(e, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    Token bucket whose rate halves on each throttled response and creeps back up on successes
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None, increase=None, decrease=0.5, cooldown=1.0):
+        super().__init__(rate, burst)
+        self.max_rate = self.rate
+        self.min_rate = min_rate or max(0.2, self.rate / 20)
+        self.increase = increase or self.max_rate / 20
+        self.decrease = decrease
+        # A burst of 429s from one window of requests only counts as one signal
+        self.cooldown = cooldown
+        self.last_decrease = float('-inf')
+
+    def on_throttled(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_decrease < self.cooldown:
+                return
+            self.last_decrease = now
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            # Drain the bucket so requests already queued don't go out as a burst
+            self.tokens = min(self.tokens, 0.0)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, never shorter than a provider's Retry-After
+    """
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=0.5, max_delay=30.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Seconds to wait before retry number `attempt` (0 for the first retry)
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive provider failures
+
+    While open, every caller waits instead of hitting the provider, which pauses the whole fetch
+    pool. After `reset_timeout` one probe call is let through: success closes the circuit, failure
+    opens it again. Callers that wait longer than `max_wait` get a CircuitOpenError.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_BREAKER_THRESHOLD, reset_timeout=DEFAULT_BREAKER_RESET,
+                 max_wait=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_wait = max_wait if max_wait is not None else 4 * reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.probing = False
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Block until a call may go to the provider
+        """
+        deadline = time.monotonic() + self.max_wait
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if self.state == 'closed':
+                    return
+                if self.state == 'open' and now >= self.opened_at + self.reset_timeout:
+                    self.state = 'half_open'
+                    self.probing = False
+                if self.state == 'half_open' and not self.probing:
+                    self.probing = True
+                    return
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise CircuitOpenError("provider circuit is open")
+                if self.state == 'open':
+                    remaining = min(remaining, max(0.01, self.opened_at + self.reset_timeout - now))
+                self.condition.wait(remaining)
+
+    def release(self):
+        """
+        Give back a half-open probe whose call ended without an answer from the provider
+        """
+        with self.condition:
+            if self.state == 'half_open' and self.probing:
+                self.probing = False
+                self.condition.notify_all()
+
+    def record_success(self):
+        with self.condition:
+            self.failures = 0
+            if self.state != 'closed':
+                self.state = 'closed'
+                self.probing = False
+                self.condition.notify_all()
+
+    def record_failure(self):
+        with self.condition:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                self.probing = False
+                self.condition.notify_all()
+
+
+class ProviderClient:
+    """
+    Runs provider calls with rate limiting, retries and a circuit breaker shared by every caller
+    """
+
+    def __init__(self, rate_limit=DEFAULT_RATE_LIMIT, retry=None, breaker=None, pool_size=DEFAULT_POOL_SIZE):
+        self.limiter = AdaptiveRateLimiter(rate_limit) if rate_limit and rate_limit > 0 else None
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.pool_size = pool_size
+        self.stats = {'calls': 0, 'retries': 0, 'throttled': 0, 'transient_errors': 0, 'failures': 0}
+        self._session = None
+        self._lock = threading.Lock()
+        # Set while this thread is inside call(), so nested calls don't take a second probe or token
+        self._local = threading.local()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    @property
+    def session(self):
+        """
+        HTTP session shared by every thread, keeping up to pool_size connections alive
+        """
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['User-Agent'] = 'stock-screener'
+                self._session = session
+            return self._session
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call func(*args, **kwargs), retrying throttled and transient failures with backoff
+
+        Fatal errors (bad symbol, missing data) are raised at once and don't count against the
+        circuit. The last error is raised once the retry budget is spent. Wrap each provider
+        request on its own, so every request takes one limiter token and a retry repeats only the
+        request that failed. A call made from inside func runs func directly and leaves its errors
+        to the outer call, which already holds the breaker and a limiter token.
+        """
+        if getattr(self._local, 'active', False):
+            return func(*args, **kwargs)
+
+        self._count('calls')
+        attempt = 0
+        while True:
+            try:
+                self.breaker.acquire()
+            except CircuitOpenError:
+                self._count('failures')
+                raise
+            if self.limiter is not None:
+                self.limiter.acquire()
+
+            self._local.active = True
+            try:
+                result = func(*args, **kwargs)
+            except CircuitOpenError:
+                # Another client's circuit is open; no request was answered, so this is neither a
+                # success nor a failure of this provider
+                self.breaker.release()
+                self._count('failures')
+                raise
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == FATAL:
+                    # The provider answered, so it is up
+                    self.breaker.record_success()
+                    raise
+
+                self.breaker.record_failure()
+                if kind == THROTTLED:
+                    self._count('throttled')
+                    if self.limiter is not None:
+                        self.limiter.on_throttled()
+                else:
+                    self._count('transient_errors')
+
+                attempt += 1
+                if attempt >= self.retry.max_attempts:
+                    self._count('failures')
+                    raise
+                self._count('retries')
+                time.sleep(self.retry.delay(attempt - 1, retry_after(e)))
+                continue
+            finally:
+                self._local.active = False
+
+            self.breaker.record_success()
+            if self.limiter is not None:
+                self.limiter.on_success()
+            return result
+
+    def get(self, url, params=None, timeout=10):
+        """
+        GET a URL over the pooled session through call(); HTTP errors are raised for classification
+        """
+        def request():
+            response = self.session.get(url, params=params, timeout=timeout)
+            response.raise_for_status()
+            return response
+        return self.call(request)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_provider_client(host=YAHOO_HOST):
+    """
+    Return the process-wide client for a provider host, so throttling state is shared by every fetch
+    """
+    with _clients_lock:
+        if host not in _clients:
+            _clients[host] = ProviderClient()
+        return _clients[host]
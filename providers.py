@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Data Providers Module
+Interchangeable sources of price history and company info: live yfinance, a replay of data recorded to disk,
+and a seeded synthetic generator. Run as a script to record a provider's data for later replay.
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from fetch_engine import FetchEngine
+from history_cache import CACHE_DIR, get_history_cache, load_cached_histories
+from fundamentals_cache import FIELD_TTLS, get_fundamentals, get_fundamentals_cache
+from history_archive import get_history_archive, write_archive
+from provider_client import get_provider_client
+from quotes import QUOTE_PERIOD, get_quote_cache, get_quotes, last_closes, load_quotes
+from singleflight import get_single_flight
+
+DEFAULT_PROVIDER = os.environ.get("SCREENER_PROVIDER", "yfinance")
+DEFAULT_REPLAY_DIR = os.environ.get("SCREENER_REPLAY_DIR", os.path.join(CACHE_DIR, "replay"))
+DEFAULT_SEED = int(os.environ.get("SCREENER_SYNTHETIC_SEED", "0"))
+
+# Trading days covered by each history period
+PERIOD_DAYS = {
+    '1d': 1,
+    '5d': 5,
+    '1mo': 21,
+    '3mo': 63,
+    '6mo': 126,
+    '1y': 252,
+    '2y': 504,
+    '5y': 1260,
+}
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Values the synthetic provider picks company details from
+SECTORS = ["Technology", "Healthcare", "Finance", "Consumer Goods", "Energy", "Utilities", "Real Estate"]
+INDUSTRIES = ["Software", "Hardware", "Pharmaceuticals", "Banking", "Retail", "Oil & Gas", "Electric"]
+
+# Registered provider classes by name
+PROVIDERS = {}
+
+
+def register_provider(cls):
+    """
+    Class decorator adding a provider to PROVIDERS under its name
+    """
+    PROVIDERS[cls.name] = cls
+    return cls
+
+
+def _tail(hist, period, interval="1d"):
+    """
+    Trim a daily history to a period; intraday requests get the latest bar only
+    """
+    if interval != "1d":
+        return hist.iloc[-1:]
+    days = PERIOD_DAYS.get(period)
+    return hist if days is None else hist.iloc[-days:]
+
+
+class DataProvider:
+    """
+    Base class for a source of per-ticker price history and company info
+    """
+
+    name = None
+    # Live providers are rate limited and cached; offline ones run at full speed
+    live = False
+
+    @property
+    def key(self):
+        """
+        Hashable identity of the data this provider serves, for dataset cache keys
+        """
+        return (self.name,)
+
+    @property
+    def client(self):
+        """
+        provider_client.ProviderClient guarding calls to this provider, or None
+        """
+        return None
+
+    def history(self, ticker, period="1y", interval="1d"):
+        """
+        OHLCV history frame for one ticker (empty when there is none)
+        """
+        raise NotImplementedError
+
+    def histories(self, tickers, period="1y"):
+        """
+        Daily histories for many tickers at once, keyed by ticker
+        """
+        return {ticker: self.history(ticker, period) for ticker in tickers}
+
+    def quotes(self, tickers):
+        """
+        Latest price for many tickers at once, keyed by ticker (None when there is no price)
+        """
+        return last_closes({ticker: self.history(ticker, QUOTE_PERIOD) for ticker in tickers})
+
+    def quote(self, ticker):
+        """
+        Latest price for one ticker, or None
+        """
+        return self.quotes([ticker]).get(ticker)
+
+    def info(self, ticker):
+        """
+        Company info fields (shortName, marketCap, sector, industry) for one ticker
+        """
+        raise NotImplementedError
+
+    def fetch_engine(self, max_workers=None):
+        """
+        Fetch engine for per-ticker calls to this provider
+        """
+        client = self.client
+        return FetchEngine(max_workers=max_workers, rate_limit=0 if client is None else None, client=client)
+
+    def prefetch(self, kind, tickers, ahead=0, period="1y", on_error=None):
+        """
+        Load one kind of data ('quotes', 'history' or 'fundamentals') for tickers into this
+        provider's caches, refreshing anything that would go stale within `ahead` seconds
+
+        Per-ticker failures go to on_error(ticker, exception). Offline providers have no caches
+        to warm.
+        """
+
+
+def _fetch_info(ticker, fields):
+    """
+    Fetch the stale info fields for a ticker from Yahoo Finance
+
+    A market cap on its own comes from the lighter fast_info; the other fields need Ticker.info.
+    """
+    # Each request is its own provider call, so it takes one rate limiter token and is retried alone
+    client = get_provider_client()
+    if set(fields) <= {'marketCap'}:
+        return {'marketCap': client.call(lambda: yf.Ticker(ticker).fast_info.market_cap)}
+    return client.call(lambda: yf.Ticker(ticker).info)
+
+
+@register_provider
+class YFinanceProvider(DataProvider):
+    """
+    Live Yahoo Finance data, read through the on-disk history and fundamentals caches
+
+    Concurrent requests for the same ticker and kind of data, e.g. from two Streamlit sessions
+    or /api/screen calls screening overlapping universes, share one fetch through singleflight.py.
+    """
+
+    name = 'yfinance'
+    live = True
+
+    @property
+    def client(self):
+        return get_provider_client()
+
+    def history(self, ticker, period="1y", interval="1d"):
+        return get_single_flight('history').do(
+            (ticker, period, interval),
+            lambda: self.client.call(lambda: yf.Ticker(ticker).history(period=period, interval=interval)),
+        )
+
+    def histories(self, tickers, period="1y"):
+        # Missing bars are downloaded in bulk and kept in the SQLite history cache; tickers another
+        # caller is already loading are waited on instead
+        histories = get_single_flight('histories').do_many(
+            [(ticker, period) for ticker in tickers],
+            lambda keys: {(ticker, period): hist
+                          for ticker, hist in load_cached_histories([ticker for ticker, _ in keys], period).items()},
+        )
+        return {ticker: hist for (ticker, _), hist in histories.items()}
+
+    def quotes(self, tickers):
+        # One bulk request for every ticker not quoted in the last few seconds
+        return get_quotes(tickers)
+
+    def info(self, ticker):
+        # Served from the fundamentals cache while it is fresh
+        return get_single_flight('info').do(
+            ticker,
+            lambda: get_fundamentals(ticker, lambda fields: _fetch_info(ticker, fields)),
+        )
+
+    def prefetch(self, kind, tickers, ahead=0, period="1y", on_error=None):
+        if kind == 'quotes':
+            # The quote batch also tops up the last daily bars of tickers in the history cache
+            cache = get_quote_cache()
+            cache.get(tickers, lambda missing: load_quotes(missing, history_cache=get_history_cache()),
+                      now=time.time() + ahead)
+            # Saved straight away so front ends in other processes are served these quotes
+            cache.save()
+        elif kind == 'history':
+            get_history_cache().load(tickers, period, ahead=ahead)
+        elif kind == 'fundamentals':
+            cache = get_fundamentals_cache()
+            self.fetch_engine().fetch(
+                tickers,
+                lambda ticker: cache.get_info(ticker, lambda fields: _fetch_info(ticker, fields), ahead=ahead),
+                on_error=on_error,
+            )
+            # Saved straight away so other processes pick the fields up
+            cache.save()
+        else:
+            raise ValueError(f"Unknown prefetch kind: {kind}")
+
+
+@register_provider
+class ReplayProvider(DataProvider):
+    """
+    Replays histories and info recorded to a directory by record_provider, with no network access
+
+    The directory holds info.json (ticker -> info fields) and a history_archive.py archive in
+    history/, memory-mapped so a replay only reads the tickers it screens.
+    """
+
+    name = 'replay'
+
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_REPLAY_DIR
+        self._infos = None
+        self._lock = threading.Lock()
+
+    @property
+    def key(self):
+        return (self.name, os.path.abspath(self.path))
+
+    @property
+    def archive_path(self):
+        """
+        Directory of the recorded history archive
+        """
+        return os.path.join(self.path, "history")
+
+    def history(self, ticker, period="1y", interval="1d"):
+        try:
+            archive = get_history_archive(self.archive_path)
+        except FileNotFoundError:
+            return pd.DataFrame(columns=PRICE_COLUMNS, dtype='float64')
+        return _tail(archive.history(ticker), period, interval)
+
+    def info(self, ticker):
+        with self._lock:
+            if self._infos is None:
+                try:
+                    with open(os.path.join(self.path, "info.json")) as f:
+                        self._infos = json.load(f)
+                except FileNotFoundError:
+                    self._infos = {}
+            return dict(self._infos.get(ticker, {}))
+
+
+@register_provider
+class SyntheticProvider(DataProvider):
+    """
+    Deterministic generated data: the same seed and ticker always give the same history and info
+    """
+
+    name = 'synthetic'
+
+    def __init__(self, seed=None, end=None):
+        self.seed = DEFAULT_SEED if seed is None else seed
+        self.end = pd.Timestamp(end or date.today())
+        # Every ticker shares the same trading days; building them dominates generation time
+        self.index = pd.bdate_range(end=self.end, periods=PERIOD_DAYS['5y'], tz='America/New_York')
+
+    @property
+    def key(self):
+        return (self.name, self.seed, self.end)
+
+    def _rng(self, ticker):
+        return random.Random(f"{self.seed}:{ticker}")
+
+    def _generate(self, ticker):
+        # Always the full five years, so every period is a tail of the same series
+        rng = np.random.default_rng(self._rng(ticker).getrandbits(64))
+        days = len(self.index)
+        close = rng.uniform(5, 500) * np.cumprod(1 + rng.normal(0.0004, 0.02, days))
+        open_ = close * (1 + rng.normal(0, 0.005, days))
+        spread = np.abs(rng.normal(0, 0.01, days))
+        hist = pd.DataFrame({
+            'Open': open_,
+            'High': np.maximum(open_, close) * (1 + spread),
+            'Low': np.minimum(open_, close) * (1 - spread),
+            'Close': close,
+            'Volume': rng.integers(100_000, 10_000_000, days).astype('float64'),
+        }, index=self.index)
+        return hist
+
+    def history(self, ticker, period="1y", interval="1d"):
+        return _tail(self._generate(ticker), period, interval)
+
+    def info(self, ticker):
+        rng = self._rng(ticker)
+        return {
+            'shortName': f"{ticker} Inc.",
+            'marketCap': rng.uniform(0.5e9, 500e9),
+            'sector': rng.choice(SECTORS),
+            'industry': rng.choice(INDUSTRIES),
+        }
+
+
+def make_provider(name=None, **options):
+    """
+    Build a provider by name (default: SCREENER_PROVIDER); options go to its constructor
+    """
+    name = name or DEFAULT_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown provider: {name} (choose from {', '.join(PROVIDERS)})")
+    return PROVIDERS[name](**options)
+
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def get_provider():
+    """
+    Return the provider the screeners use in this process
+    """
+    global _current
+    with _current_lock:
+        if _current is None:
+            _current = make_provider()
+        return _current
+
+
+def set_provider(provider):
+    """
+    Switch the process to another provider (an instance, or a name to build with defaults)
+    """
+    global _current
+    with _current_lock:
+        _current = make_provider(provider) if isinstance(provider, str) else provider
+        return _current
+
+
+def add_provider_arguments(parser):
+    """
+    Add --provider, --replay-dir and --seed to a front end's argument parser
+    """
+    parser.add_argument("--provider", choices=list(PROVIDERS), default=DEFAULT_PROVIDER,
+                        help="where stock data comes from (default %(default)s)")
+    parser.add_argument("--replay-dir", default=None,
+                        help="directory recorded with `providers.py record` (replay provider)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the synthetic provider")
+
+
+def provider_from_args(args):
+    """
+    Build the provider selected by add_provider_arguments options and make it current
+    """
+    options = {}
+    if args.provider == 'replay' and args.replay_dir:
+        options['path'] = args.replay_dir
+    if args.provider == 'synthetic' and args.seed is not None:
+        options['seed'] = args.seed
+    return set_provider(make_provider(args.provider, **options))
+
+
+def record_provider(source, tickers, path, period="1y", max_workers=None):
+    """
+    Capture history and info for tickers from any provider into a replay directory
+    """
+    tickers = list(dict.fromkeys(tickers))
+    histories = source.histories(tickers, period)
+
+    def capture(ticker):
+        hist = histories.get(ticker)
+        if hist is None or hist.empty:
+            return None
+        info = source.info(ticker)
+        return {field: info.get(field) for field in FIELD_TTLS}
+
+    infos = {}
+    for ticker, info in source.fetch_engine(max_workers).iter_fetch(tickers, capture):
+        infos[ticker] = info
+
+    write_archive({ticker: histories[ticker] for ticker in tickers if ticker in infos}, os.path.join(path, "history"))
+    with open(os.path.join(path, "info.json"), 'w') as f:
+        json.dump(infos, f, indent=1, sort_keys=True)
+    return infos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record stock data for the replay provider")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record = subparsers.add_parser("record", help="capture history and info into a replay directory")
+    add_provider_arguments(record)
+    record.add_argument("--out", default=DEFAULT_REPLAY_DIR, help="replay directory (default %(default)s)")
+    record.add_argument("--period", default="1y", choices=list(PERIOD_DAYS))
+    record.add_argument("--tickers", type=int, help="record only the N largest live tickers of the universe")
+    args = parser.parse_args()
+
+    from universe import get_universe
+    tickers = get_universe().select(args.tickers)
+    source = provider_from_args(args)
+    infos = record_provider(source, tickers, args.out, args.period)
+    print(f"Recorded {len(infos)} of {len(tickers)} tickers from {source.name} into {args.out}")
+
+
+if __name__ == "__main__":
+    main()
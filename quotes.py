@@ -0,0 +1,183 @@
+"""
+Quotes Module
+Latest prices for many tickers in one batched request, kept in a short-lived cache shared through a file on disk.
+"""
+
+import atexit
+import os
+import threading
+import time
+
+from history_cache import CACHE_DIR
+from json_store import load_json, save_json
+from history_loader import load_histories
+from singleflight import get_single_flight
+
+# Seconds a fetched quote is served from the cache before it is requested again
+DEFAULT_QUOTE_TTL = float(os.environ.get("SCREENER_QUOTE_TTL", "15"))
+
+# Daily bars requested per quote: enough to reach the last session over weekends and holidays
+QUOTE_PERIOD = "5d"
+
+
+def last_closes(histories):
+    """
+    Map ticker -> last close in its history frame, or None when it has none
+    """
+    quotes = {}
+    for ticker, hist in histories.items():
+        closes = hist['Close'].dropna() if hist is not None and 'Close' in hist else ()
+        quotes[ticker] = float(closes.iloc[-1]) if len(closes) else None
+    return quotes
+
+
+def load_quotes(tickers, base_url=None, history_cache=None):
+    """
+    Latest price of every ticker, from one bulk request per chunk of tickers
+
+    During market hours the current session's daily bar closes at the latest trade, so a few
+    daily bars per symbol replace a full day of minute bars. With a history_cache.HistoryCache,
+    the bars also top up the tickers it already holds.
+    """
+    histories = load_histories(tickers, QUOTE_PERIOD, "1d", base_url)
+    if history_cache is not None:
+        history_cache.top_up(histories)
+    return last_closes(histories)
+
+
+class QuoteCache:
+    """
+    Ticker -> (price, fetched at) cache with a short TTL
+
+    Tickers the loader had no price for are cached as None for the same TTL, so a symbol with no
+    quote is not requested again on its own straight after a batch. With a path, quotes another
+    process saved there (such as a standalone prefetch daemon) are read before any are loaded.
+    """
+
+    def __init__(self, ttl=DEFAULT_QUOTE_TTL, path=None):
+        self.ttl = ttl
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        # Modification time of the cache file when it was last read or written
+        self.mtime = None
+        if path is not None:
+            self.load()
+
+    def load(self):
+        """
+        Merge quotes from the cache file, keeping whichever copy of a quote is newer
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        stored = load_json(self.path)
+        if stored is None:
+            return
+        self.mtime = mtime
+
+        with self.lock:
+            for ticker, (price, fetched_at) in stored.items():
+                entry = self.entries.get(ticker)
+                if entry is None or entry[1] < fetched_at:
+                    self.entries[ticker] = (price, fetched_at)
+
+    def save(self):
+        """
+        Write the quotes still fresh to the cache file atomically
+        """
+        if self.path is None:
+            return
+        now = time.time()
+        with self.lock:
+            if not self.dirty:
+                return
+            snapshot = {ticker: entry for ticker, entry in self.entries.items() if now - entry[1] < self.ttl}
+            self.dirty = False
+
+        self.mtime = save_json(self.path, snapshot)
+
+    def refresh(self):
+        """
+        Merge the cache file again if another process saved it since
+        """
+        if self.path is None:
+            return False
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        self.load()
+        return True
+
+    def _split(self, tickers, now):
+        quotes, missing = {}, []
+        for ticker in tickers:
+            entry = self.entries.get(ticker)
+            if entry is not None and now - entry[1] < self.ttl:
+                quotes[ticker] = entry[0]
+            else:
+                missing.append(ticker)
+        return quotes, missing
+
+    def get(self, tickers, loader=load_quotes, now=None):
+        """
+        Quotes for the tickers, loading every stale or missing one in a single loader call
+        """
+        now = now or time.time()
+        tickers = list(dict.fromkeys(tickers))
+        with self.lock:
+            quotes, missing = self._split(tickers, now)
+        if missing and self.refresh():
+            with self.lock:
+                quotes, missing = self._split(tickers, now)
+        with self.lock:
+            self.hits += len(quotes)
+            self.misses += len(missing)
+
+        if missing:
+            loaded = loader(missing)
+            fetched = time.time()
+            with self.lock:
+                for ticker in missing:
+                    quotes[ticker] = loaded.get(ticker)
+                    self.entries[ticker] = (quotes[ticker], fetched)
+                self.dirty = True
+
+        return {ticker: quotes[ticker] for ticker in tickers}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_quote_cache():
+    """
+    Return the process-wide quote cache, shared with other processes through quotes.json
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = QuoteCache(path=os.path.join(CACHE_DIR, "quotes.json"))
+            atexit.register(_default_cache.save)
+        return _default_cache
+
+
+def get_quotes(tickers, loader=load_quotes):
+    """
+    Latest prices through the process-wide quote cache
+
+    Tickers that another caller is already loading are waited on rather than requested again.
+    """
+    flight = get_single_flight('quotes')
+    return get_quote_cache().get(tickers, lambda missing: flight.do_many(missing, loader))
@@ -0,0 +1,197 @@
+"""
+Record Store Module
+Compact columnar storage for a screen universe: typed NumPy arrays per column instead of one dict per stock.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from screening_core import DEFAULT_COLUMNS, ScreenUniverse
+
+# Low-cardinality text columns stored as small integer codes into a shared list of values
+CATEGORY_COLUMNS = ('Sector', 'Industry')
+
+
+def _is_number(value):
+    return value is None or (isinstance(value, (int, float, np.number)) and not isinstance(value, bool))
+
+
+class CategoryColumn:
+    """
+    Interned text column: an int16 code per row plus the distinct values
+    """
+
+    def __init__(self, codes, categories):
+        self.codes = np.asarray(codes, dtype='int16')
+        self.categories = list(categories)
+
+    @classmethod
+    def from_values(cls, values):
+        positions = {}
+        codes = np.fromiter(
+            (positions.setdefault(sys.intern(str(value)), len(positions)) for value in values),
+            dtype='int16',
+            count=len(values),
+        )
+        return cls(codes, positions)
+
+    def __getitem__(self, i):
+        return self.categories[self.codes[i]]
+
+    def decode(self):
+        return np.asarray(self.categories, dtype=object)[self.codes]
+
+    def to_pandas(self):
+        # Categorical shares the codes array rather than materializing a string per row
+        return pd.Categorical.from_codes(self.codes, self.categories)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + sum(sys.getsizeof(value) for value in self.categories)
+
+
+class RecordStore:
+    """
+    Screen rows held column by column, with the same row schema as the row dicts it replaces
+
+    Numeric columns are float64 arrays, Sector and Industry are interned category codes and the
+    remaining text (tickers, company names) is kept in object arrays. Indexing a store returns an
+    ordinary row dict, so code that renders or serializes rows does not change.
+    """
+
+    def __init__(self, keys, columns):
+        self.keys = list(keys)
+        self.columns = columns
+        self.size = len(next(iter(columns.values()))) if columns else 0
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build a store from row dicts; missing numeric values become NaN
+        """
+        rows = list(rows)
+        keys = []
+        for row in rows:
+            for key in row:
+                if key not in keys:
+                    keys.append(key)
+
+        columns = {}
+        for key in keys:
+            values = [row.get(key) for row in rows]
+            if key in CATEGORY_COLUMNS:
+                columns[key] = CategoryColumn.from_values(values)
+            elif all(_is_number(value) for value in values):
+                columns[key] = np.fromiter(
+                    (np.nan if value is None else value for value in values),
+                    dtype='float64',
+                    count=len(values),
+                )
+            else:
+                columns[key] = np.asarray(values, dtype=object)
+        return cls(keys, columns)
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Build a store from a data frame, reusing its numeric arrays
+        """
+        columns = {}
+        for key in df.columns:
+            series = df[key]
+            if key in CATEGORY_COLUMNS:
+                columns[key] = CategoryColumn.from_values(series.tolist())
+            elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                columns[key] = series.to_numpy(dtype='float64')
+            else:
+                columns[key] = series.to_numpy(dtype=object)
+        return cls(df.columns, columns)
+
+    def __len__(self):
+        return self.size
+
+    def _value(self, key, i):
+        value = self.columns[key][i]
+        if isinstance(value, np.floating):
+            return float(value)
+        return value
+
+    def __getitem__(self, i):
+        """
+        Materialize row i as a dict
+        """
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("record index out of range")
+        return {key: self._value(key, i) for key in self.keys}
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+
+    def take(self, indices):
+        """
+        Row dicts for the given indices, in that order
+        """
+        indices = np.asarray(indices, dtype='int64')
+        # Gather column by column; tolist() converts to Python scalars in one C loop
+        values = []
+        for key in self.keys:
+            column = self.columns[key]
+            if isinstance(column, CategoryColumn):
+                values.append([column.categories[code] for code in column.codes[indices].tolist()])
+            else:
+                values.append(column[indices].tolist())
+        return [dict(zip(self.keys, row)) for row in zip(*values)]
+
+    def column(self, key):
+        """
+        One column as a NumPy array (category codes are decoded to their values)
+        """
+        column = self.columns[key]
+        return column.decode() if isinstance(column, CategoryColumn) else column
+
+    def universe(self, columns=DEFAULT_COLUMNS, factor_columns=()):
+        """
+        ScreenUniverse over this store's arrays; screened indices map back with take()
+        """
+        def numeric(key):
+            # An empty store has no columns at all
+            return self.columns[key] if key in self.columns else np.full(self.size, np.nan)
+
+        return ScreenUniverse(
+            self.columns.get('Ticker', np.empty(0, dtype=object)),
+            numeric(columns['market_cap']),
+            numeric(columns['price']),
+            numeric(columns['return_250d']),
+            self,
+            {key: numeric(key) for key in factor_columns},
+        )
+
+    def to_frame(self):
+        """
+        Data frame view of the store; numeric columns share memory with the store's arrays
+        """
+        data = {}
+        for key in self.keys:
+            column = self.columns[key]
+            data[key] = column.to_pandas() if isinstance(column, CategoryColumn) else column
+        return pd.DataFrame(data, columns=self.keys, copy=False)
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory held by the store, counting the text objects it references
+        """
+        total = 0
+        for column in self.columns.values():
+            if isinstance(column, CategoryColumn):
+                total += column.nbytes
+            elif column.dtype == object:
+                total += column.nbytes + sum(sys.getsizeof(value) for value in column)
+            else:
+                total += column.nbytes
+        return total
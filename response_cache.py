@@ -0,0 +1,141 @@
+"""
+Response Cache Module
+Bounded LRU cache of encoded API responses with strong ETags, so identical queries are answered without screening or
+serializing again, and clients that already hold the response get a 304.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# Responses kept, and the total bytes they may hold
+DEFAULT_MAX_ENTRIES = int(os.environ.get("SCREENER_RESPONSE_CACHE_SIZE", "256"))
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def etag_for(body):
+    """
+    Strong ETag (quoted) identifying a response body
+    """
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    True when an If-None-Match header lists etag, in any encoding variant, or is *
+    """
+    if not if_none_match:
+        return False
+    opaque = etag.strip('"')
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        # The gzip variant of a response carries the same tag with a -gzip suffix
+        if tag.strip('"') in (opaque, opaque + '-gzip'):
+            return True
+    return False
+
+
+class CachedResponse:
+    """
+    Encoded response body with its ETag; the gzip variant is compressed once, on first request
+    """
+
+    def __init__(self, body, content_type='application/json'):
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag_for(body)
+        self._gzipped = None
+
+    @property
+    def gzip_etag(self):
+        return self.etag[:-1] + '-gzip"'
+
+    def gzipped(self, compresslevel=5):
+        # Two threads may both compress on a race; either result is the same bytes
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=compresslevel)
+        return self._gzipped
+
+    @property
+    def size(self):
+        return len(self.body) + len(self._gzipped or b'')
+
+
+class ResponseCache:
+    """
+    LRU map of request key -> CachedResponse, bounded by entry count and total bytes
+
+    Keys should hold the normalized request parameters and the version of the data the response
+    was built from, so a refetched dataset never serves an old response; entries of older versions
+    simply age out.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, content_type='application/json'):
+        """
+        Store an encoded body under key and return its CachedResponse
+        """
+        entry = CachedResponse(body, content_type)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            self._evict()
+        return entry
+
+    def _evict(self):
+        total = sum(entry.size for entry in self.entries.values())
+        while self.entries and (len(self.entries) > self.max_entries or total > self.max_bytes):
+            _, entry = self.entries.popitem(last=False)
+            total -= entry.size
+
+    def record_not_modified(self):
+        with self.lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': sum(entry.size for entry in self.entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+            }
+
+
+_default_cache = ResponseCache()
+
+
+def get_response_cache():
+    """
+    Return the response cache shared by every request in this process
+    """
+    return _default_cache
@@ -0,0 +1,595 @@
+#!/usr/bin/env python3
+"""
+Screen DSL Module
+A small expression language for screens, e.g. `mcap > 10 and ret_250d > 15 and sector in ("Technology")`, parsed
+once, reordered so the most selective and cheapest predicates run first, and evaluated as vectorized NumPy masks.
+"""
+
+import argparse
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from factors import FACTORS
+from record_store import CategoryColumn, RecordStore
+from screening_core import DEFAULT_COLUMNS
+
+# Numeric screen fields, mapped to their key in a front end's column set (DEFAULT_COLUMNS or DOLLAR_COLUMNS)
+CORE_FIELDS = {
+    'mcap': 'market_cap',
+    'price': 'price',
+    'ret_250d': 'return_250d',
+}
+
+# Other spellings accepted for the core fields
+ALIASES = {
+    'market_cap': 'mcap',
+    'return_250d': 'ret_250d',
+}
+
+# Text fields and the row keys holding them
+TEXT_FIELDS = {
+    'ticker': 'Ticker',
+    'name': 'Company Name',
+    'sector': 'Sector',
+    'industry': 'Industry',
+}
+
+KEYWORDS = {'and', 'or', 'not', 'in', 'between', 'true', 'false'}
+
+# Rough cost of evaluating a predicate per row: float comparisons, category codes, Python strings
+COSTS = {'number': 1.0, 'category': 1.5, 'text': 8.0}
+
+# How CategoryColumn stores a missing Sector or Industry
+MISSING_CATEGORIES = ('None', 'nan')
+
+# Rows sampled to estimate how selective a predicate is
+SAMPLE_ROWS = 1024
+
+Compare = namedtuple('Compare', ['field', 'op', 'value'])
+In = namedtuple('In', ['field', 'values'])
+Not = namedtuple('Not', ['child'])
+And = namedtuple('And', ['children'])
+Or = namedtuple('Or', ['children'])
+
+TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+      | (?P<string>"[^"]*"|'[^']*')
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op>>=|<=|==|!=|<>|=|>|<)
+      | (?P<punct>[(),])
+    )""", re.VERBOSE)
+
+
+class ScreenSyntaxError(ValueError):
+    """
+    An expression that can't be parsed, or that names an unknown field
+    """
+
+
+def field_names():
+    """
+    Every field an expression can use
+    """
+    return list(CORE_FIELDS) + list(TEXT_FIELDS) + [name for name in FACTORS if name not in CORE_FIELDS]
+
+
+def field_key(field, columns=DEFAULT_COLUMNS):
+    """
+    Row key holding a field's values for a front end's column set
+    """
+    if field in CORE_FIELDS:
+        return columns[CORE_FIELDS[field]]
+    if field in TEXT_FIELDS:
+        return TEXT_FIELDS[field]
+    return FACTORS[field].label
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if match is None or match.end() == pos:
+            raise ScreenSyntaxError(f"Unexpected {text[pos:].lstrip()[:1]!r} at position {pos + 1} in {text!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        start = match.start(kind)
+        if kind == 'name' and value.lower() in KEYWORDS:
+            kind, value = 'keyword', value.lower()
+        tokens.append((kind, value, start + 1))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent over: or_expr := and_expr ('or' and_expr)*, and_expr := not_expr ('and' not_expr)*,
+    not_expr := 'not' not_expr | '(' or_expr ')' | predicate
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def error(self, message):
+        if self.pos < len(self.tokens):
+            where = f"at position {self.tokens[self.pos][2]}"
+        else:
+            where = "at the end"
+        return ScreenSyntaxError(f"{message} {where} in {self.text!r}")
+
+    def peek(self, kind=None, value=None):
+        if self.pos >= len(self.tokens):
+            return None
+        token = self.tokens[self.pos]
+        if (kind is None or token[0] == kind) and (value is None or token[1] == value):
+            return token
+        return None
+
+    def take(self, kind=None, value=None, expected=None):
+        token = self.peek(kind, value)
+        if token is None:
+            raise self.error(f"Expected {expected or value or kind}")
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise ScreenSyntaxError("Empty screen expression")
+        node = self.or_expr()
+        if self.pos < len(self.tokens):
+            raise self.error(f"Unexpected {self.tokens[self.pos][1]!r}")
+        return node
+
+    def or_expr(self):
+        children = [self.and_expr()]
+        while self.peek('keyword', 'or'):
+            self.pos += 1
+            children.append(self.and_expr())
+        return children[0] if len(children) == 1 else Or(tuple(children))
+
+    def and_expr(self):
+        children = [self.not_expr()]
+        while self.peek('keyword', 'and'):
+            self.pos += 1
+            children.append(self.not_expr())
+        return children[0] if len(children) == 1 else And(tuple(children))
+
+    def not_expr(self):
+        if self.peek('keyword', 'not'):
+            self.pos += 1
+            return Not(self.not_expr())
+        if self.peek('punct', '('):
+            self.pos += 1
+            node = self.or_expr()
+            self.take('punct', ')')
+            return node
+        return self.predicate()
+
+    def field(self):
+        _, name, _ = self.take('name', expected="a field name")
+        field = ALIASES.get(name.lower(), name.lower())
+        if field not in field_names():
+            self.pos -= 1
+            raise self.error(f"Unknown field {name!r} (fields: {', '.join(field_names())})")
+        return field
+
+    def value(self):
+        token = self.peek()
+        if token is None or token[0] not in ('number', 'string', 'keyword') or \
+                (token[0] == 'keyword' and token[1] not in ('true', 'false')):
+            raise self.error("Expected a number, a quoted string, true or false")
+        self.pos += 1
+        kind, text, _ = token
+        if kind == 'number':
+            return float(text)
+        if kind == 'string':
+            return text[1:-1]
+        return 1.0 if text == 'true' else 0.0
+
+    def predicate(self):
+        field = self.field()
+        if self.peek('keyword', 'not'):
+            self.pos += 1
+            self.take('keyword', 'in')
+            return Not(self.in_list(field))
+        if self.peek('keyword', 'in'):
+            self.pos += 1
+            return self.in_list(field)
+        if self.peek('keyword', 'between'):
+            self.pos += 1
+            low = self.value()
+            self.take('keyword', 'and')
+            high = self.value()
+            return And((Compare(field, '>=', low), Compare(field, '<=', high)))
+        _, op, _ = self.take('op', expected="a comparison operator")
+        op = {'=': '==', '<>': '!='}.get(op, op)
+        return self._typed(Compare(field, op, self.value()))
+
+    def in_list(self, field):
+        self.take('punct', '(')
+        values = [self.value()]
+        while self.peek('punct', ','):
+            self.pos += 1
+            values.append(self.value())
+        self.take('punct', ')')
+        for value in values:
+            self._typed(Compare(field, '==', value))
+        return In(field, tuple(values))
+
+    def _typed(self, node):
+        numeric = node.field not in TEXT_FIELDS
+        if numeric != isinstance(node.value, float):
+            self.pos -= 1
+            kind = "a number" if numeric else "a quoted string"
+            raise self.error(f"{node.field} must be compared with {kind}")
+        if not numeric and node.op not in ('==', '!='):
+            self.pos -= 1
+            raise self.error(f"{node.field} only supports ==, != and in")
+        return node
+
+
+def _format_value(value):
+    if isinstance(value, str):
+        return '"' + value + '"'
+    return f"{value:g}"
+
+
+def to_text(node, parent=None):
+    """
+    Canonical text of an expression tree, used as its cache key
+    """
+    if isinstance(node, Compare):
+        return f"{node.field} {node.op} {_format_value(node.value)}"
+    if isinstance(node, In):
+        return f"{node.field} in ({', '.join(_format_value(value) for value in node.values)})"
+    if isinstance(node, Not):
+        return f"not {to_text(node.child, Not)}"
+    joiner = ' and ' if isinstance(node, And) else ' or '
+    text = joiner.join(to_text(child, type(node)) for child in node.children)
+    return f"({text})" if parent is not None else text
+
+
+def _flatten(node):
+    """
+    Merge nested and/or nodes of the same kind, so the planner can reorder all of their children
+    """
+    if isinstance(node, Not):
+        return Not(_flatten(node.child))
+    if isinstance(node, (And, Or)):
+        children = []
+        for child in node.children:
+            child = _flatten(child)
+            children.extend(child.children if type(child) is type(node) else [child])
+        return type(node)(tuple(children))
+    return node
+
+
+class _Source:
+    """
+    Column access over a record store or data frame, by field
+    """
+
+    def __init__(self, data, columns):
+        if isinstance(data, pd.DataFrame):
+            data = RecordStore.from_frame(data)
+        elif not isinstance(data, RecordStore):
+            data = RecordStore.from_rows(data)
+        self.store = data
+        self.columns = columns
+        self.size = len(data)
+        self.sample = np.unique(np.linspace(0, self.size - 1, min(self.size, SAMPLE_ROWS)).astype('int64'))
+
+    def column(self, field):
+        key = field_key(field, self.columns)
+        if key not in self.store.columns:
+            if self.size == 0:
+                return np.empty(0, dtype='float64')
+            raise ScreenSyntaxError(f"The data has no {key!r} column for {field}; compute the {field} factor first")
+        return self.store.columns[key]
+
+    def kind(self, field):
+        column = self.column(field)
+        if isinstance(column, CategoryColumn):
+            return 'category'
+        return 'text' if column.dtype == object else 'number'
+
+
+def _predicate_mask(node, source, rows):
+    """
+    Boolean mask of a Compare or In node over the given row indices (None for every row)
+    """
+    column = source.column(node.field)
+    values = node.values if isinstance(node, In) else (node.value,)
+
+    if isinstance(column, CategoryColumn):
+        # Compare the small code array against the codes of the wanted categories
+        # A missing value is interned as the text of None or NaN
+        wanted = {str(value).lower() for value in values}
+        missing = [code for code, category in enumerate(column.categories) if category in MISSING_CATEGORIES]
+        codes = [code for code, category in enumerate(column.categories)
+                 if str(category).lower() in wanted and category not in MISSING_CATEGORIES]
+        data = column.codes if rows is None else column.codes[rows]
+        mask = np.isin(data, codes)
+        if isinstance(node, Compare) and node.op == '!=':
+            return ~mask & ~np.isin(data, missing)
+        return mask
+
+    data = column if rows is None else column[rows]
+    if data.dtype == object:
+        present = np.fromiter((value is not None for value in data), dtype=bool, count=len(data))
+        lowered = np.array([str(value).lower() for value in data], dtype=object)
+        mask = np.isin(lowered, [str(value).lower() for value in values]) & present
+        if isinstance(node, Compare) and node.op == '!=':
+            mask = ~mask & present
+        return mask
+
+    data = data.astype('float64', copy=False)
+    if isinstance(node, In):
+        return np.isin(data, values)
+    value = node.value
+    with np.errstate(invalid='ignore'):
+        if node.op == '>':
+            return data > value
+        if node.op == '>=':
+            return data >= value
+        if node.op == '<':
+            return data < value
+        if node.op == '<=':
+            return data <= value
+        if node.op == '==':
+            return data == value
+        # A missing value never matches, not even !=
+        return (data != value) & ~np.isnan(data)
+
+
+def _estimate(node, source):
+    """
+    (selectivity, cost per row) of a node, from a sample of the rows
+    """
+    if isinstance(node, (Compare, In)):
+        if not len(source.sample):
+            return 1.0, COSTS['number']
+        selectivity = float(np.mean(_predicate_mask(node, source, source.sample)))
+        return selectivity, COSTS[source.kind(node.field)]
+    if isinstance(node, Not):
+        selectivity, cost = _estimate(node.child, source)
+        return 1.0 - selectivity, cost
+    estimates = [_estimate(child, source) for child in node.children]
+    cost = sum(cost for _, cost in estimates)
+    if isinstance(node, And):
+        return float(np.prod([s for s, _ in estimates])), cost
+    return 1.0 - float(np.prod([1.0 - s for s, _ in estimates])), cost
+
+
+def _plan(node, source):
+    """
+    Reorder and/or children so the cheapest way to settle a row runs first
+
+    An and-child only sees the rows every earlier child kept, so children are ordered by cost
+    over the fraction of rows they drop; an or-child only sees rows no earlier child matched, so
+    they are ordered by cost over the fraction they match.
+    """
+    if isinstance(node, Not):
+        return Not(_plan(node.child, source))
+    if not isinstance(node, (And, Or)):
+        return node
+    children = [_plan(child, source) for child in node.children]
+    estimates = {id(child): _estimate(child, source) for child in children}
+
+    def rank(child):
+        selectivity, cost = estimates[id(child)]
+        settled = 1.0 - selectivity if isinstance(node, And) else selectivity
+        return cost / max(settled, 1e-9)
+
+    return type(node)(tuple(sorted(children, key=rank)))
+
+
+def _evaluate(node, source, rows):
+    """
+    Indices among rows (None for every row) that pass the node, in ascending order
+    """
+    if isinstance(node, (Compare, In)):
+        mask = _predicate_mask(node, source, rows)
+        return np.flatnonzero(mask) if rows is None else rows[mask]
+    if rows is None:
+        rows = np.arange(source.size)
+    if isinstance(node, Not):
+        return np.setdiff1d(rows, _evaluate(node.child, source, rows), assume_unique=True)
+    if isinstance(node, And):
+        # Each predicate only looks at the rows the earlier ones kept
+        for child in node.children:
+            rows = _evaluate(child, source, rows)
+            if not len(rows):
+                break
+        return rows
+    matched = []
+    remaining = rows
+    for child in node.children:
+        hits = _evaluate(child, source, remaining)
+        matched.append(hits)
+        remaining = np.setdiff1d(remaining, hits, assume_unique=True)
+        if not len(remaining):
+            break
+    return np.sort(np.concatenate(matched)) if matched else rows[:0]
+
+
+def _row_matches(node, row, columns):
+    if isinstance(node, And):
+        return all(_row_matches(child, row, columns) for child in node.children)
+    if isinstance(node, Or):
+        return any(_row_matches(child, row, columns) for child in node.children)
+    if isinstance(node, Not):
+        return not _row_matches(node.child, row, columns)
+
+    value = row.get(field_key(node.field, columns))
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return False
+    if node.field in TEXT_FIELDS:
+        value = str(value).lower()
+        values = {str(v).lower() for v in (node.values if isinstance(node, In) else (node.value,))}
+        return (value in values) != (isinstance(node, Compare) and node.op == '!=')
+    value = float(value)
+    if isinstance(node, In):
+        return value in node.values
+    return {
+        '>': value > node.value,
+        '>=': value >= node.value,
+        '<': value < node.value,
+        '<=': value <= node.value,
+        '==': value == node.value,
+        '!=': value != node.value,
+    }[node.op]
+
+
+class Screen:
+    """
+    A parsed screen expression
+
+    select() plans the expression against the data it screens: predicates are reordered by
+    their selectivity on a sample of the rows and their cost, then evaluated as NumPy masks,
+    each and-predicate only over the rows the earlier ones kept. row_passes() applies the same
+    screen to one row dict while rows are still streaming in. Missing values never match.
+    """
+
+    def __init__(self, tree):
+        self.tree = _flatten(tree)
+        self.text = to_text(self.tree)
+
+    def __repr__(self):
+        return f"Screen({self.text!r})"
+
+    def __str__(self):
+        return self.text
+
+    def fields(self):
+        """
+        Fields the expression uses, in order of first use
+        """
+        fields = []
+
+        def visit(node):
+            if isinstance(node, (Compare, In)):
+                if node.field not in fields:
+                    fields.append(node.field)
+            elif isinstance(node, Not):
+                visit(node.child)
+            else:
+                for child in node.children:
+                    visit(child)
+
+        visit(self.tree)
+        return fields
+
+    def factors(self):
+        """
+        Factor names the expression needs computed
+        """
+        return [field for field in self.fields() if field not in CORE_FIELDS and field not in TEXT_FIELDS]
+
+    def plan(self, data, columns=DEFAULT_COLUMNS):
+        """
+        Canonical text of the expression in the order it would be evaluated over data
+        """
+        return to_text(_plan(self.tree, _Source(data, columns)))
+
+    def select(self, data, columns=DEFAULT_COLUMNS):
+        """
+        Indices of the rows passing the screen, sorted by market cap (descending)
+
+        data is a RecordStore, a data frame or a list of row dicts.
+        """
+        source = _Source(data, columns)
+        selected = _evaluate(_plan(self.tree, source), source, None)
+        key = columns['market_cap']
+        if key in source.store.columns:
+            market_cap = source.store.columns[key][selected]
+            selected = selected[np.argsort(-market_cap, kind='stable')]
+        return selected
+
+    def mask(self, data, columns=DEFAULT_COLUMNS):
+        """
+        Boolean mask of the rows passing the screen, in row order
+        """
+        source = _Source(data, columns)
+        mask = np.zeros(source.size, dtype=bool)
+        mask[_evaluate(_plan(self.tree, source), source, None)] = True
+        return mask
+
+    def filter_rows(self, rows, columns=DEFAULT_COLUMNS):
+        """
+        Matching rows sorted by market cap, like screening_core.filter_rows
+        """
+        if isinstance(rows, RecordStore):
+            return rows.take(self.select(rows, columns))
+        rows = list(rows)
+        return [rows[i] for i in self.select(rows, columns)]
+
+    def row_passes(self, row, columns=DEFAULT_COLUMNS):
+        return _row_matches(self.tree, row, columns)
+
+    def stream_filter(self, rows, columns=DEFAULT_COLUMNS):
+        """
+        Lazily yield the rows passing the screen, in arrival order
+        """
+        for row in rows:
+            if self.row_passes(row, columns):
+                yield row
+
+
+@lru_cache(maxsize=256)
+def parse(text):
+    """
+    Parse a screen expression into a Screen; repeated expressions are parsed once
+    """
+    return Screen(_Parser(text).parse())
+
+
+def _screen_argument(text):
+    try:
+        return parse(text)
+    except ScreenSyntaxError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def add_screen_arguments(parser):
+    """
+    Add --screen to a front end's argument parser
+    """
+    parser.add_argument("--screen", metavar="EXPR", type=_screen_argument,
+                        help="screen expression replacing the default filters, e.g. "
+                             "'mcap > 10 and ret_250d > 15 and sector in (\"Technology\")'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a screen expression and show how it would run")
+    parser.add_argument("expression", help="e.g. 'mcap > 10 and ret_250d > 15 and sector in (\"Technology\")'")
+    parser.add_argument("--size", type=int, default=10000, help="synthetic rows to plan against (default %(default)s)")
+    args = parser.parse_args()
+
+    try:
+        screen = parse(args.expression)
+    except ScreenSyntaxError as e:
+        parser.exit(2, f"{e}\n")
+    print(f"Parsed:  {screen}")
+
+    from mock_stock_screener import generate_mock_stock_data
+    rows = generate_mock_stock_data([f"T{i:05d}" for i in range(args.size)], delay=0, show_progress=False, seed=0)
+    missing = screen.factors()
+    if missing:
+        print(f"Needs factors: {', '.join(missing)} (not in the mock data, so not planned)")
+        return
+    store = RecordStore.from_rows(rows)
+    print(f"Planned: {screen.plan(store)}")
+    print(f"Matches: {len(screen.select(store))} of {len(store)} mock stocks")
+
+
+if __name__ == "__main__":
+    main()
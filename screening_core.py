@@ -0,0 +1,292 @@
+"""
+Screening Core Module
+Screens the whole universe in vectorized passes over columnar NumPy arrays instead of looping over row dicts.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Row keys used by the simple, mock, web and Streamlit screeners
+DEFAULT_COLUMNS = {
+    'market_cap': 'Market Cap (B)',
+    'price': 'Current Price',
+    'return_250d': '250-Day Return',
+}
+
+# Row keys used by stock_screener.py and cli_stock_screener.py
+DOLLAR_COLUMNS = {
+    'market_cap': 'Market Cap ($B)',
+    'price': 'Current Price ($)',
+    'return_250d': '250-Day Return (%)',
+}
+
+
+def build_close_matrix(histories):
+    """
+    Align per-ticker histories into one dates x tickers frame of closes
+    """
+    series = {}
+    for ticker, hist in histories.items():
+        if hist is None or hist.empty:
+            continue
+        close = hist['Close']
+        index = pd.DatetimeIndex(close.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        series[ticker] = pd.Series(close.to_numpy(dtype='float64'), index=index.normalize())
+
+    if not series:
+        return pd.DataFrame(dtype='float64')
+
+    closes = pd.DataFrame(series).sort_index()
+    return closes[~closes.index.duplicated(keep='last')]
+
+
+def trailing_returns(closes, window=250):
+    """
+    Percent return over the last `window` bars for every column of a close matrix
+
+    Columns with fewer than `window` closes get NaN rather than a made-up value.
+    """
+    if closes.empty:
+        return pd.Series(dtype='float64')
+
+    filled = closes.ffill()
+    end = filled.iloc[-1]
+    start = filled.shift(window - 1).iloc[-1] if len(filled) >= window else end * np.nan
+    returns = (end - start) / start * 100
+    returns[closes.notna().sum() < window] = np.nan
+    return returns
+
+
+class ScreenUniverse:
+    """
+    Columnar view of a screen universe: one NumPy array per numeric screen column
+    """
+
+    def __init__(self, tickers, market_cap, price, return_250d, rows=None, factors=None):
+        self.tickers = np.asarray(tickers, dtype=object)
+        self.market_cap = np.asarray(market_cap, dtype='float64')
+        self.price = np.asarray(price, dtype='float64')
+        self.return_250d = np.asarray(return_250d, dtype='float64')
+        self.rows = rows
+        # Extra numeric columns (e.g. factors) by name, usable in factor_filters
+        self.factors = {name: np.asarray(values, dtype='float64') for name, values in (factors or {}).items()}
+
+    def __len__(self):
+        return len(self.tickers)
+
+    @classmethod
+    def from_rows(cls, rows, columns=DEFAULT_COLUMNS, factor_columns=()):
+        """
+        Build a universe from row dicts, keeping the rows so results can be returned as-is
+
+        factor_columns names extra numeric row keys to expose for factor_filters.
+        """
+        rows = list(rows)
+
+        def column(key):
+            return np.fromiter((row.get(key, np.nan) for row in rows), dtype='float64', count=len(rows))
+
+        return cls(
+            [row['Ticker'] for row in rows],
+            column(columns['market_cap']),
+            column(columns['price']),
+            column(columns['return_250d']),
+            rows,
+            {key: column(key) for key in factor_columns},
+        )
+
+    @classmethod
+    def from_closes(cls, closes, market_caps, factors=None):
+        """
+        Build a universe from a dates x tickers close matrix and a ticker -> market cap ($B) mapping
+
+        factors is an optional frame indexed by ticker, such as the output of factors.compute_factors.
+        """
+        tickers = list(closes.columns)
+        price = closes.ffill().iloc[-1].to_numpy() if len(closes) else np.full(len(tickers), np.nan)
+        factors = {} if factors is None else {
+            name: factors[name].reindex(tickers).to_numpy() for name in factors.columns
+        }
+        return cls(
+            tickers,
+            [market_caps.get(ticker, np.nan) for ticker in tickers],
+            price,
+            trailing_returns(closes).reindex(tickers).to_numpy(),
+            factors=factors,
+        )
+
+    def mask(self, min_market_cap=2.0, min_price=10.0, positive_return=True, factor_filters=None):
+        """
+        Boolean mask of the tickers passing every filter
+
+        factor_filters maps a factor column to a (low, high) range; either bound may be None.
+        """
+        mask = (self.market_cap >= min_market_cap) & (self.price >= min_price)
+        if positive_return:
+            mask &= self.return_250d > 0
+
+        for name, (low, high) in (factor_filters or {}).items():
+            values = self.factors[name]
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+
+        return mask
+
+    def screen(self, min_market_cap=2.0, min_price=10.0, positive_return=True, factor_filters=None):
+        """
+        Indices of the tickers passing every filter, sorted by market cap (descending)
+        """
+        selected = np.flatnonzero(self.mask(min_market_cap, min_price, positive_return, factor_filters))
+        order = np.argsort(-self.market_cap[selected], kind='stable')
+        return selected[order]
+
+
+def filter_rows(rows, min_market_cap=2.0, min_price=10.0, positive_return=True, columns=DEFAULT_COLUMNS,
+                factor_filters=None):
+    """
+    Vectorized drop-in for the filter_stocks loops: returns the matching rows sorted by market cap
+
+    factor_filters maps a numeric row key to a (low, high) range; either bound may be None.
+    """
+    factor_filters = factor_filters or {}
+    if isinstance(rows, ScreenUniverse):
+        universe = rows
+    else:
+        universe = ScreenUniverse.from_rows(rows, columns, factor_columns=list(factor_filters))
+
+    selected = universe.screen(min_market_cap, min_price, positive_return, factor_filters)
+    if hasattr(universe.rows, 'take'):
+        # Columnar record store: gather the matching rows in one pass per column
+        return universe.rows.take(selected)
+    return [universe.rows[i] for i in selected]
+
+
+def row_passes(row, min_market_cap=2.0, min_price=10.0, positive_return=True, columns=DEFAULT_COLUMNS,
+               factor_filters=None):
+    """
+    Apply the screen to a single row, with the same semantics as ScreenUniverse.mask
+
+    Used while rows are still streaming in, before a columnar universe can be built.
+    """
+    def value(key):
+        value = row.get(key)
+        return np.nan if value is None else value
+
+    if not (value(columns['market_cap']) >= min_market_cap and value(columns['price']) >= min_price):
+        return False
+    if positive_return and not value(columns['return_250d']) > 0:
+        return False
+
+    for key, (low, high) in (factor_filters or {}).items():
+        if low is not None and not value(key) >= low:
+            return False
+        if high is not None and not value(key) <= high:
+            return False
+    return True
+
+
+def stream_filter(rows, min_market_cap=2.0, min_price=10.0, positive_return=True, columns=DEFAULT_COLUMNS,
+                  factor_filters=None):
+    """
+    Lazily yield the rows passing the screen, in arrival order
+    """
+    for row in rows:
+        if row_passes(row, min_market_cap, min_price, positive_return, columns, factor_filters):
+            yield row
+
+
+class SortedColumn:
+    """
+    One numeric column presorted once, so threshold predicates become binary searches
+    """
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype='float64')
+        self.size = len(values)
+        # NaNs sort to the end and never satisfy a comparison
+        self.order = np.argsort(values, kind='stable')
+        self.sorted = values[self.order]
+        self.valid = int(np.count_nonzero(~np.isnan(values)))
+
+    def matching(self, op, threshold):
+        """
+        Row indices where `value op threshold` holds, for op in >=, >, <=, <
+        """
+        valid = self.sorted[:self.valid]
+        if op == '>=':
+            return self.order[np.searchsorted(valid, threshold, side='left'):self.valid]
+        if op == '>':
+            return self.order[np.searchsorted(valid, threshold, side='right'):self.valid]
+        if op == '<=':
+            return self.order[:np.searchsorted(valid, threshold, side='right')]
+        if op == '<':
+            return self.order[:np.searchsorted(valid, threshold, side='left')]
+        raise ValueError(f"Unsupported operator: {op}")
+
+    def mask(self, op, threshold):
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.matching(op, threshold)] = True
+        return mask
+
+
+class IncrementalScreen:
+    """
+    Screens a fixed universe repeatedly, re-evaluating only predicates whose threshold changed
+
+    Each numeric column is sorted once up front. A predicate is a binary search on its column,
+    its mask is cached until the threshold moves, and results come out in market-cap order
+    without re-sorting.
+    """
+
+    def __init__(self, universe):
+        self.universe = universe
+        self.columns = {
+            'market_cap': SortedColumn(universe.market_cap),
+            'price': SortedColumn(universe.price),
+            'return_250d': SortedColumn(universe.return_250d),
+        }
+        for name, values in universe.factors.items():
+            self.columns[name] = SortedColumn(values)
+
+        # Market cap descending, ties kept in row order like the filter_stocks sort
+        self.by_market_cap = np.argsort(-universe.market_cap, kind='stable')
+        self.predicates = {}
+        self.evaluations = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.universe)
+
+    def _predicate_mask(self, column, op, threshold):
+        key = (column, op)
+        cached = self.predicates.get(key)
+        if cached is None or cached[0] != threshold:
+            self.evaluations += 1
+            cached = (threshold, self.columns[column].mask(op, threshold))
+            self.predicates[key] = cached
+        return cached[1]
+
+    def screen(self, min_market_cap=2.0, min_price=10.0, positive_return=True, factor_filters=None):
+        """
+        Indices of the tickers passing every filter, sorted by market cap (descending)
+        """
+        specs = [('market_cap', '>=', min_market_cap), ('price', '>=', min_price)]
+        if positive_return:
+            specs.append(('return_250d', '>', 0))
+        for name, (low, high) in (factor_filters or {}).items():
+            if low is not None:
+                specs.append((name, '>=', low))
+            if high is not None:
+                specs.append((name, '<=', high))
+
+        with self.lock:
+            masks = [self._predicate_mask(*spec) for spec in specs]
+
+        combined = np.logical_and.reduce(masks)
+        return self.by_market_cap[combined[self.by_market_cap]]
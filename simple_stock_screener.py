@@ -4,80 +4,127 @@ Simple Stock Screener
 This script screens stocks based on market cap, price, and performance without using pandas.
 """
 
-import yfinance as yf
+import argparse
 import time
 import sys
-import csv
-from stock_tickers import TICKERS
+from screening_core import filter_rows
+from fundamentals_cache import save_fundamentals
+from providers import add_provider_arguments, get_provider, provider_from_args
+from universe import add_universe_arguments, universe_from_args
+from negative_cache import summarize_skips
+from factors import FACTORS
+from stream_pipeline import in_ticker_order, stream_rows
+from instrumentation import RunMetrics, add_profile_arguments, profiled, timed
+from exporters import add_export_arguments, export
+from screen_dsl import add_screen_arguments
 
-def get_stock_data(tickers, period="1y"):
+def fetch_ticker(ticker, period="1y", hist=None, provider=None):
+    """
+    Fetch the screen row for a single ticker, or None if it has no price history
+    
+    hist can be passed in when the price history was already loaded in bulk. provider defaults
+    to the process-wide data provider.
+    """
+    # Get stock data
+    provider = provider or get_provider()
+    if hist is None:
+        hist = provider.history(ticker, period)
+    
+    if len(hist) == 0:
+        return None
+    
+    # Get basic info (the live provider serves it from the fundamentals cache while it is fresh)
+    info = provider.info(ticker)
+    market_cap = info.get('marketCap', 0)
+    current_price = hist['Close'].iloc[-1]
+    
+    # Calculate 250-day return
+    if len(hist) >= 250:
+        start_price = hist['Close'].iloc[-250]
+        end_price = hist['Close'].iloc[-1]
+        return_250d = (end_price - start_price) / start_price * 100
+    else:
+        # Too short a history has no 250-day return; missing values never pass a return screen
+        return_250d = float('nan')
+    
+    return {
+        'Ticker': ticker,
+        'Company Name': info.get('shortName', ticker),
+        'Current Price': current_price,
+        'Market Cap (B)': market_cap / 1e9 if market_cap else 0,
+        '250-Day Return': return_250d,
+        'Sector': info.get('sector', 'N/A'),
+        'Industry': info.get('industry', 'N/A'),
+    }
+
+def get_stock_data(tickers, period="1y", max_workers=None, bulk_history=True, factors=(), provider=None,
+                   metrics=None):
     """
     Fetch stock data for the given tickers
+    
+    metrics (an instrumentation.RunMetrics) collects the pipeline's timings.
     """
-    data = []
     total = len(tickers)
     
     print(f"Fetching data for {total} stocks...")
     
-    for i, ticker in enumerate(tickers):
-        try:
-            # Show progress
-            progress = (i / total) * 100
-            sys.stdout.write(f"\rProgress: {progress:.1f}% - Processing {ticker} ({i+1}/{total})")
-            sys.stdout.flush()
-            
-            # Get stock data
-            stock = yf.Ticker(ticker)
-            hist = stock.history(period=period)
-            
-            if len(hist) > 0:
-                # Get basic info
-                info = stock.info
-                market_cap = info.get('marketCap', 0)
-                current_price = hist['Close'].iloc[-1] if len(hist) > 0 else 0
-                
-                # Calculate 250-day return
-                if len(hist) >= 250:
-                    start_price = hist['Close'].iloc[-250] if len(hist) >= 250 else hist['Close'].iloc[0]
-                    end_price = hist['Close'].iloc[-1]
-                    return_250d = (end_price - start_price) / start_price * 100
-                else:
-                    return_250d = 0
-                
-                stock_data = {
-                    'Ticker': ticker,
-                    'Company Name': info.get('shortName', ticker),
-                    'Current Price': current_price,
-                    'Market Cap (B)': market_cap / 1e9 if market_cap else 0,
-                    '250-Day Return': return_250d,
-                    'Sector': info.get('sector', 'N/A'),
-                    'Industry': info.get('industry', 'N/A'),
-                }
-                
-                data.append(stock_data)
-        except Exception as e:
-            print(f"\nError fetching data for {ticker}: {str(e)}")
-            print("Skipping and continuing...")
+    def on_progress(done, total, ticker):
+        # Show progress
+        progress = (done / total) * 100
+        sys.stdout.write(f"\rProgress: {progress:.1f}% - Processed {ticker} ({done}/{total})")
+        sys.stdout.flush()
+    
+    def on_error(ticker, e):
+        print(f"\nError fetching data for {ticker}: {str(e)}")
+        print("Skipping and continuing...")
+    
+    def on_history_error(e):
+        print(f"\nBulk history download failed, fetching one by one: {str(e)}")
+    
+    # Delisted tickers and tickers that recently failed or came back empty are not fetched
+    skipped = {}
+    
+    def on_skip(ticker, reason):
+        skipped[ticker] = reason
+    
+    # Histories are loaded from the on-disk cache a chunk at a time (missing bars downloaded in
+    # bulk) and factor columns are computed per chunk as rows stream in
+    try:
+        data = in_ticker_order(stream_rows(
+            tickers,
+            lambda ticker, hist: fetch_ticker(ticker, period, hist, provider),
+            period,
+            max_workers,
+            bulk_history,
+            factors,
+            on_progress=on_progress,
+            on_error=on_error,
+            on_history_error=on_history_error,
+            provider=provider,
+            on_skip=on_skip,
+            metrics=metrics,
+        ), tickers)
+    finally:
+        save_fundamentals()
     
     print("\nProcessing complete!")
+    if skipped:
+        print(f"Skipped {len(skipped)} tickers without fetching:")
+        for line in summarize_skips(skipped):
+            print(f"- {line}")
     return data
 
-def filter_stocks(stocks, min_market_cap=2.0, min_price=10.0, positive_return=True):
+def filter_stocks(stocks, min_market_cap=2.0, min_price=10.0, positive_return=True, factor_filters=None, screen=None):
     """
-    Filter stocks based on criteria
-    """
-    filtered = []
-    
-    for stock in stocks:
-        if (stock['Market Cap (B)'] >= min_market_cap and 
-            stock['Current Price'] >= min_price and
-            (not positive_return or stock['250-Day Return'] > 0)):
-            filtered.append(stock)
+    Filter stocks based on criteria, sorted by market cap (descending)
     
-    # Sort by market cap (descending)
-    filtered.sort(key=lambda x: x['Market Cap (B)'], reverse=True)
-    
-    return filtered
+    factor_filters maps a factor name from factors.FACTORS to a (low, high) range. A screen (a
+    screen_dsl.Screen) replaces the thresholds and factor ranges.
+    """
+    if screen is not None:
+        return screen.filter_rows(stocks)
+    factor_filters = {FACTORS[name].label: bounds for name, bounds in (factor_filters or {}).items()}
+    return filter_rows(stocks, min_market_cap, min_price, positive_return, factor_filters=factor_filters)
 
 def print_table(data, headers):
     """
@@ -124,53 +171,58 @@ def print_table(data, headers):
 
 def save_to_csv(data, filename):
     """
-    Save data to a CSV file
+    Save data to a file, CSV unless the file name asks for Parquet or Arrow
     """
     if not data:
         return
     
-    headers = data[0].keys()
-    
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=headers)
-        writer.writeheader()
-        writer.writerows(data)
+    # Written a chunk at a time; .csv.gz, .parquet and .arrow names pick compression and format
+    export(data, filename)
 
-def main():
-    print("===== Stock Screener =====")
-    print("This tool screens stocks based on market cap, price, and performance")
-    
-    # Default filter values
-    min_market_cap = 2.0  # $2 billion
-    min_price = 10.0      # $10
-    positive_return = True
-    
-    # Ask for number of stocks to analyze
-    try:
-        num_stocks = int(input(f"Number of stocks to analyze (max {len(TICKERS)}, default 50): ") or "50")
-        num_stocks = min(num_stocks, len(TICKERS))
-    except ValueError:
-        num_stocks = 50
-    
-    # Use only the selected number of stocks
-    selected_tickers = TICKERS[:num_stocks]
+def screen_and_report(tickers, min_market_cap, min_price, positive_return, metrics=None, universe_path=None,
+                      screen=None):
+    """
+    Fetch and screen the tickers, print the matches and statistics and return them
     
-    print(f"\nAnalyzing {len(selected_tickers)} stocks. This may take a few minutes...")
-    stocks = get_stock_data(selected_tickers)
+    Returns None when no data was retrieved. Each step is timed as a stage of metrics. With
+    universe_path every fetched stock is also exported there, not just the matches. A screen
+    (a screen_dsl.Screen) replaces the three thresholds.
+    """
+    factors = screen.factors() if screen is not None else ()
+    with timed(metrics, 'fetch'):
+        stocks = get_stock_data(tickers, factors=factors, metrics=metrics)
     
     if not stocks:
         print("No data was retrieved. Please try again.")
-        return
+        return None
+    
+    if universe_path:
+        with timed(metrics, 'render'):
+            save_to_csv(stocks, universe_path)
+        print(f"All {len(stocks)} fetched stocks saved to {universe_path}")
     
     # Apply filters
     print("\nApplying filters:")
-    print(f"- Market Cap >= ${min_market_cap} billion")
-    print(f"- Current Price >= ${min_price}")
-    if positive_return:
-        print("- 250-Day Return > 0%")
+    if screen is not None:
+        print(f"- {screen}")
+    else:
+        print(f"- Market Cap >= ${min_market_cap} billion")
+        print(f"- Current Price >= ${min_price}")
+        if positive_return:
+            print("- 250-Day Return > 0%")
     
-    filtered_stocks = filter_stocks(stocks, min_market_cap, min_price, positive_return)
+    # The vectorized screen returns the matches already sorted by market cap
+    with timed(metrics, 'filter'):
+        filtered_stocks = filter_stocks(stocks, min_market_cap, min_price, positive_return, screen=screen)
     
+    with timed(metrics, 'render'):
+        print_results(filtered_stocks)
+    return filtered_stocks
+
+def print_results(filtered_stocks):
+    """
+    Print the matching stocks and their statistics
+    """
     # Display results
     print(f"\nFound {len(filtered_stocks)} stocks matching your criteria:")
     
@@ -181,21 +233,71 @@ def main():
     if filtered_stocks:
         print("\nStatistics:")
         avg_market_cap = sum(stock['Market Cap (B)'] for stock in filtered_stocks) / len(filtered_stocks)
-        avg_return = sum(stock['250-Day Return'] for stock in filtered_stocks) / len(filtered_stocks)
+        # Stocks with too short a history have no return and are left out of its statistics
+        returns = [stock['250-Day Return'] for stock in filtered_stocks if stock['250-Day Return'] == stock['250-Day Return']]
+        avg_return = sum(returns) / len(returns) if returns else float('nan')
         max_market_cap = max(stock['Market Cap (B)'] for stock in filtered_stocks)
-        max_return = max(stock['250-Day Return'] for stock in filtered_stocks)
+        max_return = max(returns, default=float('nan'))
         
         print(f"Average Market Cap: ${avg_market_cap:.2f}B")
         print(f"Average 250-Day Return: {avg_return:.2f}%")
         print(f"Highest Market Cap: ${max_market_cap:.2f}B")
         print(f"Highest 250-Day Return: {max_return:.2f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Screen stocks based on market cap, price, and performance")
+    add_provider_arguments(parser)
+    add_universe_arguments(parser)
+    add_profile_arguments(parser)
+    add_export_arguments(parser)
+    add_screen_arguments(parser)
+    args = parser.parse_args()
+    provider = provider_from_args(args)
+    universe = universe_from_args(args)
+    
+    print("===== Stock Screener =====")
+    print("This tool screens stocks based on market cap, price, and performance")
+    if not provider.live:
+        print(f"Using offline data from the {provider.name} provider")
+    
+    # Default filter values
+    min_market_cap = 2.0  # $2 billion
+    min_price = 10.0      # $10
+    positive_return = True
+    
+    # Ask for number of stocks to analyze
+    available = len(universe.tickers())
+    try:
+        num_stocks = int(input(f"Number of stocks to analyze (max {available}, default 50): ") or "50")
+        num_stocks = min(num_stocks, available)
+    except ValueError:
+        num_stocks = 50
+    
+    # The largest live stocks of the universe (delisted symbols are never fetched)
+    selected_tickers = universe.select(num_stocks)
+    
+    print(f"\nAnalyzing {len(selected_tickers)} stocks. This may take a few minutes...")
+    metrics = RunMetrics('simple')
+    
+    def on_profile(path, text):
+        print(f"\nProfile written to {path}")
+        print(text)
+    
+    with profiled(args.profile, 'simple', args.profile_out, on_report=on_profile):
+        filtered_stocks = screen_and_report(selected_tickers, min_market_cap, min_price, positive_return, metrics,
+                                            args.export_universe, args.screen)
+    
+    metrics.finish()
+    print()
+    print("\n".join(metrics.report()))
+    if filtered_stocks is None:
+        return
     
-    # Save to CSV
-    save_option = input("\nDo you want to save the results to a CSV file? (y/n): ")
+    # Save to CSV (or the format --output names)
+    save_option = input(f"\nDo you want to save the results to {args.output}? (y/n): ")
     if save_option.lower() == 'y':
-        filename = "stock_screener_results.csv"
-        save_to_csv(filtered_stocks, filename)
-        print(f"Results saved to {filename}")
+        save_to_csv(filtered_stocks, args.output)
+        print(f"Results saved to {args.output}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
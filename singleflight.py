@@ -0,0 +1,134 @@
+"""
+Single Flight Module
+Coalesces concurrent requests for the same data: while one caller fetches a key, every other caller asking for it
+waits for that fetch and shares its result instead of fetching it again.
+"""
+
+import threading
+
+
+class _Call:
+    """
+    One in-flight fetch of a key
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def result(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class SingleFlight:
+    """
+    In-flight fetches of one kind of data, keyed by whatever identifies a request (e.g. ticker)
+
+    Only calls that overlap in time are coalesced; a key fetched after the last fetch finished
+    is fetched again, so caching stays the job of the caches behind it. A failed fetch raises
+    its exception in every caller that was waiting on it.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = {}
+        self.lock = threading.Lock()
+        # Keys requested, fetched by their caller, and served from another caller's fetch
+        self.requested = 0
+        self.fetched = 0
+        self.shared = 0
+
+    def _claim(self, keys):
+        """
+        Split keys into (own, waiting): calls this caller must make, and calls already in flight
+        """
+        own, waiting = {}, {}
+        with self.lock:
+            for key in keys:
+                call = self.calls.get(key)
+                if call is None:
+                    call = own[key] = self.calls[key] = _Call()
+                else:
+                    waiting[key] = call
+            self.requested += len(keys)
+            self.fetched += len(own)
+            self.shared += len(waiting)
+        return own, waiting
+
+    def _finish(self, own, values=None, error=None):
+        with self.lock:
+            for key, call in own.items():
+                self.calls.pop(key, None)
+        for key, call in own.items():
+            if error is not None:
+                call.error = error
+            else:
+                call.value = values.get(key)
+            call.done.set()
+
+    def do(self, key, fetch):
+        """
+        Return fetch() for key, or the result of the same key's fetch already in flight
+        """
+        return self.do_many([key], lambda keys: {key: fetch()})[key]
+
+    def do_many(self, keys, fetch_many):
+        """
+        Return {key: value} for keys, calling fetch_many(keys) only for those not in flight
+
+        fetch_many gets the keys this caller claimed, in order, and returns a dict of their
+        values (a missing key counts as None). Keys other callers are fetching are waited on after
+        this caller's own fetch, so callers with overlapping batches never wait on each other in a
+        cycle.
+        """
+        keys = list(dict.fromkeys(keys))
+        own, waiting = self._claim(keys)
+        values = {}
+        if own:
+            try:
+                values = fetch_many(list(own)) or {}
+            except BaseException as e:
+                self._finish(own, error=e)
+                raise
+            self._finish(own, values)
+        results = {key: values.get(key) for key in own}
+        for key, call in waiting.items():
+            results[key] = call.result()
+        return {key: results[key] for key in keys}
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requested': self.requested,
+                'fetched': self.fetched,
+                'deduplicated': self.shared,
+                'in_flight': len(self.calls),
+            }
+
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+def get_single_flight(name):
+    """
+    Return the process-wide single-flight group for one kind of data, e.g. 'history'
+    """
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = _groups[name] = SingleFlight(name)
+        return group
+
+
+def single_flight_stats():
+    """
+    Counters of every group, keyed by name, for /api/metrics
+    """
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {group.name: group.stats() for group in groups}
@@ -1,67 +1,160 @@
 import streamlit as st
 st.set_page_config(page_title="Stock Screener", layout="wide")
 
-import yfinance as yf
 import pandas as pd
 import datetime
+import time
 import traceback
-from stock_tickers import TICKERS
+from universe import get_universe
+from negative_cache import summarize_skips
+from fundamentals_cache import save_fundamentals
+from providers import get_provider
+from screening_core import DOLLAR_COLUMNS, IncrementalScreen, row_passes
+from record_store import RecordStore
+from dataset_cache import get_dataset_cache
+from stream_pipeline import in_ticker_order, stream_rows
+from instrumentation import DEFAULT_PROFILE, RunMetrics, metrics_tables, profiled, timed
+from prefetch_daemon import PREFETCH_ENABLED, get_prefetch_daemon
+from singleflight import single_flight_stats
+from screen_dsl import ScreenSyntaxError, parse
+
+# Seconds between redraws of the live results table while rows stream in
+LIVE_REFRESH_INTERVAL = 0.5
 
 st.set_page_config(page_title="Stock Screener", layout="wide")
 
-def get_stock_data(tickers, period="1y"):
+def fetch_ticker(ticker, period="1y", hist=None, provider=None):
+    """
+    Fetch the screen row for a single ticker, or None if it has no price history
+    
+    hist can be passed in when the price history was already loaded in bulk. provider defaults
+    to the process-wide data provider.
+    """
+    # Get stock data
+    provider = provider or get_provider()
+    if hist is None:
+        hist = provider.history(ticker, period)
+    
+    if hist.empty:
+        return None
+    
+    # Get basic info (the live provider serves it from the fundamentals cache while it is fresh)
+    info = provider.info(ticker)
+    market_cap = info.get('marketCap', 0)
+    current_price = hist['Close'].iloc[-1]
+    
+    # Calculate 250-day return
+    if len(hist) >= 250:
+        start_price = hist['Close'].iloc[-250]
+        end_price = hist['Close'].iloc[-1]
+        return_250d = (end_price - start_price) / start_price * 100
+    else:
+        # Too short a history has no 250-day return; missing values never pass a return screen
+        return_250d = float('nan')
+    
+    return {
+        'Ticker': ticker,
+        'Company Name': info.get('shortName', ticker),
+        'Current Price ($)': current_price,
+        'Market Cap ($B)': market_cap / 1e9 if market_cap else 0,
+        '250-Day Return (%)': return_250d,
+        'Sector': info.get('sector', 'N/A'),
+        'Industry': info.get('industry', 'N/A'),
+    }
+
+def get_stock_data(tickers, period="1y", max_workers=None, bulk_history=True, factors=(), on_progress=None,
+                   on_row=None, provider=None, metrics=None):
     """
     Fetch stock data for the given tickers
+    
+    Returns the data frame and the error messages for tickers that could not be fetched.
+    on_row(row) is called from the calling thread as each ticker's row arrives. metrics (an
+    instrumentation.RunMetrics) collects the pipeline's timings.
     """
-    data = {}
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    errors = []
     
-    for i, ticker in enumerate(tickers):
-        try:
-            # Update progress
-            progress = int((i / len(tickers)) * 100)
-            progress_bar.progress(progress)
-            status_text.text(f"Processing {ticker}... ({i+1}/{len(tickers)})")
-            
-            # Get stock data
-            stock = yf.Ticker(ticker)
-            hist = stock.history(period=period)
-            
-            if not hist.empty:
-                # Get basic info
-                info = stock.info
-                market_cap = info.get('marketCap', 0)
-                current_price = hist['Close'].iloc[-1] if not hist.empty else 0
-                
-                # Calculate 250-day return
-                if len(hist) >= 250:
-                    start_price = hist['Close'].iloc[-250] if len(hist) >= 250 else hist['Close'].iloc[0]
-                    end_price = hist['Close'].iloc[-1]
-                    return_250d = (end_price - start_price) / start_price * 100
-                else:
-                    return_250d = 0
-                
-                data[ticker] = {
-                    'Ticker': ticker,
-                    'Company Name': info.get('shortName', ticker),
-                    'Current Price ($)': current_price,
-                    'Market Cap ($B)': market_cap / 1e9 if market_cap else 0,
-                    '250-Day Return (%)': return_250d,
-                    'Sector': info.get('sector', 'N/A'),
-                    'Industry': info.get('industry', 'N/A'),
-                }
-        except Exception as e:
-            st.sidebar.warning(f"Error fetching data for {ticker}: {str(e)}")
-            st.sidebar.info(f"Skipping {ticker} and continuing...")
+    def on_error(ticker, e):
+        errors.append(f"Error fetching data for {ticker}: {str(e)}")
     
-    # Complete the progress bar
-    progress_bar.progress(100)
-    status_text.text("Processing complete!")
+    def on_history_error(e):
+        errors.append(f"Bulk history download failed, fetching one by one: {str(e)}")
     
-    return pd.DataFrame(list(data.values()))
+    # Delisted tickers and tickers that recently failed or came back empty are not fetched
+    skipped = {}
+    
+    def on_skip(ticker, reason):
+        skipped[ticker] = reason
+    
+    # Histories are loaded from the on-disk cache a chunk at a time (missing bars downloaded in
+    # bulk) and factor columns are computed per chunk as rows stream in
+    rows = []
+    try:
+        for row in stream_rows(
+            tickers,
+            lambda ticker, hist: fetch_ticker(ticker, period, hist, provider),
+            period,
+            max_workers,
+            bulk_history,
+            factors,
+            on_progress=on_progress,
+            on_error=on_error,
+            on_history_error=on_history_error,
+            provider=provider,
+            on_skip=on_skip,
+            metrics=metrics,
+        ):
+            rows.append(row)
+            if on_row is not None:
+                on_row(row)
+    finally:
+        save_fundamentals()
+    errors.extend(f"Skipped {line}" for line in summarize_skips(skipped))
+    
+    with timed(metrics, 'parse'):
+        df = RecordStore.from_rows(in_ticker_order(rows, tickers)).to_frame()
+    return df, errors
 
-def main():
+def load_stock_data(tickers, factors=(), on_progress=None, on_row=None, metrics=None):
+    """
+    Return (df, errors, screen) from the process-wide dataset cache shared by every session
+    
+    screen is an IncrementalScreen over df, so filter changes only re-evaluate moved thresholds.
+    The cached frame is shared between sessions and must not be modified. on_progress and
+    on_row are only called, and metrics only gets the pipeline's timings, when this call does the
+    fetch.
+    """
+    def fetch():
+        df, errors = get_stock_data(tickers, factors=factors, on_progress=on_progress, on_row=on_row,
+                                    metrics=metrics)
+        return df, errors, IncrementalScreen(RecordStore.from_frame(df).universe(DOLLAR_COLUMNS))
+    
+    key = ('stock_screener', get_provider().key, tuple(tickers), tuple(factors))
+    (df, errors, screen), _ = get_dataset_cache().get(key, fetch)
+    if df.empty:
+        # Don't keep serving an empty result from the cache
+        get_dataset_cache().invalidate(key)
+    return df, errors, screen
+
+def screen_expression():
+    """
+    Read the optional screen expression from the sidebar; None when it is empty or invalid
+    """
+    text = st.sidebar.text_input(
+        "Screen expression (replaces the filters above)",
+        placeholder='mcap > 10 and ret_250d > 15 and sector in ("Technology")',
+    )
+    if not text.strip():
+        return None
+    try:
+        return parse(text)
+    except ScreenSyntaxError as e:
+        st.sidebar.error(str(e))
+        return None
+
+def show_screener(metrics):
+    """
+    Draw the sidebar, fetch and screen the selected stocks and show the results, timing each stage
+    """
     st.title("Stock Screener")
     st.write("Filter stocks based on market cap, price, and performance")
     
@@ -89,40 +182,86 @@ def main():
     # 250-day return filter
     positive_return = st.sidebar.checkbox("Only show stocks with positive 250-day return", value=True)
     
+    # A screen expression, e.g. sector in ("Technology") and ret_250d > 15
+    expression = screen_expression()
+    
     # Number of stocks to analyze
     num_stocks = st.sidebar.slider(
         "Number of stocks to analyze",
         min_value=10,
-        max_value=len(TICKERS),
-        value=min(50, len(TICKERS)),
+        max_value=len(get_universe().tickers()),
+        value=min(50, len(get_universe().tickers())),
         step=10
     )
     
     # Fetch data button
     if st.sidebar.button("Fetch Stock Data"):
+        # The largest live stocks of the universe (delisted symbols are never fetched)
+        st.session_state.selected_tickers = get_universe().select(num_stocks)
+    
+    # Once a universe has been fetched, filter changes re-screen the cached data without refetching
+    if 'selected_tickers' in st.session_state:
         try:
             with st.spinner("Fetching stock data..."):
-                # Use only the selected number of stocks
-                selected_tickers = TICKERS[:num_stocks]
-                st.info(f"Analyzing {len(selected_tickers)} stocks. This may take a few minutes...")
+                selected_tickers = st.session_state.selected_tickers
+                progress_bar = st.progress(0)
+                status_text = st.empty()
+                status_text.text(f"Analyzing {len(selected_tickers)} stocks...")
+                
+                live_table = st.empty()
+                live_rows = []
+                last_refresh = [0.0]
+                
+                def on_progress(done, total, ticker):
+                    # Update progress
+                    progress_bar.progress(int((done / total) * 100))
+                    status_text.text(f"Processed {ticker}... ({done}/{total})")
+                
+                def on_row(row):
+                    # Show matching stocks while the rest are still being fetched
+                    if expression is not None:
+                        if not expression.row_passes(row, DOLLAR_COLUMNS):
+                            return
+                    elif not row_passes(row, min_market_cap, min_price, positive_return, DOLLAR_COLUMNS):
+                        return
+                    live_rows.append(row)
+                    if time.monotonic() - last_refresh[0] >= LIVE_REFRESH_INTERVAL:
+                        last_refresh[0] = time.monotonic()
+                        with timed(metrics, 'render'):
+                            live_table.dataframe(
+                                pd.DataFrame(live_rows).sort_values(by='Market Cap ($B)', ascending=False),
+                                hide_index=True,
+                            )
                 
-                df = get_stock_data(selected_tickers)
+                with timed(metrics, 'fetch'):
+                    df, errors, screen = load_stock_data(
+                        selected_tickers,
+                        factors=tuple(expression.factors()) if expression is not None else (),
+                        on_progress=on_progress,
+                        on_row=on_row,
+                        metrics=metrics,
+                    )
+                
+                # Complete the progress bar
+                progress_bar.empty()
+                status_text.empty()
+                live_table.empty()
+                
+                for message in errors:
+                    st.sidebar.warning(message)
                 
                 if df.empty:
                     st.error("No data was retrieved. Please try again.")
                     return
                 
-                # Apply filters
-                filtered_df = df[
-                    (df['Market Cap ($B)'] >= min_market_cap) &
-                    (df['Current Price ($)'] >= min_price)
-                ]
-                
-                if positive_return:
-                    filtered_df = filtered_df[filtered_df['250-Day Return (%)'] > 0]
-                
-                # Sort by market cap
-                filtered_df = filtered_df.sort_values(by='Market Cap ($B)', ascending=False)
+                # Apply filters and sort by market cap; only predicates whose threshold
+                # moved since the last rerun are re-evaluated
+                with timed(metrics, 'filter'):
+                    if expression is not None:
+                        # Planned against the cached columns, most selective predicates first
+                        filtered_df = df.iloc[expression.select(screen.universe.rows, DOLLAR_COLUMNS)]
+                    else:
+                        filtered_df = df.iloc[screen.screen(min_market_cap, min_price, positive_return)]
                 
                 # Store in session state
                 st.session_state.filtered_df = filtered_df
@@ -136,38 +275,83 @@ def main():
     
     # Display results
     if 'filtered_df' in st.session_state:
-        st.header("Filtered Stocks")
-        st.write(f"Found {len(st.session_state.filtered_df)} stocks matching your criteria")
-        
-        st.dataframe(
-            st.session_state.filtered_df,
-            column_config={
-                "Ticker": st.column_config.TextColumn("Ticker"),
-                "Company Name": st.column_config.TextColumn("Company Name"),
-                "Current Price ($)": st.column_config.NumberColumn("Price ($)", format="$.2f"),
-                "Market Cap ($B)": st.column_config.NumberColumn("Market Cap ($B)", format="$.2f"),
-                "250-Day Return (%)": st.column_config.NumberColumn("250-Day Return (%)", format="%.2f%%"),
-                "Sector": st.column_config.TextColumn("Sector"),
-                "Industry": st.column_config.TextColumn("Industry"),
-            },
-            hide_index=True,
-        )
-        
-        # Show statistics
-        st.header("Statistics")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.metric("Average Market Cap ($B)", 
-                     f"${st.session_state.filtered_df['Market Cap ($B)'].mean():.2f}B")
-            st.metric("Average 250-Day Return", 
-                     f"{st.session_state.filtered_df['250-Day Return (%)'].mean():.2f}%")
-        
-        with col2:
-            st.metric("Highest Market Cap", 
-                     f"${st.session_state.filtered_df['Market Cap ($B)'].max():.2f}B")
-            st.metric("Highest 250-Day Return", 
-                     f"{st.session_state.filtered_df['250-Day Return (%)'].max():.2f}%")
+        with timed(metrics, 'render'):
+            show_results(st.session_state.filtered_df)
+
+def show_results(filtered_df):
+    """
+    Show the filtered stocks and their statistics
+    """
+    st.header("Filtered Stocks")
+    st.write(f"Found {len(filtered_df)} stocks matching your criteria")
+    
+    st.dataframe(
+        filtered_df,
+        column_config={
+            "Ticker": st.column_config.TextColumn("Ticker"),
+            "Company Name": st.column_config.TextColumn("Company Name"),
+            "Current Price ($)": st.column_config.NumberColumn("Price ($)", format="$.2f"),
+            "Market Cap ($B)": st.column_config.NumberColumn("Market Cap ($B)", format="$.2f"),
+            "250-Day Return (%)": st.column_config.NumberColumn("250-Day Return (%)", format="%.2f%%"),
+            "Sector": st.column_config.TextColumn("Sector"),
+            "Industry": st.column_config.TextColumn("Industry"),
+        },
+        hide_index=True,
+    )
+    
+    # Show statistics
+    st.header("Statistics")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.metric("Average Market Cap ($B)", 
+                 f"${filtered_df['Market Cap ($B)'].mean():.2f}B")
+        st.metric("Average 250-Day Return", 
+                 f"{filtered_df['250-Day Return (%)'].mean():.2f}%")
+    
+    with col2:
+        st.metric("Highest Market Cap", 
+                 f"${filtered_df['Market Cap ($B)'].max():.2f}B")
+        st.metric("Highest 250-Day Return", 
+                 f"{filtered_df['250-Day Return (%)'].max():.2f}%")
+
+def show_metrics(metrics, profile_path=None):
+    """
+    Show the run's stage timings and latency histograms in a collapsed expander, with how many
+    fetches this process's sessions shared instead of repeating
+    """
+    summary = metrics.summary()
+    stages, histograms = metrics_tables(summary)
+    with st.expander("Performance"):
+        st.caption(f"Total {summary['wall_seconds']:.2f}s")
+        st.write("Stages")
+        st.dataframe(pd.DataFrame(stages), hide_index=True)
+        if histograms:
+            st.write("Latency")
+            st.dataframe(pd.DataFrame(histograms), hide_index=True)
+        shared = single_flight_stats()
+        if shared:
+            st.write("Shared fetches (all sessions)")
+            st.dataframe(pd.DataFrame.from_dict(shared, orient='index'))
+        if profile_path:
+            st.caption(f"Profile written to {profile_path}")
+
+def main():
+    # SCREENER_PREFETCH=1 keeps the caches warm for every session; starts once per process
+    if PREFETCH_ENABLED:
+        get_prefetch_daemon().start()
+    
+    metrics = RunMetrics('stock_screener')
+    profile = {}
+    
+    # SCREENER_PROFILE=cprofile (or pyinstrument) dumps a profile of every rerun
+    with profiled(DEFAULT_PROFILE, 'stock_screener', on_report=lambda path, text: profile.update(path=path)):
+        show_screener(metrics)
+    
+    # Only reruns that screened a universe are recorded
+    if metrics.stages:
+        metrics.finish()
+        show_metrics(metrics, profile.get('path'))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
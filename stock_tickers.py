@@ -1,6 +1,8 @@
 """
 Stock Tickers Module
 Contains a list of common US stock tickers for the stock screener application.
+The mock screener generates data for this static list; the live screeners pick their tickers
+from the symbol files loaded by universe.py, which also mark delisted names such as ATVI.
 """
 
 # List of common US stock tickers
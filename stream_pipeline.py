@@ -0,0 +1,159 @@
+"""
+Stream Pipeline Module
+Generator pipeline from history load to fetch to factors, yielding screen rows as each ticker completes.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from providers import get_provider
+from universe import get_universe
+from negative_cache import EMPTY, get_negative_cache
+from factors import compute_factors, set_factor_columns
+from screening_core import build_close_matrix
+from instrumentation import timed
+from prefetch_daemon import get_screen_demand
+
+# Tickers whose price histories are loaded together; at most two chunks of histories are held at once
+DEFAULT_CHUNK_SIZE = 100
+
+
+def chunked(items, size):
+    """
+    Split a list into consecutive slices of at most `size` items
+    """
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def stream_rows(tickers, fetch_one, period="1y", max_workers=None, bulk_history=True, factors=(),
+                chunk_size=DEFAULT_CHUNK_SIZE, on_progress=None, on_error=None, on_history_error=None, provider=None,
+                on_skip=None, quotes=False, metrics=None):
+    """
+    Yield screen rows in completion order as tickers are fetched
+
+    fetch_one(ticker, hist) builds a ticker's row from its bulk-loaded history (None when the
+    history could not be loaded, so it fetches its own). Histories are loaded one chunk at a
+    time, the next chunk in the background while the current one is fetched, and factor columns
+    are computed per chunk. Memory is bounded by the chunk size and the fetch window rather than
+    by the universe. on_progress(done, total, ticker) counts over the whole universe;
+    on_history_error(exception) is called when a chunk's bulk history load fails. Histories come
+    from provider (default: the process-wide data provider). Tickers the universe lists as no
+    longer trading, and for live providers tickers still cooling off in the negative cache after
+    an empty or failed fetch, are dropped before any network call and reported through
+    on_skip(ticker, reason). With quotes, each chunk's latest prices are requested in one batch
+    right before the chunk is fetched, so they are still fresh when used, and fetch_one is called
+    as fetch_one(ticker, hist, quotes) with that batch's ticker -> price dict (empty when the
+    batch failed). metrics (an instrumentation.RunMetrics) gets the factor computation as its 'compute' stage,
+    'history_chunk' and 'ticker' latency histograms and 'fetched'/'skipped' counts.
+    """
+    provider = provider or get_provider()
+    universe = get_universe()
+    tickers, dead = universe.partition(list(dict.fromkeys(tickers)))
+    skipped = {ticker: universe.get(ticker)['status'] for ticker in dead}
+    # Offline providers are cheap to ask again, and their gaps say nothing about the live data
+    negative = get_negative_cache() if provider.live else None
+    if negative is not None:
+        tickers, cooling = negative.partition(tickers)
+        skipped.update((ticker, negative.describe(entry)) for ticker, entry in cooling.items())
+    if on_skip is not None:
+        for ticker, reason in skipped.items():
+            on_skip(ticker, reason)
+    if metrics is not None:
+        metrics.count('skipped', len(skipped))
+    # The prefetch daemon keeps the most screened tickers warmest
+    demand = get_screen_demand()
+    demand.record(tickers)
+    total = len(tickers)
+    chunks = list(chunked(tickers, chunk_size))
+    # Live providers share throttling, retries and the circuit breaker with every other fetch in the process
+    engine = provider.fetch_engine(max_workers)
+
+    def load(chunk):
+        start = time.perf_counter()
+        histories = provider.histories(chunk, period) if bulk_history else {}
+        if metrics is not None:
+            metrics.observe('history_chunk', time.perf_counter() - start)
+        return histories
+
+    loader = ThreadPoolExecutor(max_workers=1)
+    upcoming = loader.submit(load, chunks[0]) if chunks else None
+    offset = 0
+    try:
+        for i, chunk in enumerate(chunks):
+            try:
+                histories = upcoming.result()
+            except Exception as e:
+                if on_history_error is not None:
+                    on_history_error(e)
+                histories = {}
+            upcoming = loader.submit(load, chunks[i + 1]) if i + 1 < len(chunks) else None
+
+            with timed(metrics, 'compute'):
+                values = compute_factors(build_close_matrix(histories), factors) if factors else None
+
+            # Quotes are only good for a few seconds, so they are not loaded ahead with the histories
+            chunk_quotes = None
+            if quotes:
+                start = time.perf_counter()
+                try:
+                    chunk_quotes = provider.quotes(chunk)
+                except Exception:
+                    # fetch_one then falls back on its own and any error is reported with the ticker
+                    chunk_quotes = {}
+                if metrics is not None:
+                    metrics.observe('quote_batch', time.perf_counter() - start)
+
+            def progress(done, _, ticker, offset=offset):
+                on_progress(offset + done, total, ticker)
+
+            def fetch(ticker, histories=histories, chunk_quotes=chunk_quotes):
+                start = time.perf_counter()
+                if chunk_quotes is not None:
+                    row = fetch_one(ticker, histories.get(ticker), chunk_quotes)
+                else:
+                    row = fetch_one(ticker, histories.get(ticker))
+                if metrics is not None:
+                    metrics.observe('ticker', time.perf_counter() - start)
+                if row is None and negative is not None:
+                    negative.record_failure(ticker, EMPTY)
+                return row
+
+            def error(ticker, e):
+                if negative is not None:
+                    negative.record_error(ticker, e)
+                if on_error is not None:
+                    on_error(ticker, e)
+
+            rows = engine.iter_fetch(
+                chunk,
+                fetch,
+                on_progress=progress if on_progress is not None else None,
+                on_error=error,
+            )
+            for ticker, row in rows:
+                universe.mark_valid(ticker)
+                if negative is not None:
+                    negative.record_success(ticker)
+                if values is not None:
+                    set_factor_columns(row, values, factors)
+                if metrics is not None:
+                    metrics.count('fetched')
+                yield row
+            offset += len(chunk)
+    finally:
+        if upcoming is not None:
+            upcoming.cancel()
+        loader.shutdown(wait=False)
+        universe.save()
+        demand.save()
+        if negative is not None:
+            negative.save()
+
+
+def in_ticker_order(rows, tickers):
+    """
+    Sort streamed rows back into the order of the ticker list
+    """
+    order = {ticker: i for i, ticker in enumerate(tickers)}
+    return sorted(rows, key=lambda row: order.get(row['Ticker'], len(order)))
@@ -2,7 +2,31 @@ import streamlit as st
 import pandas as pd
 import random
 import time
-from stock_tickers import TICKERS
+from universe import get_universe
+from negative_cache import summarize_skips
+from fundamentals_cache import save_fundamentals
+from providers import get_provider
+from factors import FACTORS
+from screening_core import IncrementalScreen, row_passes
+from record_store import RecordStore
+from dataset_cache import get_dataset_cache
+from stream_pipeline import in_ticker_order, stream_rows
+from instrumentation import DEFAULT_PROFILE, RunMetrics, metrics_tables, profiled, timed
+from prefetch_daemon import PREFETCH_ENABLED, get_prefetch_daemon
+from singleflight import single_flight_stats
+from exporters import MIME_TYPES, export_bytes, file_name
+from screen_dsl import ScreenSyntaxError, parse
+
+# Seconds between redraws of the live results table while rows stream in
+LIVE_REFRESH_INTERVAL = 0.5
+
+# Download formats: label -> (format, compression)
+DOWNLOAD_FORMATS = {
+    "CSV": ('csv', None),
+    "CSV (gzip)": ('csv', 'gzip'),
+    "Parquet": ('parquet', None),
+    "Arrow": ('arrow', None),
+}
 
 # Page configuration
 st.set_page_config(
@@ -11,77 +35,153 @@ st.set_page_config(
     layout="wide"
 )
 
-import yfinance as yf
-
-# Get real stock data
-def get_stock_data(tickers):
+# Fetch a single ticker
+def fetch_ticker(ticker, hist=None, provider=None, quotes=None):
     """
-    Fetch real stock data using yfinance
+    Fetch the screen row for a single ticker
+    
+    hist can be passed in when the 1-year history was already loaded in bulk. provider defaults
+    to the process-wide data provider. The current price is the provider's latest quote, normally
+    looked up in quotes, the batch fetched for the ticker's chunk.
     """
-    data = []
+    # Get stock data
+    provider = provider or get_provider()
     
-    for ticker in tickers:
-        try:
-            # Get stock data
-            stock = yf.Ticker(ticker)
-            
-            # Get real-time price data (most recent available)
-            real_time_data = stock.history(period="1d", interval="1m")
-            current_price = real_time_data['Close'].iloc[-1] if not real_time_data.empty else 0
-            
-            # Get historical data for 250-day return calculation
-            hist = stock.history(period="1y")
-            
-            # Calculate 250-day return
-            if len(hist) >= 250:
-                start_price = hist['Close'].iloc[-250] if len(hist) >= 250 else hist['Close'].iloc[0]
-                end_price = hist['Close'].iloc[-1]
-                return_250d = (end_price - start_price) / start_price * 100
-            else:
-                return_250d = 0
-            
-            # Get basic info
-            info = stock.info
-            market_cap = info.get('marketCap', 0)
-            
-            # Create stock data
-            stock_data = {
-                'Ticker': ticker,
-                'Company Name': info.get('shortName', f"{ticker} Inc."),
-                'Current Price': current_price,
-                'Market Cap (B)': market_cap / 1e9 if market_cap else 0,
-                '250-Day Return': return_250d,
-                'Sector': info.get('sector', 'N/A'),
-                'Industry': info.get('industry', 'N/A'),
-            }
-            
-            data.append(stock_data)
-        except Exception as e:
-            st.sidebar.warning(f"Error fetching data for {ticker}: {str(e)}")
+    # Get historical data for 250-day return calculation (through the daily history cache)
+    if hist is None:
+        hist = provider.histories([ticker], "1y")[ticker]
+    
+    # Get real-time price (latest quote, falling back to the last daily close)
+    if quotes is not None and ticker in quotes:
+        current_price = quotes[ticker]
+    else:
+        current_price = provider.quote(ticker)
+    if current_price is None:
+        current_price = hist['Close'].iloc[-1] if not hist.empty else 0
     
-    return pd.DataFrame(data)
+    # Calculate 250-day return
+    if len(hist) >= 250:
+        start_price = hist['Close'].iloc[-250]
+        end_price = hist['Close'].iloc[-1]
+        return_250d = (end_price - start_price) / start_price * 100
+    else:
+        # Too short a history has no 250-day return; missing values never pass a return screen
+        return_250d = float('nan')
+    
+    # Get basic info (the live provider serves it from the fundamentals cache while it is fresh)
+    info = provider.info(ticker)
+    market_cap = info.get('marketCap', 0)
+    
+    # Create stock data
+    return {
+        'Ticker': ticker,
+        'Company Name': info.get('shortName', f"{ticker} Inc."),
+        'Current Price': current_price,
+        'Market Cap (B)': market_cap / 1e9 if market_cap else 0,
+        '250-Day Return': return_250d,
+        'Sector': info.get('sector', 'N/A'),
+        'Industry': info.get('industry', 'N/A'),
+    }
 
-# Filter stocks based on criteria
-def filter_stocks(df, min_market_cap=2.0, min_price=10.0, positive_return=True):
+# Get real stock data
+def get_stock_data(tickers, max_workers=None, bulk_history=True, factors=(), on_progress=None, on_row=None,
+                   provider=None, metrics=None):
     """
-    Filter stocks based on criteria
+    Fetch real stock data from the data provider (default: the process-wide one)
+    
+    Returns the data frame and the error messages for tickers that could not be fetched.
+    on_row(row) is called from the calling thread as each ticker's row arrives. metrics (an
+    instrumentation.RunMetrics) collects the pipeline's timings.
     """
-    # Apply filters
-    filtered_df = df[
-        (df['Market Cap (B)'] >= min_market_cap) &
-        (df['Current Price'] >= min_price)
-    ]
+    errors = []
     
-    if positive_return:
-        filtered_df = filtered_df[filtered_df['250-Day Return'] > 0]
+    def on_error(ticker, e):
+        errors.append(f"Error fetching data for {ticker}: {str(e)}")
     
-    # Sort by market cap (descending)
-    filtered_df = filtered_df.sort_values(by='Market Cap (B)', ascending=False)
+    def on_history_error(e):
+        errors.append(f"Bulk history download failed, fetching one by one: {str(e)}")
     
-    return filtered_df
+    # Delisted tickers and tickers that recently failed or came back empty are not fetched
+    skipped = {}
+    
+    def on_skip(ticker, reason):
+        skipped[ticker] = reason
+    
+    # 1-year histories are loaded from the on-disk cache a chunk at a time (missing bars
+    # downloaded in bulk), each chunk's prices come from one batched quote request just before
+    # it is fetched, and factor columns are computed per chunk as rows stream in
+    data = []
+    try:
+        for row in stream_rows(
+            tickers,
+            lambda ticker, hist, quotes: fetch_ticker(ticker, hist, provider, quotes),
+            "1y",
+            max_workers,
+            bulk_history,
+            factors,
+            on_progress=on_progress,
+            on_error=on_error,
+            on_history_error=on_history_error,
+            provider=provider,
+            on_skip=on_skip,
+            metrics=metrics,
+            quotes=True,
+        ):
+            data.append(row)
+            if on_row is not None:
+                on_row(row)
+    finally:
+        save_fundamentals()
+    errors.extend(f"Skipped {line}" for line in summarize_skips(skipped))
+    
+    # Columnar store viewed as a frame: typed numeric columns, categorical sectors and industries
+    with timed(metrics, 'parse'):
+        df = RecordStore.from_rows(in_ticker_order(data, tickers)).to_frame()
+    return df, errors
+
+# Get stock data through the process-wide dataset cache shared by every session
+def load_stock_data(tickers, factors=(), on_progress=None, on_row=None, metrics=None):
+    """
+    Return (df, errors, screen) for the tickers, fetching only when the cached copy has expired
+    
+    screen is an IncrementalScreen over df, so filter changes only re-evaluate moved thresholds.
+    The cached frame is shared between sessions and must not be modified. on_progress and
+    on_row are only called, and metrics only gets the pipeline's timings, when this call does the
+    fetch.
+    """
+    def fetch():
+        df, errors = get_stock_data(tickers, factors=factors, on_progress=on_progress, on_row=on_row,
+                                    metrics=metrics)
+        return df, errors, IncrementalScreen(RecordStore.from_frame(df).universe())
+    
+    key = ('streamlit_stock_screener', get_provider().key, tuple(tickers), tuple(factors))
+    (df, errors, screen), _ = get_dataset_cache().get(key, fetch)
+    if df.empty:
+        # Don't keep serving an empty result from the cache
+        get_dataset_cache().invalidate(key)
+    return df, errors, screen
+
+def screen_expression():
+    """
+    Read the optional screen expression from the sidebar; None when it is empty or invalid
+    """
+    text = st.sidebar.text_input(
+        "筛选表达式 (填写后替代上方条件)",
+        placeholder='mcap > 10 and ret_250d > 15 and sector in ("Technology")',
+    )
+    if not text.strip():
+        return None
+    try:
+        return parse(text)
+    except ScreenSyntaxError as e:
+        st.sidebar.error(f"筛选表达式有误: {e}")
+        return None
 
 # Main function
-def main():
+def show_screener(metrics):
+    """
+    Draw the sidebar, fetch and screen the selected stocks and show the results, timing each stage
+    """
     # Title and description
     st.title("股票智能筛选器")
     st.markdown("""
@@ -95,7 +195,7 @@ def main():
     num_stocks = st.sidebar.slider(
         "分析股票数量",
         min_value=10,
-        max_value=len(TICKERS),
+        max_value=len(get_universe().tickers()),
         value=50,
         step=10
     )
@@ -121,26 +221,77 @@ def main():
     # 250-day return filter
     positive_return = st.sidebar.checkbox("只显示250天涨幅为正的股票", value=True)
     
+    # Extra factor columns computed from the cached price history
+    factor_names = st.sidebar.multiselect(
+        "附加因子列",
+        options=list(FACTORS),
+        format_func=lambda name: FACTORS[name].label,
+    )
+    
+    # A screen expression, e.g. sector in ("Technology") and ret_250d > 15
+    expression = screen_expression()
+    if expression is not None:
+        # Factors the expression uses are computed along with the chosen columns
+        factor_names = list(dict.fromkeys(list(factor_names) + expression.factors()))
+    
     # Fetch data button
     if st.sidebar.button("筛选股票"):
+        # The largest live stocks of the universe (delisted symbols are never fetched)
+        st.session_state.selected_tickers = get_universe().select(num_stocks)
+    
+    # Once a universe has been fetched, filter changes re-screen the cached data without refetching
+    if 'selected_tickers' in st.session_state:
         with st.spinner("正在获取实时股票数据，请稍候..."):
-            # Use only the selected number of stocks
-            selected_tickers = TICKERS[:num_stocks]
-            
             # Show progress bar
             progress_bar = st.progress(0)
+            live_table = st.empty()
+            live_rows = []
+            last_refresh = [0.0]
+            
+            def on_row(row):
+                # Show matching stocks while the rest are still being fetched
+                if expression is not None:
+                    if not expression.row_passes(row):
+                        return
+                elif not row_passes(row, min_market_cap, min_price, positive_return):
+                    return
+                live_rows.append(row)
+                if time.monotonic() - last_refresh[0] >= LIVE_REFRESH_INTERVAL:
+                    last_refresh[0] = time.monotonic()
+                    with timed(metrics, 'render'):
+                        live_table.dataframe(
+                            pd.DataFrame(live_rows).sort_values(by='Market Cap (B)', ascending=False),
+                            hide_index=True,
+                        )
             
-            # Fetch real stock data
+            # Fetch real stock data (served from the shared cache when warm)
             try:
-                df = get_stock_data(selected_tickers)
+                with timed(metrics, 'fetch'):
+                    df, errors, screen = load_stock_data(
+                        st.session_state.selected_tickers,
+                        factors=tuple(factor_names),
+                        on_progress=lambda done, total, ticker: progress_bar.progress(int(done / total * 100)),
+                        on_row=on_row,
+                        metrics=metrics,
+                    )
                 
                 # Update progress bar to 100%
                 progress_bar.progress(100)
+                live_table.empty()
+                
+                for message in errors:
+                    st.sidebar.warning(message)
                 
                 if df.empty:
                     st.error("无法获取股票数据，请稍后再试。")
                 else:
-                    filtered_df = filter_stocks(df, min_market_cap, min_price, positive_return)
+                    # Only predicates whose threshold moved since the last rerun are re-evaluated
+                    with timed(metrics, 'filter'):
+                        if expression is not None:
+                            # Planned against the cached columns, most selective predicates first
+                            filtered_df = df.iloc[expression.select(screen.universe.rows)]
+                        else:
+                            filtered_df = df.iloc[screen.screen(min_market_cap, min_price, positive_return)]
                     
                     # Store in session state
                     st.session_state.filtered_df = filtered_df
@@ -155,61 +306,125 @@ def main():
     
     # Display results
     if 'filtered_df' in st.session_state:
-        st.header("筛选结果")
-        st.write(f"找到 {len(st.session_state.filtered_df)} 支符合条件的股票")
-        
-        # Display the filtered stocks
-        st.dataframe(
-            st.session_state.filtered_df,
-            column_config={
-                "Ticker": st.column_config.TextColumn("股票代码"),
-                "Company Name": st.column_config.TextColumn("公司名称"),
-                "Current Price": st.column_config.NumberColumn("当前价格 ($)", format="$%.2f"),
-                "Market Cap (B)": st.column_config.NumberColumn("市值 ($B)", format="$%.2f"),
-                "250-Day Return": st.column_config.NumberColumn("250天涨幅 (%)", format="%.2f%%"),
-                "Sector": st.column_config.TextColumn("行业"),
-                "Industry": st.column_config.TextColumn("子行业"),
-            },
-            hide_index=True,
-            use_container_width=True
+        with timed(metrics, 'render'):
+            show_results(st.session_state.filtered_df)
+
+def show_results(filtered_df):
+    """
+    Show the filtered stocks and their statistics
+    """
+    st.header("筛选结果")
+    st.write(f"找到 {len(filtered_df)} 支符合条件的股票")
+    
+    # Display the filtered stocks
+    st.dataframe(
+        filtered_df,
+        column_config={
+            "Ticker": st.column_config.TextColumn("股票代码"),
+            "Company Name": st.column_config.TextColumn("公司名称"),
+            "Current Price": st.column_config.NumberColumn("当前价格 ($)", format="$%.2f"),
+            "Market Cap (B)": st.column_config.NumberColumn("市值 ($B)", format="$%.2f"),
+            "250-Day Return": st.column_config.NumberColumn("250天涨幅 (%)", format="%.2f%%"),
+            "Sector": st.column_config.TextColumn("行业"),
+            "Industry": st.column_config.TextColumn("子行业"),
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+    
+    # Show statistics
+    st.header("统计数据")
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric(
+            "平均市值", 
+            f"${filtered_df['Market Cap (B)'].mean():.2f}B"
         )
-        
-        # Show statistics
-        st.header("统计数据")
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.metric(
-                "平均市值", 
-                f"${st.session_state.filtered_df['Market Cap (B)'].mean():.2f}B"
-            )
-        
-        with col2:
-            st.metric(
-                "平均250天涨幅", 
-                f"{st.session_state.filtered_df['250-Day Return'].mean():.2f}%"
-            )
-        
-        with col3:
-            st.metric(
-                "最高市值", 
-                f"${st.session_state.filtered_df['Market Cap (B)'].max():.2f}B"
-            )
-        
-        with col4:
-            st.metric(
-                "最高250天涨幅", 
-                f"{st.session_state.filtered_df['250-Day Return'].max():.2f}%"
-            )
-        
-        # Download button
-        csv = st.session_state.filtered_df.to_csv(index=False)
-        st.download_button(
-            label="下载CSV文件",
-            data=csv,
-            file_name="stock_screener_results.csv",
-            mime="text/csv",
+    
+    with col2:
+        st.metric(
+            "平均250天涨幅", 
+            f"{filtered_df['250-Day Return'].mean():.2f}%"
+        )
+    
+    with col3:
+        st.metric(
+            "最高市值", 
+            f"${filtered_df['Market Cap (B)'].max():.2f}B"
         )
+    
+    with col4:
+        st.metric(
+            "最高250天涨幅", 
+            f"{filtered_df['250-Day Return'].max():.2f}%"
+        )
+    
+    show_download(filtered_df, st.session_state.get('all_df'))
+
+def show_download(filtered_df, all_df=None):
+    """
+    Download button for the filtered stocks, or every fetched stock, as CSV, Parquet or Arrow
+    """
+    col1, col2 = st.columns(2)
+    with col1:
+        label = st.selectbox("下载格式", list(DOWNLOAD_FORMATS))
+    with col2:
+        scope = st.radio("下载范围", ["筛选结果", "全部股票"], horizontal=True, disabled=all_df is None)
+    format, compression = DOWNLOAD_FORMATS[label]
+    data = all_df if scope == "全部股票" and all_df is not None else filtered_df
+    
+    try:
+        content = export_bytes(data, format, compression)
+    except RuntimeError as e:
+        # Parquet and Arrow need pyarrow
+        st.warning(str(e))
+        return
+    
+    st.download_button(
+        label=f"下载{label}文件",
+        data=content,
+        file_name=file_name("stock_screener_results", format, compression),
+        mime='application/gzip' if compression else MIME_TYPES[format],
+    )
+
+def show_metrics(metrics, profile_path=None):
+    """
+    Show the run's stage timings and latency histograms in a collapsed expander, with how many
+    fetches this process's sessions shared instead of repeating
+    """
+    summary = metrics.summary()
+    stages, histograms = metrics_tables(summary)
+    with st.expander("性能指标"):
+        st.caption(f"总耗时 {summary['wall_seconds']:.2f} 秒")
+        st.write("各阶段耗时")
+        st.dataframe(pd.DataFrame(stages), hide_index=True)
+        if histograms:
+            st.write("延迟分布")
+            st.dataframe(pd.DataFrame(histograms), hide_index=True)
+        shared = single_flight_stats()
+        if shared:
+            st.write("合并的重复请求（所有会话）")
+            st.dataframe(pd.DataFrame.from_dict(shared, orient='index'))
+        if profile_path:
+            st.caption(f"性能分析已保存到 {profile_path}")
+
+def main():
+    # SCREENER_PREFETCH=1 keeps the caches warm for every session; starts once per process
+    if PREFETCH_ENABLED:
+        get_prefetch_daemon().start()
+    
+    metrics = RunMetrics('streamlit_stock_screener')
+    profile = {}
+    
+    # SCREENER_PROFILE=cprofile (or pyinstrument) dumps a profile of every rerun
+    with profiled(DEFAULT_PROFILE, 'streamlit_stock_screener', on_report=lambda path, text: profile.update(path=path)):
+        show_screener(metrics)
+    
+    # Only reruns that screened a universe are recorded
+    if metrics.stages:
+        metrics.finish()
+        show_metrics(metrics, profile.get('path'))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Stub Data Server
+A local stand-in for the Yahoo Finance endpoints used by the screener, serving canned responses.
+Point SCREENER_HISTORY_URL at it to run the screeners without touching the network.
+"""
+
+import argparse
+import http.server
+import json
+import random
+import socketserver
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+
+# Trading days served for each supported range
+RANGE_DAYS = {
+    '1d': 1,
+    '5d': 5,
+    '1mo': 21,
+    '3mo': 63,
+    '6mo': 126,
+    '1y': 252,
+    '2y': 504,
+    '5y': 1260,
+}
+
+
+def trading_timestamps(days, end=None):
+    """
+    Return unix timestamps for the last `days` weekdays at the 16:00 New York close
+    """
+    end = end or datetime.now(timezone.utc)
+    current = datetime(end.year, end.month, end.day, 20, 0, tzinfo=timezone.utc)
+    stamps = []
+
+    while len(stamps) < days:
+        if current.weekday() < 5:
+            stamps.append(int(current.timestamp()))
+        current -= timedelta(days=1)
+
+    return stamps[::-1]
+
+
+def canned_history(symbol, days):
+    """
+    Generate a deterministic close series for a symbol, the same on every call
+    """
+    rng = random.Random(symbol)
+    price = rng.uniform(10, 500)
+    closes = []
+
+    for _ in range(days):
+        price *= 1 + rng.gauss(0.0004, 0.02)
+        closes.append(round(price, 4))
+
+    return {'timestamp': trading_timestamps(days), 'close': closes}
+
+
+def spark_payload(symbols, range_, responses=None):
+    """
+    Build a Yahoo-style spark payload for the requested symbols
+    """
+    days = RANGE_DAYS.get(range_, RANGE_DAYS['1y'])
+    results = []
+
+    for symbol in symbols:
+        if responses is not None:
+            history = responses.get(symbol)
+        else:
+            history = canned_history(symbol, days)
+
+        if not history:
+            results.append({'symbol': symbol, 'response': []})
+            continue
+
+        results.append({
+            'symbol': symbol,
+            'response': [{
+                'meta': {'symbol': symbol, 'range': range_},
+                'timestamp': history['timestamp'][-days:],
+                'indicators': {'quote': [{'close': history['close'][-days:]}]},
+            }],
+        })
+
+    return {'spark': {'result': results, 'error': None}}
+
+
+class StubDataHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        params = urllib.parse.parse_qs(parsed.query)
+        fault = self.server.next_fault()
+
+        # Injected latency, to stand in for a slow provider
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if fault is not None:
+            self.send_fault(fault)
+            return
+
+        if parsed.path == '/v7/finance/spark':
+            symbols = [s for s in params.get('symbols', [''])[0].split(',') if s]
+            range_ = params.get('range', ['1y'])[0]
+            self.send_json(200, spark_payload(symbols, range_, self.server.responses))
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def send_fault(self, status):
+        body = json.dumps({'error': {'code': status}}).encode()
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 429 and self.server.retry_after is not None:
+            self.send_header('Retry-After', str(self.server.retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep test and benchmark output quiet
+        pass
+
+
+class StubDataServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Room for a wide fetch pool to connect at once without SYN retries
+    request_queue_size = 128
+
+    def __init__(self, address, responses=None, latency=0.0, throttle_rate=0.0, error_rate=0.0, outage=0,
+                 retry_after=None, seed=None):
+        super().__init__(address, StubDataHandler)
+        self.responses = responses
+        self.latency = latency
+        # Fault injection: the first `outage` requests get 503, then each request is throttled
+        # (429) or fails (500) with the given probabilities
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.outage = outage
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.request_count = 0
+        self.fault_counts = {429: 0, 500: 0, 503: 0}
+        self.lock = threading.Lock()
+
+    def next_fault(self):
+        """
+        Count a request and return the error status to answer it with, or None to serve it
+        """
+        with self.lock:
+            self.request_count += 1
+            if self.request_count <= self.outage:
+                fault = 503
+            else:
+                draw = self.rng.random()
+                if draw < self.throttle_rate:
+                    fault = 429
+                elif draw < self.throttle_rate + self.error_rate:
+                    fault = 500
+                else:
+                    return None
+            self.fault_counts[fault] += 1
+            return fault
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stub_server(port=0, responses=None, latency=0.0, **faults):
+    """
+    Start a stub server on a background thread and return it; call shutdown() when done
+
+    latency is the number of seconds every response is delayed by. faults are passed on to
+    StubDataServer (throttle_rate, error_rate, outage, retry_after, seed).
+    """
+    server = StubDataServer(("127.0.0.1", port), responses, latency, **faults)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve canned Yahoo Finance responses locally")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--responses", help="JSON file mapping symbol to {timestamp, close}")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to delay every response")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--outage", type=int, default=0, help="answer the first N requests with 503")
+    parser.add_argument("--retry-after", type=float, help="Retry-After seconds sent with 429 responses")
+    parser.add_argument("--seed", type=int, help="seed for repeatable fault injection")
+    args = parser.parse_args()
+
+    responses = None
+    if args.responses:
+        with open(args.responses) as f:
+            responses = json.load(f)
+
+    server = start_stub_server(
+        args.port,
+        responses,
+        args.latency,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        outage=args.outage,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    print(f"Stub data server running at {server.base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("Server stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+History Loader Tests
+Loads histories in bulk from the stub server's spark endpoint: parsed bars, chunking and missing tickers.
+"""
+
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+import history_loader
+from history_loader import SPARK_CHUNK_SIZE, load_histories, parse_spark_response
+from stub_server import canned_history, start_stub_server
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kwargs):
+        server = start_stub_server(**kwargs)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_spark_bars_are_parsed_into_daily_closes(stub, monkeypatch):
+    server = stub()
+    # The screeners find the stub server through SCREENER_HISTORY_URL
+    monkeypatch.setattr(history_loader, 'HISTORY_BASE_URL', server.base_url)
+
+    histories = load_histories(['AAPL', 'MSFT'], period="1mo")
+
+    assert list(histories) == ['AAPL', 'MSFT']
+    for ticker, hist in histories.items():
+        canned = canned_history(ticker, 21)
+        assert list(hist.columns) == ['Close']
+        assert hist['Close'].tolist() == canned['close']
+        # One bar per trading day, stamped with the New York session date
+        expected = pd.to_datetime(canned['timestamp'], unit='s', utc=True).tz_convert('America/New_York').normalize()
+        assert hist.index.equals(expected)
+        assert hist.index.is_monotonic_increasing
+
+
+def test_tickers_are_requested_in_chunks(stub):
+    server = stub()
+    tickers = [f"T{i:03d}" for i in range(2 * SPARK_CHUNK_SIZE + 5)]
+
+    histories = load_histories(tickers, period="5d", base_url=server.base_url)
+
+    assert server.request_count == 3
+    assert list(histories) == tickers
+    assert all(len(hist) == 5 for hist in histories.values())
+
+
+def test_missing_tickers_get_empty_frames(stub):
+    responses = {'AAPL': canned_history('AAPL', 252), 'GONE': None}
+    server = stub(responses=responses)
+
+    histories = load_histories(['AAPL', 'GONE', 'NOPE'], period="1y", base_url=server.base_url)
+
+    assert len(histories['AAPL']) == 252
+    for ticker in ('GONE', 'NOPE'):
+        assert histories[ticker].empty
+        assert list(histories[ticker].columns) == ['Close']
+
+
+def test_symbols_left_out_of_the_payload_get_empty_frames():
+    payload = {'spark': {'result': [
+        {'symbol': 'AAPL', 'response': [{'timestamp': [1700000000, 1700086400],
+                                         'indicators': {'quote': [{'close': [1.0, None]}]}}]},
+        {'symbol': 'OTHER', 'response': [{'timestamp': [1700000000], 'indicators': {'quote': [{'close': [2.0]}]}}]},
+    ]}}
+
+    histories = parse_spark_response(payload, ['AAPL', 'MSFT'])
+
+    assert list(histories) == ['AAPL', 'MSFT']
+    # Bars without a close are dropped; symbols that weren't asked for are ignored
+    assert histories['AAPL']['Close'].tolist() == [1.0]
+    assert histories['MSFT'].empty
+    assert parse_spark_response({'spark': None}, ['AAPL'])['AAPL'].empty
+
+
+def test_start_keeps_only_the_tail(stub):
+    server = stub()
+    start = date.today() - timedelta(days=10)
+
+    histories = load_histories(['AAPL'], base_url=server.base_url, start=start)
+
+    hist = histories['AAPL']
+    assert not hist.empty
+    assert (hist.index.date >= start).all()
+    # The smallest spark range reaching back to start is requested, not the whole period
+    assert len(hist) < 21
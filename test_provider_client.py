@@ -0,0 +1,171 @@
+"""
+Provider Client Tests
+Runs ProviderClient against the fault-injecting stub server: throttling, retried server errors and the circuit breaker.
+"""
+
+import time
+
+import pytest
+import requests
+
+from fetch_engine import FetchEngine
+from provider_client import CircuitBreaker, CircuitOpenError, ProviderClient, RetryPolicy
+from stub_server import start_stub_server
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**faults):
+        server = start_stub_server(**faults)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+class RecordingRetry(RetryPolicy):
+    """
+    Records each backoff delay instead of sleeping through it
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delays = []
+
+    def delay(self, attempt, retry_after=None):
+        self.delays.append(super().delay(attempt, retry_after))
+        return 0.0
+
+
+def spark_url(server):
+    return server.base_url + "/v7/finance/spark?symbols=AAPL&range=5d"
+
+
+def test_throttling_backs_off_the_limiter(stub):
+    server = stub(throttle_rate=1.0, retry_after=0.5)
+    retry = RecordingRetry(max_attempts=3, base_delay=0.01)
+    client = ProviderClient(rate_limit=10, retry=retry)
+
+    with pytest.raises(requests.HTTPError) as error:
+        client.get(spark_url(server))
+    assert error.value.response.status_code == 429
+    assert server.fault_counts[429] == 3
+    assert client.stats['throttled'] == 3
+
+    # The 429s come back-to-back, so they count as one signal and halve the rate once
+    assert client.limiter.rate == pytest.approx(client.limiter.max_rate / 2)
+    # Retries wait at least as long as the provider's Retry-After
+    assert retry.delays == [0.5, 0.5]
+
+    # Once the provider recovers, successes raise the rate back towards the limit
+    server.throttle_rate = 0.0
+    rate = client.limiter.rate
+    assert client.get(spark_url(server)).json()['spark']['result']
+    assert client.limiter.rate > rate
+
+
+def test_server_errors_are_retried_with_backoff(stub):
+    server = stub(outage=2)
+    retry = RecordingRetry(max_attempts=4, base_delay=0.2)
+    client = ProviderClient(rate_limit=0, retry=retry)
+
+    response = client.get(spark_url(server))
+
+    assert response.status_code == 200
+    assert server.request_count == 3
+    assert client.stats['transient_errors'] == 2
+    assert client.stats['retries'] == 2
+    assert client.stats['failures'] == 0
+    # Full jitter: retry n waits up to base_delay * 2**n
+    assert len(retry.delays) == 2
+    assert 0 <= retry.delays[0] <= 0.2 and 0 <= retry.delays[1] <= 0.4
+
+
+def test_breaker_opens_and_recovers_through_a_half_open_probe(stub):
+    server = stub(outage=3)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1, max_wait=0.02)
+    client = ProviderClient(rate_limit=0, retry=RetryPolicy(max_attempts=1), breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            client.get(spark_url(server))
+    assert breaker.state == 'open'
+
+    # While open, calls give up without reaching the provider
+    with pytest.raises(CircuitOpenError):
+        client.get(spark_url(server))
+    assert server.request_count == 2
+
+    # After the reset timeout one probe goes out; it fails, so the circuit opens again
+    time.sleep(0.12)
+    with pytest.raises(requests.HTTPError):
+        client.get(spark_url(server))
+    assert breaker.state == 'open'
+    assert breaker.times_opened == 2
+
+    # The next probe succeeds and closes the circuit
+    time.sleep(0.12)
+    assert client.get(spark_url(server)).status_code == 200
+    assert breaker.state == 'closed'
+    assert server.request_count == 4
+
+
+def test_nested_calls_share_the_half_open_probe(stub):
+    server = stub(outage=1)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05, max_wait=0.02)
+    client = ProviderClient(rate_limit=0, retry=RetryPolicy(max_attempts=1), breaker=breaker)
+
+    with pytest.raises(requests.HTTPError):
+        client.get(spark_url(server))
+    time.sleep(0.06)
+
+    # A provider method fetching through the client inside a fetch job's call
+    response = client.call(lambda: client.get(spark_url(server)))
+
+    assert response.status_code == 200
+    assert breaker.state == 'closed'
+    assert client.stats['calls'] == 2
+
+
+def test_circuit_open_elsewhere_does_not_close_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01, max_wait=0.02)
+    client = ProviderClient(rate_limit=0, retry=RetryPolicy(max_attempts=1), breaker=breaker)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    def blocked():
+        raise CircuitOpenError("provider circuit is open")
+
+    with pytest.raises(CircuitOpenError):
+        client.call(blocked)
+    # The probe is handed back rather than counted as a success
+    assert breaker.state == 'half_open'
+    assert not breaker.probing
+    assert client.call(lambda: 'ok') == 'ok'
+    assert breaker.state == 'closed'
+
+
+def test_fetch_engine_leaves_each_request_to_the_client(stub):
+    server = stub(outage=1)
+    retry = RecordingRetry(max_attempts=3, base_delay=0.01)
+    client = ProviderClient(rate_limit=0, retry=retry)
+    engine = FetchEngine(max_workers=1, client=client)
+
+    def fetch_one(ticker):
+        # Like a row fetch: a history request, then an info request
+        history = client.get(spark_url(server)).json()
+        info = client.get(spark_url(server)).json()
+        return {'Ticker': ticker, 'history': bool(history), 'info': bool(info)}
+
+    rows = engine.fetch(['AAPL', 'MSFT'], fetch_one)
+
+    assert [row['Ticker'] for row in rows] == ['AAPL', 'MSFT']
+    # One limiter token per request, and the failed request is the only one repeated
+    assert client.stats['calls'] == 4
+    assert client.stats['retries'] == 1
+    assert server.request_count == 5
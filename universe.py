@@ -0,0 +1,225 @@
+"""
+Universe Module
+Loads the ticker universe from CSV/JSON symbol files and keeps an index of each symbol's sector, exchange, listing
+status and last-seen-valid date, so known-dead symbols are dropped before any network call.
+"""
+
+import atexit
+import csv
+import json
+import os
+import threading
+from datetime import date
+
+from history_cache import CACHE_DIR
+from json_store import load_json, save_json
+from fundamentals_cache import get_fundamentals_cache
+
+# Symbol files to load, separated by os.pathsep; later files override earlier ones per ticker
+BUNDLED_UNIVERSE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "universe.csv")
+DEFAULT_UNIVERSE_FILES = os.environ.get("SCREENER_UNIVERSE", BUNDLED_UNIVERSE).split(os.pathsep)
+
+# Metadata fields kept per symbol
+FIELDS = ['ticker', 'name', 'sector', 'exchange', 'status', 'last_valid', 'successor']
+
+# Listing statuses that mean the symbol no longer trades
+DEAD_STATUSES = {'delisted', 'renamed', 'acquired'}
+
+
+def read_symbol_file(path):
+    """
+    Read symbol records from a CSV file with a header row, or a JSON list of objects
+
+    Only the ticker is required; blank fields are left out.
+    """
+    with open(path, newline='') as f:
+        if path.lower().endswith('.json'):
+            records = json.load(f)
+            if isinstance(records, dict):
+                records = records.get('symbols', [])
+        else:
+            records = list(csv.DictReader(f))
+
+    symbols = []
+    for record in records:
+        ticker = (record.get('ticker') or record.get('symbol') or '').strip().upper()
+        if not ticker:
+            continue
+        symbol = {field: str(record[field]).strip() for field in FIELDS[1:] if record.get(field)}
+        symbol['ticker'] = ticker
+        symbols.append(symbol)
+    return symbols
+
+
+class Universe:
+    """
+    Ordered index of symbol metadata, with last-seen-valid dates observed while fetching
+
+    Symbols keep the order of the files they came from. Observations are stored in a JSON file
+    next to the other caches and merged over the file metadata when a symbol is looked up.
+    """
+
+    def __init__(self, files=None, path=None):
+        self.files = list(files or DEFAULT_UNIVERSE_FILES)
+        self.path = path or os.path.join(CACHE_DIR, "universe.json")
+        self.symbols = {}
+        # ticker -> last date it returned data, for every ticker ever fetched, in or out of this universe
+        self.observed = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+
+        for file in self.files:
+            for symbol in read_symbol_file(file):
+                self.symbols.setdefault(symbol['ticker'], {}).update(symbol)
+        self.load()
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, ticker):
+        return ticker in self.symbols
+
+    def load(self):
+        """
+        Merge last-seen-valid dates from the observations file, keeping the later date
+
+        Observations only annotate symbols; they never add tickers to the universe.
+        """
+        stored = load_json(self.path)
+        if stored is None:
+            return
+
+        with self.lock:
+            for ticker, last_valid in stored.items():
+                if last_valid > self.observed.get(ticker, ''):
+                    self.observed[ticker] = last_valid
+
+    def save(self):
+        """
+        Write the observations file atomically
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            snapshot = dict(self.observed)
+            self.dirty = False
+
+        save_json(self.path, snapshot)
+
+    def get(self, ticker):
+        """
+        Metadata for a ticker, or None if it is not in the universe
+        """
+        symbol = self.symbols.get(ticker)
+        if symbol is None:
+            return None
+        symbol = dict(symbol)
+        last_valid = max(symbol.get('last_valid', ''), self.observed.get(ticker, ''))
+        if last_valid:
+            symbol['last_valid'] = last_valid
+        return symbol
+
+    def is_dead(self, ticker):
+        """
+        True when the symbol files list the ticker as no longer trading
+        """
+        symbol = self.symbols.get(ticker)
+        return symbol is not None and symbol.get('status', 'active').lower() in DEAD_STATUSES
+
+    def partition(self, tickers):
+        """
+        Split tickers into (live, dead), keeping their order; tickers not in the index count as live
+        """
+        live, dead = [], []
+        for ticker in tickers:
+            (dead if self.is_dead(ticker) else live).append(ticker)
+        return live, dead
+
+    def mark_valid(self, ticker, day=None):
+        """
+        Record that a ticker returned data, on `day` (default today)
+        """
+        day = (day or date.today()).isoformat()
+        with self.lock:
+            if self.observed.get(ticker) != day:
+                self.observed[ticker] = day
+                self.dirty = True
+
+    def tickers(self, sectors=None, exchanges=None):
+        """
+        Live tickers in file order, optionally limited to some sectors or exchanges
+        """
+        return [
+            ticker for ticker, symbol in self.symbols.items()
+            if not self.is_dead(ticker)
+            and (not sectors or symbol.get('sector') in sectors)
+            and (not exchanges or symbol.get('exchange') in exchanges)
+        ]
+
+    def select(self, count=None, sectors=None, exchanges=None):
+        """
+        The `count` largest live tickers by last known market cap
+
+        Market caps come from the fundamentals cache, however old, without any network call;
+        tickers never fetched follow in file order.
+        """
+        tickers = self.tickers(sectors, exchanges)
+        fundamentals = get_fundamentals_cache()
+        caps = {ticker: fundamentals.peek(ticker, 'marketCap') for ticker in tickers}
+        ranked = sorted(
+            range(len(tickers)),
+            key=lambda i: (caps[tickers[i]] is None, -(caps[tickers[i]] or 0), i),
+        )
+        return [tickers[i] for i in ranked[:count]]
+
+    def sectors(self):
+        """
+        Sectors of the live tickers, in first-seen order
+        """
+        return list(dict.fromkeys(
+            self.symbols[ticker]['sector'] for ticker in self.tickers() if self.symbols[ticker].get('sector')
+        ))
+
+
+_default_universe = None
+_default_universe_lock = threading.Lock()
+
+
+def get_universe():
+    """
+    Return the process-wide universe, loading the symbol files on first use
+    """
+    global _default_universe
+    with _default_universe_lock:
+        if _default_universe is None:
+            _default_universe = Universe()
+            atexit.register(_default_universe.save)
+        return _default_universe
+
+
+def set_universe_files(files):
+    """
+    Switch the process to a universe loaded from other symbol files
+    """
+    global _default_universe
+    with _default_universe_lock:
+        if _default_universe is not None:
+            _default_universe.save()
+        _default_universe = Universe(files)
+        atexit.register(_default_universe.save)
+        return _default_universe
+
+
+def add_universe_arguments(parser):
+    """
+    Add --universe to a front end's argument parser
+    """
+    parser.add_argument("--universe", nargs='+', metavar="FILE",
+                        help="CSV/JSON symbol files to screen (default: SCREENER_UNIVERSE or the bundled universe.csv)")
+
+
+def universe_from_args(args):
+    """
+    Load the universe selected by add_universe_arguments options
+    """
+    return set_universe_files(args.universe) if args.universe else get_universe()
@@ -4,14 +4,43 @@ Web-based Stock Screener
 This script creates a simple web interface for the stock screener using Python's built-in http.server.
 """
 
+import argparse
+import gzip
 import http.server
-import socketserver
+import selectors
+import socket
+import threading
+import time
 import webbrowser
 import json
-import random
-import time
 import urllib.parse
-from stock_tickers import TICKERS
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from universe import add_universe_arguments, get_universe, universe_from_args
+from screening_core import IncrementalScreen, filter_rows, stream_filter
+from screen_dsl import parse
+from record_store import RecordStore
+from dataset_cache import get_dataset_cache
+from simple_stock_screener import fetch_ticker, get_stock_data
+from providers import add_provider_arguments, get_provider, provider_from_args
+from stream_pipeline import stream_rows
+from instrumentation import RunMetrics, get_metrics_registry, timed
+from provider_client import get_provider_client
+from quotes import get_quote_cache
+from prefetch_daemon import PREFETCH_ENABLED, get_prefetch_daemon
+from singleflight import single_flight_stats
+from response_cache import etag_matches, get_response_cache
+
+# Threads serving requests
+DEFAULT_WORKERS = 32
+
+# Responses smaller than this are sent uncompressed
+GZIP_MIN_SIZE = 1024
+
+# Rows per chunk when an NDJSON response is streamed from an already fetched dataset
+NDJSON_BATCH_SIZE = 100
 
 # HTML template for the main page
 HTML_TEMPLATE = """
@@ -156,6 +185,11 @@ HTML_TEMPLATE = """
                 <label for="positiveReturn" style="display: inline;">只显示250天涨幅为正的股票</label>
             </div>
             
+            <div class="form-group">
+                <label for="screen">筛选表达式 (可选，填写后替代上方条件):</label>
+                <input type="text" id="screen" name="screen" placeholder='mcap > 10 and ret_250d > 15 and sector in ("Technology")'>
+            </div>
+            
             <button type="submit">筛选股票</button>
         </form>
         
@@ -203,9 +237,13 @@ HTML_TEMPLATE = """
             const minMarketCap = document.getElementById('minMarketCap').value;
             const minPrice = document.getElementById('minPrice').value;
             const positiveReturn = document.getElementById('positiveReturn').checked;
+            const screen = document.getElementById('screen').value.trim();
             
             // Build query string
-            const queryString = `?numStocks=${numStocks}&minMarketCap=${minMarketCap}&minPrice=${minPrice}&positiveReturn=${positiveReturn}`;
+            let queryString = `?numStocks=${numStocks}&minMarketCap=${minMarketCap}&minPrice=${minPrice}&positiveReturn=${positiveReturn}`;
+            if (screen) {
+                queryString += `&screen=${encodeURIComponent(screen)}`;
+            }
             
             // Fetch data from our API endpoint
             fetch('/api/screen' + queryString)
@@ -214,6 +252,12 @@ HTML_TEMPLATE = """
                     // Hide loading indicator
                     document.getElementById('loading').style.display = 'none';
                     
+                    // A rejected screen expression comes back as {"error": ...}
+                    if (data.error) {
+                        alert('筛选条件有误: ' + data.error);
+                        return;
+                    }
+                    
                     // Show results
                     document.getElementById('results').style.display = 'block';
                     
@@ -234,7 +278,7 @@ HTML_TEMPLATE = """
                             <td>${stock['Company Name']}</td>
                             <td>$${stock['Current Price'].toFixed(2)}</td>
                             <td>$${stock['Market Cap (B)'].toFixed(2)}B</td>
-                            <td>${stock['250-Day Return'].toFixed(2)}%</td>
+                            <td>${stock['250-Day Return'] === null ? 'N/A' : stock['250-Day Return'].toFixed(2) + '%'}</td>
                             <td>${stock.Sector}</td>
                         `;
                         
@@ -248,9 +292,9 @@ HTML_TEMPLATE = """
                     if (data.stats) {
                         const stats = [
                             { name: '平均市值', value: `$${data.stats.avg_market_cap.toFixed(2)}B` },
-                            { name: '平均250天涨幅', value: `${data.stats.avg_return.toFixed(2)}%` },
+                            { name: '平均250天涨幅', value: data.stats.avg_return === null ? 'N/A' : `${data.stats.avg_return.toFixed(2)}%` },
                             { name: '最高市值', value: `$${data.stats.max_market_cap.toFixed(2)}B` },
-                            { name: '最高250天涨幅', value: `${data.stats.max_return.toFixed(2)}%` }
+                            { name: '最高250天涨幅', value: data.stats.max_return === null ? 'N/A' : `${data.stats.max_return.toFixed(2)}%` }
                         ];
                         
                         stats.forEach(stat => {
@@ -275,54 +319,12 @@ HTML_TEMPLATE = """
 </html>
 """
 
-# Generate mock stock data
-def generate_mock_stock_data(tickers):
-    """
-    Generate mock stock data for demonstration purposes
-    """
-    sectors = ["Technology", "Healthcare", "Finance", "Consumer Goods", "Energy", "Utilities", "Real Estate"]
-    industries = ["Software", "Hardware", "Pharmaceuticals", "Banking", "Retail", "Oil & Gas", "Electric"]
-    
-    data = []
-    
-    for ticker in tickers:
-        # Generate random but realistic data
-        market_cap = random.uniform(0.5, 500)  # $0.5B to $500B
-        current_price = random.uniform(5, 500)  # $5 to $500
-        return_250d = random.uniform(-30, 70)  # -30% to +70%
-        
-        # Create mock stock data
-        stock_data = {
-            'Ticker': ticker,
-            'Company Name': f"{ticker} Inc.",
-            'Current Price': current_price,
-            'Market Cap (B)': market_cap,
-            '250-Day Return': return_250d,
-            'Sector': random.choice(sectors),
-            'Industry': random.choice(industries),
-        }
-        
-        data.append(stock_data)
-    
-    return data
-
 # Filter stocks based on criteria
 def filter_stocks(stocks, min_market_cap=2.0, min_price=10.0, positive_return=True):
     """
-    Filter stocks based on criteria
+    Filter stocks based on criteria, sorted by market cap (descending)
     """
-    filtered = []
-    
-    for stock in stocks:
-        if (stock['Market Cap (B)'] >= min_market_cap and 
-            stock['Current Price'] >= min_price and
-            (not positive_return or stock['250-Day Return'] > 0)):
-            filtered.append(stock)
-    
-    # Sort by market cap (descending)
-    filtered.sort(key=lambda x: x['Market Cap (B)'], reverse=True)
-    
-    return filtered
+    return filter_rows(stocks, min_market_cap, min_price, positive_return)
 
 # Calculate statistics
 def calculate_statistics(stocks):
@@ -333,9 +335,11 @@ def calculate_statistics(stocks):
         return None
         
     avg_market_cap = sum(stock['Market Cap (B)'] for stock in stocks) / len(stocks)
-    avg_return = sum(stock['250-Day Return'] for stock in stocks) / len(stocks)
+    # Stocks with too short a history have no return and are left out of its statistics
+    returns = [stock['250-Day Return'] for stock in stocks if stock['250-Day Return'] == stock['250-Day Return']]
+    avg_return = sum(returns) / len(returns) if returns else None
     max_market_cap = max(stock['Market Cap (B)'] for stock in stocks)
-    max_return = max(stock['250-Day Return'] for stock in stocks)
+    max_return = max(returns, default=None)
     
     return {
         'avg_market_cap': avg_market_cap,
@@ -344,76 +348,492 @@ def calculate_statistics(stocks):
         'max_return': max_return
     }
 
+def json_row(stock):
+    """
+    Copy of a stock row with missing (NaN) values as None, which JSON writes as null
+    """
+    return {key: None if isinstance(value, float) and value != value else value for key, value in stock.items()}
+
+# Load the screen dataset shared by every request
+def load_dataset(provider=None, cached_only=False, metrics=None):
+    """
+    Return (stocks, screen, ranks, version) for the whole ticker universe
+    
+    The dataset is fetched from provider (default: the process-wide data provider) once and
+    served from the process-wide cache until it expires. stocks is a columnar RecordStore; ranks
+    holds each row's rank in the universe (largest first) so numStocks can screen the largest stocks, and
+    version changes whenever the dataset is refetched. With cached_only, None is returned
+    instead of fetching when there is no fresh copy. metrics gets the pipeline's timings when this
+    call does the fetch.
+    """
+    provider = provider or get_provider()
+    key = ('web_stock_screener', provider.key)
+    if cached_only:
+        entry = get_dataset_cache().peek(key)
+        if entry is None:
+            return None
+        (stocks, screen, ranks), version = entry
+        return stocks, screen, ranks, version
+    
+    def fetch():
+        rows = get_stock_data(get_universe().tickers(), provider=provider, metrics=metrics)
+        if not rows:
+            # Every ticker failed; raised rather than cached so the next request tries again
+            raise RuntimeError("No stock data could be fetched from the provider")
+        with timed(metrics, 'parse'):
+            stocks = RecordStore.from_rows(rows)
+        # Ranked after the fetch, so the market caps just fetched decide the order
+        positions = {ticker: i for i, ticker in enumerate(get_universe().select())}
+        ranks = np.array([positions.get(ticker, len(positions)) for ticker in stocks.column('Ticker')], dtype='int64')
+        return stocks, IncrementalScreen(stocks.universe()), ranks
+    
+    (stocks, screen, ranks), version = get_dataset_cache().get(key, fetch)
+    return stocks, screen, ranks, version
+
+# Screen the shared dataset
+def screen_dataset(stocks, screen, ranks, num_stocks, min_market_cap, min_price, positive_return, expression=None):
+    """
+    Indices of the matching stocks among the numStocks largest of the universe, by market cap
+    
+    An expression is planned against the dataset's columns; otherwise the incremental screen
+    re-evaluates only the thresholds that moved.
+    """
+    if expression is not None:
+        selected = expression.select(stocks)
+    else:
+        selected = screen.screen(min_market_cap, min_price, positive_return)
+    return selected[ranks[selected] < num_stocks]
+
+# Stream screen results without waiting for the whole universe
+def stream_screen(num_stocks, min_market_cap, min_price, positive_return, provider=None, metrics=None,
+                  expression=None):
+    """
+    Return an iterator of NDJSON line batches: one {"stock": row} line per match, then a {"stats": ...} line
+    
+    A fresh shared dataset is screened at once and sent in batches; offline providers are quick
+    enough to build it on the spot. Otherwise the numStocks largest tickers are fetched through the
+    streaming pipeline and each match is sent as soon as its ticker completes, holding only the
+    matches rather than the whole universe. metrics gets the dataset load and screen as stages
+    and, while streaming a fetch, the pipeline's timings. An expression (a screen_dsl.Screen)
+    replaces the three thresholds.
+    """
+    provider = provider or get_provider()
+    # Loaded before the first batch is asked for, so a failed load can still get an error status
+    with timed(metrics, 'fetch'):
+        dataset = load_dataset(provider, cached_only=True) or (None if provider.live else load_dataset(provider, metrics=metrics))
+    return _screen_batches(dataset, num_stocks, min_market_cap, min_price, positive_return, provider, metrics,
+                           expression)
+
+def _screen_batches(dataset, num_stocks, min_market_cap, min_price, positive_return, provider, metrics, expression):
+    """
+    Yield stream_screen's batches from a loaded dataset, or from the streaming pipeline when there is none
+    """
+    matches = []
+    if dataset is not None:
+        stocks, screen, ranks, _ = dataset
+        with timed(metrics, 'filter'):
+            selected = screen_dataset(stocks, screen, ranks, num_stocks, min_market_cap, min_price, positive_return,
+                                      expression)
+        for start in range(0, len(selected), NDJSON_BATCH_SIZE):
+            batch = stocks.take(selected[start:start + NDJSON_BATCH_SIZE])
+            matches.extend(batch)
+            yield [json.dumps({'stock': json_row(stock)}) for stock in batch]
+    else:
+        rows = stream_rows(get_universe().select(num_stocks), lambda ticker, hist: fetch_ticker(ticker, "1y", hist, provider),
+                           provider=provider, metrics=metrics)
+        if expression is not None:
+            rows = expression.stream_filter(rows)
+        else:
+            rows = stream_filter(rows, min_market_cap, min_price, positive_return)
+        for stock in rows:
+            matches.append(stock)
+            yield [json.dumps({'stock': json_row(stock)})]
+    
+    yield [json.dumps({'stats': calculate_statistics(matches)})]
+
+# Gather the server's timing metrics
+def metrics_snapshot():
+    """
+    Stage times and latency histograms of recent screens, plus provider, quote cache, prefetch,
+    single-flight and response cache counters
+    """
+    snapshot = get_metrics_registry().snapshot()
+    snapshot['provider'] = dict(get_provider_client().stats)
+    quotes = get_quote_cache()
+    snapshot['quotes'] = {'hits': quotes.hits, 'misses': quotes.misses}
+    snapshot['prefetch'] = get_prefetch_daemon().status()
+    # Per kind of data: keys requested, fetched, and served from a concurrent caller's fetch
+    snapshot['singleflight'] = single_flight_stats()
+    snapshot['responses'] = get_response_cache().stats()
+    return snapshot
+
+# Parse the /api/screen query string
+def parse_screen_params(query):
+    """
+    Read numStocks, minMarketCap, minPrice, positiveReturn and screen with their defaults
+    
+    screen is an optional expression such as `mcap > 10 and sector in ("Technology")`, parsed
+    into a screen_dsl.Screen; it replaces the three thresholds.
+    """
+    params = urllib.parse.parse_qs(query)
+    num_stocks = int(params.get('numStocks', ['50'])[0])
+    min_market_cap = float(params.get('minMarketCap', ['2.0'])[0])
+    min_price = float(params.get('minPrice', ['10.0'])[0])
+    positive_return = params.get('positiveReturn', ['true'])[0].lower() == 'true'
+    
+    text = params.get('screen', [''])[0].strip()
+    expression = parse(text) if text else None
+    if expression is not None and expression.factors():
+        # The shared dataset holds the screen columns only
+        raise ValueError(f"Factor fields can't be screened here: {', '.join(expression.factors())}")
+    
+    # Limit number of stocks
+    num_stocks = max(0, min(num_stocks, len(get_universe().tickers())))
+    return num_stocks, min_market_cap, min_price, positive_return, expression
+
+# Decide whether /api/screen should stream NDJSON
+def wants_ndjson(query, accept):
+    """
+    True for ?stream=1 (or true) or an Accept header asking for application/x-ndjson
+    """
+    stream = urllib.parse.parse_qs(query).get('stream', [''])[0].lower()
+    return stream in ('1', 'true') or 'application/x-ndjson' in accept
+
 # Custom HTTP request handler
-class StockScreenerHandler(http.server.SimpleHTTPRequestHandler):
+class StockScreenerHandler(http.server.BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive between requests; idle ones are closed after the timeout
+    protocol_version = "HTTP/1.1"
+    timeout = 15
+    # Headers and body go out in separate writes; don't let Nagle hold back the body
+    disable_nagle_algorithm = True
+    
+    def handle(self):
+        """
+        Serve the requests that have arrived on the connection, then hand it back to the server
+        
+        A keep-alive connection isn't waited on here: the server parks it until its next request
+        arrives, so idle clients don't hold a worker thread.
+        """
+        self.close_connection = True
+        self.handle_one_request()
+        # Pipelined requests already read into the buffer are served straight away
+        while not self.close_connection and self.request_buffered():
+            self.handle_one_request()
+    
+    def request_buffered(self):
+        """
+        True when the next request's bytes have already arrived, without waiting for them
+        """
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+    
     def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        
         # Serve the main page
-        if self.path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(HTML_TEMPLATE.encode())
-            return
+        if parsed.path == '/':
+            self.send_body(200, 'text/html; charset=utf-8', HTML_TEMPLATE.encode())
             
         # Handle API requests
-        elif self.path.startswith('/api/screen'):
-            # Parse query parameters
-            query = urllib.parse.urlparse(self.path).query
-            params = urllib.parse.parse_qs(query)
-            
-            # Get parameters with defaults
-            num_stocks = int(params.get('numStocks', ['50'])[0])
-            min_market_cap = float(params.get('minMarketCap', ['2.0'])[0])
-            min_price = float(params.get('minPrice', ['10.0'])[0])
-            positive_return = params.get('positiveReturn', ['true'])[0].lower() == 'true'
+        elif parsed.path == '/api/screen':
+            try:
+                num_stocks, min_market_cap, min_price, positive_return, expression = parse_screen_params(parsed.query)
+            except ValueError as e:
+                self.send_body(400, 'application/json', json.dumps({'error': str(e)}).encode())
+                return
             
-            # Limit number of stocks
-            num_stocks = min(num_stocks, len(TICKERS))
-            selected_tickers = TICKERS[:num_stocks]
+            metrics = RunMetrics('web')
             
-            # Generate and filter stock data
-            stocks = generate_mock_stock_data(selected_tickers)
-            filtered_stocks = filter_stocks(stocks, min_market_cap, min_price, positive_return)
+            # NDJSON clients get each match as soon as it is available
+            if wants_ndjson(parsed.query, self.headers.get('Accept', '')):
+                try:
+                    batches = stream_screen(num_stocks, min_market_cap, min_price, positive_return,
+                                            self.server.provider, metrics, expression)
+                except Exception as e:
+                    self.send_body(503, 'application/json', json.dumps({'error': str(e)}).encode())
+                    return
+                self.send_ndjson(batches)
+                metrics.finish()
+                return
             
-            # Calculate statistics
-            stats = calculate_statistics(filtered_stocks)
+            # Screen the shared dataset, keeping only the numStocks largest stocks of the universe
+            provider = self.server.provider or get_provider()
+            try:
+                with timed(metrics, 'fetch'):
+                    stocks, screen, ranks, version = load_dataset(provider, metrics=metrics)
+            except Exception as e:
+                # The provider failed (circuit open, network error) and there is no dataset to fall back on
+                self.send_body(503, 'application/json', json.dumps({'error': str(e)}).encode())
+                return
             
-            # Prepare response
-            response = {
-                'filtered_stocks': filtered_stocks,
-                'stats': stats
-            }
-            
-            # Add a small delay to simulate API call
-            time.sleep(1)
+            # The same parsed parameters on the same dataset version always give the same body
+            responses = get_response_cache()
+            # An expression replaces the thresholds and is keyed by its canonical text, so spacing
+            # and field aliases share an entry
+            if expression is not None:
+                criteria = (expression.text,)
+            else:
+                criteria = (min_market_cap, min_price, positive_return)
+            key = (provider.key, version, num_stocks) + criteria
+            entry = responses.get(key)
+            if entry is None:
+                with timed(metrics, 'filter'):
+                    selected = screen_dataset(stocks, screen, ranks, num_stocks, min_market_cap, min_price,
+                                              positive_return, expression)
+                with timed(metrics, 'parse'):
+                    filtered_stocks = stocks.take(selected)
+                
+                # Prepare response
+                with timed(metrics, 'compute'):
+                    response = {
+                        'filtered_stocks': [json_row(stock) for stock in filtered_stocks],
+                        'stats': calculate_statistics(filtered_stocks)
+                    }
+                with timed(metrics, 'render'):
+                    entry = responses.put(key, json.dumps(response).encode())
+            else:
+                metrics.count('response_cache_hits')
+            with timed(metrics, 'render'):
+                self.send_cached(entry)
+            metrics.finish()
             
-            # Send response
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode())
-            return
+        # Timing metrics of recent screens
+        elif parsed.path == '/api/metrics':
+            self.send_body(200, 'application/json', json.dumps(metrics_snapshot()).encode())
             
         # Serve 404 for other paths
         else:
-            self.send_response(404)
-            self.send_header('Content-type', 'text/plain')
+            self.send_body(404, 'text/plain', b'404 Not Found')
+    
+    def send_body(self, status, content_type, body):
+        """
+        Send a complete response, gzip-compressed when the client accepts it
+        """
+        accepts_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        compressed = accepts_gzip and len(body) >= GZIP_MIN_SIZE
+        if compressed:
+            body = gzip.compress(body, compresslevel=5)
+        
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_cached(self, entry):
+        """
+        Send a response_cache.CachedResponse, or 304 Not Modified when If-None-Match names it
+        
+        The gzip variant is compressed once per cached response and tagged with its own ETag.
+        """
+        accepts_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        compressed = accepts_gzip and len(entry.body) >= GZIP_MIN_SIZE
+        etag = entry.gzip_etag if compressed else entry.etag
+        
+        if etag_matches(self.headers.get('If-None-Match'), entry.etag):
+            get_response_cache().record_not_modified()
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Vary', 'Accept-Encoding')
             self.end_headers()
-            self.wfile.write(b'404 Not Found')
             return
+        
+        body = entry.gzipped(compresslevel=5) if compressed else entry.body
+        self.send_response(200)
+        self.send_header('Content-type', entry.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('ETag', etag)
+        # Clients may keep the body but must revalidate it, which costs them a 304
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_ndjson(self, batches):
+        """
+        Stream batches of NDJSON lines, one chunk per batch, flushing each as it is produced
+        
+        HTTP/1.0 clients can't take chunked encoding, so they get a plain body ended by closing
+        the connection.
+        """
+        chunked = self.request_version != 'HTTP/1.0'
+        self.send_response(200)
+        self.send_header('Content-type', 'application/x-ndjson')
+        self.send_header('Cache-Control', 'no-cache')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.close_connection = True
+        self.end_headers()
+        
+        def write(data):
+            if chunked:
+                data = f"{len(data):x}\r\n".encode() + data + b"\r\n"
+            self.wfile.write(data)
+            self.wfile.flush()
+        
+        batches = iter(batches)
+        try:
+            while True:
+                try:
+                    lines = next(batches)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    # Headers are already out; report the failure in-band and end the stream cleanly
+                    write((json.dumps({'error': str(e)}) + "\n").encode())
+                    break
+                write(("\n".join(lines) + "\n").encode())
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
+        finally:
+            # Stops any fetches still in flight if the client went away
+            batches.close()
+    
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+# HTTP server handling connections on a bounded pool of worker threads
+class PooledHTTPServer(http.server.HTTPServer):
+    """
+    Serves each request on a worker from a bounded pool
+    
+    New connections, and keep-alive connections between requests, are parked in a selector
+    watched by one thread and only go to the pool once a request arrives. Idle connections
+    therefore cost a file descriptor rather than a worker, and are closed after the handler's
+    timeout.
+    """
+    allow_reuse_address = True
+    request_queue_size = 128
+    
+    def __init__(self, address, handler, workers=DEFAULT_WORKERS, provider=None, quiet=False):
+        super().__init__(address, handler)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='screener')
+        self.provider = provider or get_provider()
+        self.quiet = quiet
+        self.idle = selectors.DefaultSelector()
+        self.idle_lock = threading.Lock()
+        # Written to when a connection is parked, so the watcher picks it up at once
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.idle.register(self.wake_reader, selectors.EVENT_READ)
+        self.closing = False
+        threading.Thread(target=self.watch_idle, name='screener-idle', daemon=True).start()
+    
+    def process_request(self, request, client_address):
+        # Clients may connect well before sending a request (browsers preconnect)
+        self.park(request, client_address)
+    
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+    
+    def process_request_thread(self, request, client_address):
+        keep_alive = False
+        try:
+            handler = self.finish_request(request, client_address)
+            keep_alive = not handler.close_connection
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if keep_alive and not self.closing:
+                self.park(request, client_address)
+            else:
+                self.shutdown_request(request)
+    
+    def park(self, request, client_address):
+        """
+        Watch an idle connection until its next request arrives or it times out
+        """
+        deadline = time.monotonic() + (self.RequestHandlerClass.timeout or 0)
+        with self.idle_lock:
+            self.idle.register(request, selectors.EVENT_READ, (client_address, deadline))
+        self.wake_writer.send(b'\0')
+    
+    def watch_idle(self):
+        while not self.closing:
+            try:
+                events = self.idle.select(timeout=1.0)
+            except (OSError, ValueError):
+                # The selector was closed by server_close
+                return
+            ready = []
+            with self.idle_lock:
+                for key, _ in events:
+                    if key.fileobj is self.wake_reader:
+                        try:
+                            self.wake_reader.recv(4096)
+                        except OSError:
+                            pass
+                        continue
+                    # Readable means a new request, or the client closing; a worker sorts out which
+                    self.idle.unregister(key.fileobj)
+                    ready.append((key.fileobj, key.data[0]))
+                now = time.monotonic()
+                expired = [key for key in self.idle.get_map().values()
+                           if key.data is not None and key.data[1] <= now]
+                for key in expired:
+                    self.idle.unregister(key.fileobj)
+            for request, client_address in ready:
+                self.executor.submit(self.process_request_thread, request, client_address)
+            for key in expired:
+                self.shutdown_request(key.fileobj)
+    
+    def server_close(self):
+        self.closing = True
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self.idle_lock:
+            parked = [key.fileobj for key in self.idle.get_map().values() if key.data is not None]
+            self.idle.close()
+        for request in parked:
+            self.shutdown_request(request)
+        self.wake_reader.close()
+        self.wake_writer.close()
 
 def main():
+    parser = argparse.ArgumentParser(description="Web-based stock screener")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="threads serving requests (default %(default)s)")
+    add_provider_arguments(parser)
+    add_universe_arguments(parser)
+    parser.add_argument("--mock", action="store_true", help="serve generated data (same as --provider synthetic)")
+    parser.add_argument("--no-browser", action="store_true", help="don't open a browser window")
+    parser.add_argument("--quiet", action="store_true", help="don't log every request")
+    parser.add_argument("--prefetch", action="store_true", default=PREFETCH_ENABLED,
+                        help="keep quotes, history and fundamentals warm in the background (default: SCREENER_PREFETCH)")
+    args = parser.parse_args()
+    if args.mock:
+        args.provider = 'synthetic'
+    provider = provider_from_args(args)
+    universe_from_args(args)
+    
     # Set up the server
-    port = 8000
-    handler = StockScreenerHandler
+    port = args.port
     
     # Try to find an available port
     while True:
         try:
-            with socketserver.TCPServer(("", port), handler) as httpd:
-                print(f"Starting server at http://localhost:{port}")
+            with PooledHTTPServer(("", port), StockScreenerHandler, args.workers, provider, args.quiet) as httpd:
+                print(f"Starting server at http://localhost:{port} with {args.workers} workers")
+                # Warm the shared dataset in the background so the first screen isn't cold
+                threading.Thread(target=load_dataset, args=(provider,), daemon=True).start()
+                if args.prefetch:
+                    get_prefetch_daemon().start()
                 # Open browser automatically
-                webbrowser.open(f"http://localhost:{port}")
+                if not args.no_browser:
+                    webbrowser.open(f"http://localhost:{port}")
                 # Start the server
                 httpd.serve_forever()
         except OSError:
@@ -424,4 +844,4 @@ def main():
             break
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()